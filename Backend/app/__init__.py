@@ -12,13 +12,28 @@ load_dotenv()
 # It's good practice to load .env as early as possible.
 
 from .routes import routes  # Import the routes from routes.py
+from .services.upload_store import StreamingUploadRequest, MAX_UPLOAD_BYTES
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:8080", "http://localhost:5173", "http://192.168.10.35:8081", "http://localhost:8081"])  # Allow requests from your Vite app
+# Uploaded files stream to disk while they are hashed (see services/upload_store.py); larger bodies get 413
+app.request_class = StreamingUploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024  # room for the multipart framing
+# Allow requests from your Vite app; app/asgi.py applies the same settings to its async routes
+CORS_ORIGINS = ["http://localhost:8080", "http://localhost:5173", "http://192.168.10.35:8081", "http://localhost:8081"]
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-Run-Id"]
+CORS(app, origins=CORS_ORIGINS, expose_headers=CORS_EXPOSE_HEADERS)
 
 # Register the blueprint for routes
 app.register_blueprint(routes)
 
+# Single-process servers can create the clients at startup instead of in the first request.
+# Pre-fork servers must not (clients don't survive a fork); gunicorn.conf.py warms up each worker instead.
+if os.environ.get("WARM_UP_ON_START") == "1":
+    from app.services.resources import preload_modules, warm_up
+
+    preload_modules()
+    warm_up()
+
 # Example of how to access the API key if needed directly in app factory
 # print(f"Loaded GOOGLE_API_KEY: {os.environ.get('GOOGLE_API_KEY')}")
 
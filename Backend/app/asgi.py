@@ -0,0 +1,201 @@
+# app/asgi.py
+# Async serving mode. /query, /analyze/<document_id> and /upload are coroutines here, so a request
+# that is waiting on Gemini or the embedding API holds no thread. The vector searches, SQLite caches
+# and upload writes run on worker threads instead. Every other route is the Flask app (app/__init__.py),
+# run through a WSGI adapter. Response bodies and status codes match the Flask routes, which share
+# their payload helpers with this module.
+#
+#   uvicorn app.asgi:app --host 0.0.0.0 --port 5000          (from Backend/)
+#   python -m benchmarks.bench_serving                        # Flask's threaded server against this one
+import asyncio
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from app import CORS_EXPOSE_HEADERS, CORS_ORIGINS, app as flask_app
+from app.routes import accept_upload, analysis_payload, query_payload, upload_filename
+from app.services import metrics
+from app.services.analysis_service import aanalyze_patent
+from app.services.upload_store import HashingFile, MAX_UPLOAD_BYTES, UPLOAD_DIR
+from app.services.vector_db.db_handler import aquery_vector_db
+
+WRITE_BLOCK_SIZE = 1 << 20  # upload bytes collected before a worker thread writes them out
+MAX_BODY_BYTES = flask_app.config["MAX_CONTENT_LENGTH"]
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI request on one shared thread; give each its own worker thread, like
+    # Flask's threaded server, so a long or streamed response doesn't hold up the others
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.run_wsgi_app.__wrapped__, thread_sensitive=False)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+def instrumented(rule: str):
+    """Request metrics, X-Profile and Server-Timing for an async route, as routes.py does for Flask's."""
+    def decorate(handler):
+        async def endpoint(request):
+            started = time.perf_counter()
+            if request.headers.get("X-Profile"):
+                metrics.start_profile()
+            else:
+                metrics.stop_profile()
+            response = await handler(request)
+            metrics.HTTP_REQUESTS.inc(endpoint=rule, method=request.method, status=str(response.status_code))
+            metrics.HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=rule)
+            profile = metrics.current_profile()
+            if profile is not None:
+                response.headers["Server-Timing"] = profile.server_timing()
+                metrics.stop_profile()
+            return response
+        return endpoint
+    return decorate
+
+
+@instrumented("/analyze/<document_id>")
+async def analyze(request):
+    document_id = request.path_params["document_id"]
+    try:
+        print(f"📊 Starting analysis for: {document_id}")
+        payload, status = analysis_payload(document_id, await aanalyze_patent(document_id))
+        return JSONResponse(payload, status)
+
+    except Exception as e:
+        print(f"❌ Analysis error: {e}")
+        return JSONResponse({"error": f"Internal server error during analysis: {str(e)}"}, 500)
+
+
+@instrumented("/query")
+async def query(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    question = data.get("question")
+    document_id = data.get("document_id")
+
+    if not question:
+        return JSONResponse({"error": "No question provided."}, 400)
+
+    try:
+        print(f"💬 Query: {question[:50]}{'...' if len(question) > 50 else ''}")
+        return JSONResponse(query_payload(await aquery_vector_db(question, document_id)))
+
+    except Exception as e:
+        print(f"❌ Query error: {e}")
+        return JSONResponse({"error": f"An error occurred while processing your question: {str(e)}"}, 500)
+
+
+def upload_too_large():
+    return JSONResponse({"error": f"File too large; uploads are limited to {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB."}, 413)
+
+
+async def receive_upload(request):
+    """
+    Decode the multipart body as it arrives. The "file" part is hashed and written to a HashingFile
+    in UPLOAD_DIR/incoming, a block at a time on a worker thread; other parts are skipped.
+    Returns (filename, HashingFile), or ("", None) when there is no file part.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get("boundary")
+    if content_type != "multipart/form-data" or not boundary:
+        return "", None
+
+    decoder = MultipartDecoder(boundary.encode("latin1"))
+    filename, incoming, in_file = "", None, False
+    pending, pending_bytes, received = [], 0, 0
+
+    async def flush():
+        nonlocal pending_bytes
+        if pending:
+            block = b"".join(pending)
+            pending.clear()
+            pending_bytes = 0
+            await asyncio.to_thread(incoming.write, block)
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_BODY_BYTES:
+                raise RequestEntityTooLarge()
+            decoder.receive_data(chunk if chunk else None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    in_file = event.name == "file" and incoming is None
+                    if in_file:
+                        filename = event.filename
+                        incoming = HashingFile(os.path.join(UPLOAD_DIR, "incoming"))
+                elif isinstance(event, Field):
+                    in_file = False
+                elif isinstance(event, Data) and in_file:
+                    pending.append(event.data)
+                    pending_bytes += len(event.data)
+                    if pending_bytes >= WRITE_BLOCK_SIZE:
+                        await flush()
+                event = decoder.next_event()
+        if incoming is not None:
+            await flush()
+    except BaseException:
+        if incoming is not None:
+            incoming.close()  # never committed, so the partial file is deleted
+        raise
+    return filename, incoming
+
+
+@instrumented("/upload")
+async def upload(request):
+    if request.method == "GET":
+        return JSONResponse({"message": "Upload endpoint ready"}, 200)
+
+    if int(request.headers.get("content-length") or 0) > MAX_BODY_BYTES:
+        return upload_too_large()
+    try:
+        filename, incoming = await receive_upload(request)
+    except RequestEntityTooLarge:
+        return upload_too_large()
+    except ValueError as e:
+        print(f"❌ Malformed upload: {e}")
+        return JSONResponse({"error": "Malformed multipart body."}, 400)
+
+    filename = upload_filename(filename)
+    if incoming is None or not filename:
+        if incoming is not None:
+            incoming.close()
+        return JSONResponse({"error": "No file or filename provided."}, 400)
+
+    try:
+        payload, status, headers = await asyncio.to_thread(accept_upload, incoming, filename)
+    finally:
+        incoming.close()  # no-op once the store has committed or discarded it
+    return JSONResponse(payload, status, headers=headers)
+
+
+# Flask-CORS only sees the mounted app, so the async routes get the same policy here. Preflight
+# OPTIONS requests don't match these routes' methods and are answered by Flask-CORS.
+cors = [Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, expose_headers=CORS_EXPOSE_HEADERS)]
+
+wsgi_app = ThreadedWsgiToAsgi(flask_app)
+
+app = Starlette(routes=[
+    Route("/query", query, methods=["POST"], middleware=cors),
+    # Ahead of /analyze/{document_id}, which would otherwise take it for a document named "batch"
+    Route("/analyze/batch", wsgi_app),
+    Route("/analyze/{document_id}", analyze, methods=["GET"], middleware=cors),
+    Route("/upload", upload, methods=["GET", "POST"], middleware=cors),
+    Mount("/", app=wsgi_app),
+])
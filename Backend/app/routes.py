@@ -1,18 +1,59 @@
 # routes.py
 
 import os
+import json
+import time
 import traceback
-from flask import Blueprint, request, jsonify
-from app.services.process import process_pdf_to_chroma
-from app.services.vector_db.db_handler import query_vector_db
-from app.services.analysis_service import analyze_patent, model as analysis_model # Import the Gemini model
+import uuid
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from app.services.jobs import get_job_queue, QueueFullError
+from app.services.vector_db.db_handler import query_vector_db, stream_query_vector_db
+from app.services.analysis_service import analyze_patent
+from app.services.batch_analysis import (
+    run_batch, list_all_documents, get_batch_store, BATCH_MAX_CONCURRENCY, BATCH_MAX_DOCUMENTS,
+)
+from app.services.analysis_cache import get_analysis_cache
+from app.services.query_cache import get_query_cache
+from app.services.single_flight import get_single_flight
+from app.services.manifest import get_manifest
+from app.services.upload_store import get_upload_store, MAX_UPLOAD_BYTES
+from app.services import resources, metrics
 # from app.services.get_embedding_function import get_embedding_function # Not directly used in routes 
 
 routes = Blueprint('routes', __name__)
-UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 
 # analyze_bp = Blueprint("analyze", __name__) # Removed, will put /analyze on main 'routes'
 
+@routes.before_app_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    # Clients send X-Profile: 1 to get this request's stage breakdown back as a Server-Timing header
+    if request.headers.get("X-Profile"):
+        metrics.start_profile()
+    else:
+        metrics.stop_profile()
+
+
+@routes.after_app_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    started = g.get("request_started")
+    if started is not None:
+        # For streamed responses this is the time to the first byte, not the whole stream
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    profile = metrics.current_profile()
+    if profile is not None:
+        response.headers["Server-Timing"] = profile.server_timing()
+        metrics.stop_profile()
+    return response
+
+
+@routes.app_errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"File too large; uploads are limited to {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB."}), 413
+
+
 @routes.route("/analyze/<document_id>", methods=["GET"]) # Changed route and added document_id
 def analyze(document_id: str): # Added document_id parameter
     try:
@@ -21,19 +62,81 @@ def analyze(document_id: str): # Added document_id parameter
 
         print(f"📊 Starting analysis for: {document_id}")
         # Pass document_id to analyze_patent service function
-        analysis_result_dict = analyze_patent(document_id)
-
-        if not analysis_result_dict:
-            return jsonify({"error": f"Analysis not found or failed for document ID: {document_id}"}), 404
-
-        print("✅ Analysis completed successfully")
-        return jsonify(analysis_result_dict)
+        payload, status = analysis_payload(document_id, analyze_patent(document_id))
+        return jsonify(payload), status
 
     except Exception as e:
         print(f"❌ Analysis error: {e}")
         return jsonify({"error": f"Internal server error during analysis: {str(e)}"}), 500
 
 
+def analysis_payload(document_id: str, analysis_result_dict):
+    """(JSON body, status) of /analyze; shared with the async server (app/asgi.py)."""
+    if not analysis_result_dict:
+        return {"error": f"Analysis not found or failed for document ID: {document_id}"}, 404
+
+    print("✅ Analysis completed successfully")
+    return analysis_result_dict, 200
+
+
+@routes.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analyze many documents and stream one NDJSON record per document as it finishes, then a summary.
+    Body: {"document_ids": [...]} or {"all": true}; optional "run_id" (to resume) and "concurrency"
+    (at most BATCH_MAX_CONCURRENCY).
+    """
+    data = request.get_json(silent=True) or {}
+    run_id = data.get("run_id")
+    document_ids = data.get("document_ids")
+    if data.get("all"):
+        document_ids = list_all_documents()
+    elif not document_ids and run_id:
+        run = get_batch_store().get_run(run_id)
+        document_ids = run["document_ids"] if run else None
+    if not document_ids or not isinstance(document_ids, list):
+        return jsonify({"error": "Provide document_ids, all: true, or the run_id of an earlier run."}), 400
+    if len(document_ids) > BATCH_MAX_DOCUMENTS:
+        return jsonify({"error": f"At most {BATCH_MAX_DOCUMENTS} documents per batch."}), 400
+    try:
+        concurrency = min(max(1, int(data["concurrency"])), BATCH_MAX_CONCURRENCY) if data.get("concurrency") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be an integer."}), 400
+
+    run_id = run_id or uuid.uuid4().hex
+    records = run_batch(document_ids, run_id, concurrency) if concurrency else run_batch(document_ids, run_id)
+
+    def generate():
+        try:
+            for record in records:
+                yield json.dumps(record) + "\n"
+        except GeneratorExit:
+            print(f"🔌 Client disconnected from batch {run_id}; resume it with the same run_id")
+            raise
+        finally:
+            records.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"X-Run-Id": run_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@routes.route("/analyze/batch", methods=["GET"])
+def analyze_batch_get():
+    # Declared so a GET isn't routed to /analyze/<document_id> as a document named "batch"
+    return jsonify({"error": "Start a batch with POST /analyze/batch; GET /analyze/batch/<run_id> reports its progress."}), 405, {"Allow": "POST"}
+
+
+@routes.route("/analyze/batch/<run_id>", methods=["GET"])
+def analyze_batch_status(run_id: str):
+    run = get_batch_store().get_run(run_id)
+    if not run:
+        return jsonify({"error": f"Batch run not found: {run_id}"}), 404
+    return jsonify(run)
+
+
 @routes.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'GET':
@@ -43,30 +146,82 @@ def upload():
     # Handle POST request (file upload)
     file = request.files.get("file")
     
-    if not file or not file.filename: # Ensure filename exists
+    filename = upload_filename(file.filename if file else None)
+    if not filename:
         return jsonify({"error": "No file or filename provided."}), 400
 
-    # Create uploads directory if it doesn't exist
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    payload, status, headers = accept_upload(file.stream, filename)
+    return jsonify(payload), status, headers
+
+
+def upload_filename(name) -> str:
+    """The uploaded file's name without path components (it becomes the document id), or "" if unusable."""
+    filename = os.path.basename(name.replace("\\", "/")) if name else ""
+    return "" if filename in (".", "..") else filename
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+
+def accept_upload(stream, filename: str):
+    """
+    Store an upload and queue its ingestion unless its bytes are known: (JSON body, status, headers)
+    of /upload. `stream` is the file field, ideally a HashingFile it was streamed into. Shared with
+    the async server (app/asgi.py).
+    """
+    # The body was hashed while it streamed to disk; identical bytes are stored once
+    stored = get_upload_store().put(stream, filename)
+
+    # Bytes already ingested (under any name) need no parsing, embedding or storing
+    document_id = get_manifest().find_by_hash(stored.sha256)
+    if document_id:
+        metrics.UPLOADS.inc(result="duplicate")
+        print(f"♻️ Upload {filename} matches ingested document {document_id}; skipping ingestion")
+        return {
+            "message": "This file has already been processed.",
+            "status": "done",
+            "document_id": document_id,
+            "sha256": stored.sha256,
+            "duplicate": True
+        }, 200, {}
+
+    job_queue = get_job_queue()
+    job = job_queue.find_active(stored.path)
+    if job:
+        metrics.UPLOADS.inc(result="in_progress")
+        print(f"♻️ Upload {filename} is already being processed (job {job['id']})")
+        return {
+            "message": "This file is already being processed.",
+            "job_id": job["id"],
+            "status": job["status"],
+            "document_id": job["document_id"],
+            "sha256": stored.sha256,
+            "duplicate": True
+        }, 202, {}
 
     try:
-        print(f"📤 Processing upload: {file.filename}")
-        # Call the processing logic and get the document_id (filename)
-        document_id = process_pdf_to_chroma(file_path)
-        print(f"✅ Upload complete: {document_id}")
-        return jsonify({
-            "message": "PDF uploaded and processed successfully.",
-            "document_id": document_id
-        })
-    except FileNotFoundError as e:
-        print(f"❌ File not found: {e}")
-        return jsonify({"error": f"File processing error: {str(e)}"}), 400
+        # Ingestion runs in the background; the client polls /jobs/<job_id> for progress
+        job = job_queue.submit(stored.path, filename)
+    except QueueFullError as e:
+        print(f"⏳ Upload rejected, queue full: {filename}")
+        return {"error": str(e)}, 503, {"Retry-After": "30"}
     except Exception as e:
         print(f"❌ Processing error: {e}")
-        return jsonify({"error": "Server error during file processing."}), 500
+        return {"error": "Server error during file processing."}, 500, {}
+
+    metrics.UPLOADS.inc(result="new")
+    print(f"📤 Queued upload: {filename} (job {job['id']})")
+    return {
+        "message": "PDF uploaded; processing started.",
+        "job_id": job["id"],
+        "status": job["status"],
+        "document_id": job["document_id"],
+        "sha256": stored.sha256
+    }, 202, {}
+
+@routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job)
 
 @routes.route('/query', methods=['POST'])
 def query():
@@ -80,19 +235,90 @@ def query():
     try:
         print(f"💬 Query: {question[:50]}{'...' if len(question) > 50 else ''}")
         # Query the vector database with document context if available
-        result = query_vector_db(question, document_id)
-        
-        if not result or not result.get('answer'):
-            return jsonify({"answer": "I couldn't find any relevant information in the documents.", "sources": []})
-
-        print("✅ Query completed successfully")
-        return jsonify({
-            "answer": result['answer'], 
-            "sources": result.get('sources', [])
-        })
+        return jsonify(query_payload(query_vector_db(question, document_id)))
 
     except Exception as e:
         print(f"❌ Query error: {e}")
         return jsonify({"error": f"An error occurred while processing your question: {str(e)}"}), 500
 
 
+def query_payload(result) -> dict:
+    """JSON body of /query for a query_vector_db result; shared with the async server (app/asgi.py)."""
+    if not result or not result.get('answer'):
+        return {"answer": "I couldn't find any relevant information in the documents.", "sources": []}
+
+    print("✅ Query completed successfully")
+    response = {
+        "answer": result['answer'],
+        "sources": result.get('sources', [])
+    }
+    if result.get("context"):
+        response["context"] = result["context"]  # token savings of the context builder
+    return response
+
+
+@routes.route('/query/stream', methods=['GET', 'POST'])
+def query_stream():
+    """
+    Server-Sent Events variant of /query: a "sources" event once retrieval is done,
+    "token" events as the answer is generated, then "done" (or "error").
+    GET takes ?question=&document_id= so it can be used with EventSource.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    question = data.get("question")
+    document_id = data.get("document_id")
+
+    if not question:
+        return jsonify({"error": "No question provided."}), 400
+
+    def sse(event: str, payload) -> str:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def generate():
+        print(f"💬 Streaming query: {question[:50]}{'...' if len(question) > 50 else ''}")
+        events = stream_query_vector_db(question, document_id)
+        try:
+            for event, payload in events:
+                yield sse(event, payload)
+            print("✅ Streaming query completed")
+        except GeneratorExit:
+            print("🔌 Client disconnected, stopping generation")
+            raise
+        except Exception as e:
+            print(f"❌ Streaming query error: {e}")
+            yield sse("error", {"error": f"An error occurred while processing your question: {str(e)}"})
+        finally:
+            events.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@routes.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # embedding_cache brings in LangChain, which the web process otherwise loads on first use
+    from app.services.embedding_cache import get_embedding_store
+
+    return jsonify({
+        "analysis": get_analysis_cache().stats(),
+        "embeddings": get_embedding_store().stats(),
+        "queries": get_query_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+    })
+
+
+@routes.route('/health', methods=['GET'])
+def health():
+    report = resources.health()
+    return jsonify(report), 200 if report["status"] == "ok" else 503
+
+
+@routes.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
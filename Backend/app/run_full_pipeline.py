@@ -1,35 +1,43 @@
-from app.services.process import process_pdf_to_chroma
-from app.services.analysis_service import analyze_patent
-from app.services.vector_db.chroma_connector import ChromaConnector
-from app.services.get_embedding_function import get_embedding_function
+# Ingest one PDF, check its chunks were stored, then analyze it.
+#
+#   python -m app.run_full_pipeline uploads/Document1.pdf
+#   python -m app.run_full_pipeline uploads/Document1.pdf --fake   # offline, with the benchmark fakes
+import argparse
+import json
+import os
 
 
 def main():
-    pdf_path = r"C:\Users\ishak\OneDrive\Desktop\MINOR 2B\AIagentPatent\Backend\uploads\Document1.pdf"
+    parser = argparse.ArgumentParser(description="Ingest a PDF and analyze it end to end.")
+    parser.add_argument("pdf_path", help="PDF to ingest")
+    parser.add_argument("--fake", action="store_true", help="use local fake models instead of the Gemini API")
+    args = parser.parse_args()
 
-    print("Step 1: Processing and ingesting PDF into ChromaDB...")
-    process_pdf_to_chroma(pdf_path)
-    print("Ingestion complete.")
+    if args.fake:
+        from benchmarks.fakes import install_fakes
+        install_fakes(llm_latency=0.1, embedding_latency=0.01)
 
-    print("\nStep 2: Verifying data in ChromaDB...")
-    chroma = ChromaConnector()
-    try:
-        documents = chroma.get_all_documents()  # Adjust if needed
-        print(f"Documents stored in ChromaDB: {len(documents)}")
-    except Exception as e:
-        print(f"Error accessing ChromaDB documents: {e}")
-        return
+    from app.services.process import process_pdf_to_chroma
+    from app.services.analysis_service import analyze_patent
+    from app.services.resources import get_vector_index
+
+    print("Step 1: Processing and ingesting PDF...")
+    document_id = process_pdf_to_chroma(os.path.abspath(args.pdf_path))
+    print(f"Ingestion complete: {document_id}")
 
-    if len(documents) == 0:
-        print("⚠️ No data found in ChromaDB after ingestion. Please check ingestion logic.")
+    print("\nStep 2: Verifying stored chunks...")
+    stored = get_vector_index().get(where={"filename_base": document_id})
+    print(f"Chunks stored for {document_id}: {len(stored['ids'])}")
+    if not stored["ids"]:
+        print("⚠️ No chunks found after ingestion. Please check ingestion logic.")
         return
 
     print("\nStep 3: Running analysis on ingested data...")
     try:
-        analysis_result = analyze_patent()
+        analysis_result = analyze_patent(document_id)
         if analysis_result:
             print("Analysis result:")
-            print(analysis_result)
+            print(json.dumps(analysis_result, indent=2))
         else:
             print("⚠️ Analysis returned no result or failed.")
     except Exception as e:
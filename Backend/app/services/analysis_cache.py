@@ -0,0 +1,135 @@
+# app/services/analysis_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from app.services.paths import CACHE_DIR
+from app.services.metrics import record_cache
+
+ANALYSIS_CACHE_ENABLED = os.environ.get("ANALYSIS_CACHE", "1") != "0"
+ANALYSIS_CACHE_PATH = os.environ.get("ANALYSIS_CACHE_PATH", os.path.join(CACHE_DIR, "analysis_cache.sqlite"))
+ANALYSIS_CACHE_TTL = float(os.environ.get("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", "1000"))
+
+
+class AnalysisCache:
+    """
+    Persistent cache of analysis results, keyed by a hash of the document text,
+    the model name and the prompt version. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, ttl: float = ANALYSIS_CACHE_TTL,
+                 max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES, enabled: bool = ANALYSIS_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY, document_id TEXT, result TEXT,"
+            " created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_document ON analysis_cache(document_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_access ON analysis_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(full_text: str, model_name: str, prompt_version: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name, prompt_version, full_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.evictions += 1
+                self.misses += 1
+                record_cache("analysis", False)
+                return None
+            self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        record_cache("analysis", True)
+        return json.loads(row[0])
+
+    def put(self, key: str, document_id: str, result: Dict):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, document_id, result, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, document_id, json.dumps(result), now, now),
+            )
+            # Drop expired entries, then the least recently used ones beyond max_entries
+            expired = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                " SELECT key FROM analysis_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.commit()
+            self.evictions += expired + overflow
+
+    def invalidate(self, document_id: str) -> int:
+        """Remove every cached analysis for a document, e.g. after it was re-ingested."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE document_id = ?", (document_id,)
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_analysis_cache: Optional[AnalysisCache] = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Return the process-wide analysis cache, opening it on first use."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache()
+    return _analysis_cache
@@ -1,145 +1,591 @@
-from google.generativeai.generative_models import GenerativeModel
-from google.generativeai.client import configure
-from typing import List, Dict, Optional
-from app.services.vector_db.chroma_connector import ChromaConnector
-from app.services.get_embedding_function import get_embedding_function
+from typing import Awaitable, List, Dict, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.services.resources import (
+    get_analysis_model, get_embeddings, get_vector_index, ANALYSIS_MODEL_NAME, SIMILAR_PATENTS_COLLECTION,
+)
+from app.services.analysis_cache import get_analysis_cache
+from app.services.single_flight import get_single_flight
+from app.services.process import chunk_position
+from app.services.rate_limit import TokenBucket
+from app.services.metrics import span, in_current_context, record_llm_call, LLM_REQUESTS
+import asyncio
+import contextvars
+import json
+import math
+import time
 import os
-
-# Initialize Chroma connector
-chroma_connector = ChromaConnector()
+import urllib.parse
 
 # --- Configure Gemini ---
-gemini_api_key = os.environ.get("GOOGLE_API_KEY")
-if not gemini_api_key:
-    print("Warning: GOOGLE_API_KEY not set. Some features may not work.")
-    model = None
-else:
-    configure(api_key=gemini_api_key)
-    model = GenerativeModel('gemini-2.5-flash')
+# The model, the embeddings and the vector indexes come from app.services.resources and are created
+# on first use, so importing this module stays cheap; get_analysis_model() is None without GOOGLE_API_KEY.
+MODEL_NAME = ANALYSIS_MODEL_NAME
+# Bump whenever a prompt below changes so cached analyses from the old prompts are not reused
+PROMPT_VERSION = "3"
+
+# --- Concurrency ---
+# "concurrent" fans the analysis calls out on a bounded pool, "structured" asks for
+# summary/score/issues/recommendations in one JSON response, "sequential" is the old behaviour,
+# "mapreduce" analyzes sections in parallel and merges them, "auto" picks "mapreduce" for long
+# texts and "concurrent" otherwise.
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "auto")
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", "8"))
+ANALYSIS_CALL_TIMEOUT = float(os.environ.get("ANALYSIS_CALL_TIMEOUT", "60"))  # seconds, per call
+CALL_POLL_SECONDS = 0.05  # how often a call that hasn't started yet is checked on
+
+# --- Long documents ---
+# The single-call prompts only see the first few thousand characters; longer texts go map-reduce in "auto"
+MAP_REDUCE_MIN_CHARS = int(os.environ.get("MAP_REDUCE_MIN_CHARS", "5000"))
+ANALYSIS_SECTION_TOKENS = int(os.environ.get("ANALYSIS_SECTION_TOKENS", "2000"))  # per map call
+ANALYSIS_MAX_SECTIONS = int(os.environ.get("ANALYSIS_MAX_SECTIONS", "8"))  # sections grow beyond this
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+# Passages of a document searched separately for similar patents
+SIMILAR_MAX_CHUNKS = int(os.environ.get("SIMILAR_MAX_CHUNKS", "16"))
+
+# Cap on Gemini calls per minute shared by every analysis in the process (batch runs included); 0 means no cap
+ANALYSIS_REQUESTS_PER_MINUTE = float(os.environ.get("ANALYSIS_REQUESTS_PER_MINUTE", "0"))
+llm_rate_limiter = TokenBucket(rate=ANALYSIS_REQUESTS_PER_MINUTE / 60.0, capacity=ANALYSIS_MAX_WORKERS)
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+
+# Values returned for a call that timed out or failed, so one slow call doesn't sink the whole analysis
+FALLBACK_RESULTS = {
+    "summary": "Summary could not be generated in time.",
+    "noveltyScore": 60,
+    "potentialIssues": ["Issue analysis could not be completed in time."],
+    "recommendations": ["Recommendations could not be generated in time."],
+    "similarPatents": [],
+}
+
+class _CallClock:
+    """
+    Deadline of one task run by _gather. It starts when the task starts running, and again when its
+    Gemini call gets past the rate limiter, so time spent queued for a worker or for the rate
+    limiter doesn't count against ANALYSIS_CALL_TIMEOUT.
+    """
 
+    def __init__(self):
+        self.deadline: Optional[float] = None  # None while the task waits to run
 
-# --- Embedding Function ---
-# Unified embedding function
-embedding_fn = get_embedding_function() # Changed
+    def start(self):
+        self.deadline = time.monotonic() + ANALYSIS_CALL_TIMEOUT
+
+    def pause(self):
+        self.deadline = None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+# The clock of the _gather task running in this thread or coroutine
+_call_clock: contextvars.ContextVar[Optional[_CallClock]] = contextvars.ContextVar("analysis_call_clock", default=None)
 
 # --- Analysis Logic ---
 
+def _generate(prompt: str, **kwargs) -> str:
+    """Run a single Gemini call bounded by the per-call timeout, which starts once the call is sent."""
+    clock = _call_clock.get()
+    if clock:
+        clock.pause()
+    with span("llm_rate_limit"):
+        llm_rate_limiter.acquire()
+    if clock:
+        clock.start()
+    try:
+        with span("llm"):
+            response = get_analysis_model().generate_content(prompt, request_options={"timeout": ANALYSIS_CALL_TIMEOUT}, **kwargs)
+            text = response.text
+    except Exception:
+        LLM_REQUESTS.inc(model=MODEL_NAME, status="error")
+        raise
+    usage = getattr(response, "usage_metadata", None)
+    record_llm_call(MODEL_NAME, prompt, text, getattr(usage, "prompt_token_count", None),
+                    getattr(usage, "candidates_token_count", None))
+    return text
+
+def _summary_prompt(text: str) -> str:
+    return f"Summarize the following patent proposal in 3-5 sentences:\n{text[:5000]}"
+
+def _novelty_prompt(text: str) -> str:
+    return ("Rate the novelty of this patent on a scale of 0 to 100. "
+            "Consider technical innovation and prior art. "
+            f"Return only the number:\n{text[:3000]}")
+
+def _issues_prompt(text: str) -> str:
+    return ("List 3-5 potential legal, technical, or novelty issues with this patent. "
+            f"Use concise bullet points:\n{text[:4000]}")
+
+def _improvements_prompt(text: str) -> str:
+    return ("Suggest 3-5 specific improvements to strengthen this patent:"
+            f"\n{text[:4000]}")
+
+def _parse_novelty(response_text: str) -> int:
+    try:
+        return min(100, max(0, int("".join(filter(str.isdigit, response_text.strip())))))
+    except ValueError:
+        return 60  # Fallback score
+
 def generate_summary(text: str) -> str:
     """Generate a summary of the patent text."""
-    if not model:
+    if not get_analysis_model():
         return "Summary generation requires Google API key to be configured."
-    prompt = f"Summarize the following patent proposal in 3-5 sentences:\n{text[:5000]}"
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    return _generate(_summary_prompt(text)).strip()
 
 def score_novelty(text: str) -> int:
     """Score the novelty of the patent on a scale of 0-100."""
-    if not model:
-        return 60  # Fallback score
-    prompt = ("Rate the novelty of this patent on a scale of 0 to 100. "
-             "Consider technical innovation and prior art. "
-             "Return only the number:\n{text[:3000]}")
-    response = model.generate_content(prompt)
-    try:
-        return min(100, max(0, int("".join(filter(str.isdigit, response.text.strip())))))
-    except ValueError:
+    if not get_analysis_model():
         return 60  # Fallback score
+    return _parse_novelty(_generate(_novelty_prompt(text)))
 
 def find_issues(text: str) -> List[str]:
     """Identify potential issues with the patent."""
-    if not model:
+    if not get_analysis_model():
         return ["API key not configured for detailed analysis"]
-    prompt = ("List 3-5 potential legal, technical, or novelty issues with this patent. "
-             "Use concise bullet points:\n{text[:4000]}")
-    response = model.generate_content(prompt)
-    return [line.strip("•- ").strip() for line in response.text.strip().split("\n") if line.strip()]
+    return _split_bullets(_generate(_issues_prompt(text)))
 
 def suggest_improvements(text: str) -> List[str]:
     """Suggest patent improvements."""
-    if not model:
+    if not get_analysis_model():
         return ["API key not configured for detailed analysis"]
-    prompt = ("Suggest 3-5 specific improvements to strengthen this patent:"
-             "\n{text[:4000]}")
-    response = model.generate_content(prompt)
-    return [line.strip("•- ").strip() for line in response.text.strip().split("\n") if line.strip()]
-
-def find_similar_patents(text: str, top_k: int = 5) -> List[Dict]:
-    """Find similar patents in the database."""
-    # Use the embed_documents method from LangChain's GoogleGenerativeAIEmbeddings
-    # It expects a list of texts and returns a list of embeddings.
-    query_embedding = embedding_fn.embed_documents([text])
-    
-    results = chroma_connector.collection.query(
-        query_embeddings=query_embedding[0],  # Get the first (and only) embedding
-        n_results=top_k
+    return _split_bullets(_generate(_improvements_prompt(text)))
+
+def _split_bullets(response_text: str) -> List[str]:
+    return [line.strip("•- ").strip() for line in response_text.strip().split("\n") if line.strip()]
+
+# Field -> (function, prompt, response parser); the async path sends the same prompts
+FIELDS = {
+    "summary": (generate_summary, _summary_prompt, str.strip),
+    "noveltyScore": (score_novelty, _novelty_prompt, _parse_novelty),
+    "potentialIssues": (find_issues, _issues_prompt, _split_bullets),
+    "recommendations": (suggest_improvements, _improvements_prompt, _split_bullets),
+}
+
+STRUCTURED_PROMPT = """Analyze the following patent proposal and respond with a single JSON object with exactly these keys:
+"summary": a 3-5 sentence summary of the proposal,
+"noveltyScore": an integer from 0 to 100 rating its novelty, considering technical innovation and prior art,
+"potentialIssues": a list of 3-5 concise legal, technical, or novelty issues,
+"recommendations": a list of 3-5 specific improvements to strengthen the patent.
+Return only the JSON object.
+
+{text}"""
+
+def _parse_analysis_json(response_text: str) -> Dict:
+    # Tolerate a fenced ```json block even though we ask for raw JSON
+    cleaned = response_text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`").strip()
+        if cleaned.startswith("json"):
+            cleaned = cleaned[len("json"):]
+    data = json.loads(cleaned)
+    try:
+        score = min(100, max(0, int(data.get("noveltyScore", 60))))
+    except (TypeError, ValueError):
+        score = 60
+    return {
+        "summary": str(data.get("summary", "")).strip(),
+        "noveltyScore": score,
+        "potentialIssues": [str(item).strip() for item in data.get("potentialIssues", [])],
+        "recommendations": [str(item).strip() for item in data.get("recommendations", [])],
+    }
+
+def analyze_structured(text: str, max_chars: int = 5000) -> Dict:
+    """Generate summary, novelty score, issues and recommendations with a single Gemini call."""
+    if not get_analysis_model():
+        return {
+            "summary": generate_summary(text),
+            "noveltyScore": score_novelty(text),
+            "potentialIssues": find_issues(text),
+            "recommendations": suggest_improvements(text),
+        }
+    response_text = _generate(
+        STRUCTURED_PROMPT.format(text=text[:max_chars]),
+        generation_config={"response_mime_type": "application/json"},
     )
+    return _parse_analysis_json(response_text)
+
+REDUCE_PROMPT = """The following are analyses of consecutive sections of one patent proposal, in document order.
+Combine them into one analysis of the whole proposal and respond with a single JSON object with exactly these keys:
+"summary": a 3-5 sentence summary of the whole proposal,
+"noveltyScore": an integer from 0 to 100 rating the novelty of the proposal as a whole,
+"potentialIssues": a list of the 3-5 most important issues, merging duplicates,
+"recommendations": a list of the 3-5 most important improvements, merging duplicates.
+Return only the JSON object.
 
+{sections}"""
+
+def split_sections(chunks: List[str], max_chars: int, max_sections: int) -> List[str]:
+    """
+    Group consecutive chunks into sections of about `max_chars`. If that would give more than
+    `max_sections` sections, the sections are made larger instead, so the whole text is covered.
+    """
+    budget = max(max_chars, math.ceil(sum(len(chunk) for chunk in chunks) / max_sections))
+    sections, current, size = [], [], 0
+    for chunk in chunks:
+        if current and size + len(chunk) > budget:
+            sections.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(chunk)
+        size += len(chunk)
+    if current:
+        sections.append("\n\n".join(current))
+    if len(sections) > max_sections:
+        sections[max_sections - 1:] = ["\n\n".join(sections[max_sections - 1:])]
+    return sections
+
+def _dedupe(items: List[str]) -> List[str]:
+    seen, unique = set(), []
+    for item in items:
+        if item.lower() not in seen:
+            seen.add(item.lower())
+            unique.append(item)
+    return unique
+
+def merge_section_analyses(analyses: List[Dict], weights: List[int]) -> Dict:
+    """Combine section analyses without a model call: length-weighted score, joined summaries, first unique points."""
+    return {
+        "summary": " ".join(analysis["summary"] for analysis in analyses),
+        "noveltyScore": round(sum(a["noveltyScore"] * w for a, w in zip(analyses, weights)) / sum(weights)),
+        "potentialIssues": _dedupe([item for a in analyses for item in a["potentialIssues"]])[:5],
+        "recommendations": _dedupe([item for a in analyses for item in a["recommendations"]])[:5],
+    }
+
+def _reduce_prompt(analyses: List[Dict]) -> str:
+    sections = "\n\n".join(f"Section {number}:\n{json.dumps(analysis)}" for number, analysis in enumerate(analyses, 1))
+    return REDUCE_PROMPT.format(sections=sections)
+
+def reduce_section_analyses(analyses: List[Dict], weights: List[int]) -> Dict:
+    """Merge the per-section analyses with one more call, or locally if that call fails."""
+    if len(analyses) == 1:
+        return analyses[0]
+    try:
+        return _parse_analysis_json(_generate(
+            _reduce_prompt(analyses),
+            generation_config={"response_mime_type": "application/json"},
+        ))
+    except Exception as e:
+        print(f"⚠️ Merging section analyses failed ({e}); combining them locally")
+        return merge_section_analyses(analyses, weights)
+
+def _similar_patent(doc: str, meta: Dict, similarity: float) -> Dict:
+    return {
+        "id": meta.get("id", "N/A"),
+        "title": meta.get("title", "Untitled"),
+        "similarity": round(similarity, 2),
+        "date": meta.get("date", "Unknown"),
+        "assignee": meta.get("assignee", "N/A"),
+        "excerpt": doc[:200] + "..." if len(doc) > 200 else doc
+    }
+
+def _similarity(distance: float) -> float:
+    return max(0, 100 - distance * 100)  # Convert distance to similarity percentage
+
+def find_similar_patents(text: str, top_k: int = 5, chunks: Optional[List[str]] = None,
+                         exclude_document: Optional[str] = None) -> List[Dict]:
+    """
+    Find similar patents in the database.
+    With `chunks`, up to SIMILAR_MAX_CHUNKS passages spread over the document are searched separately
+    and each neighbouring patent is ranked by its summed best similarity per passage, so the whole
+    filing is matched rather than one embedding of its beginning.
+    `exclude_document` keeps a document's own chunks out of the results.
+    """
+    where = _exclude_where(exclude_document)
+    similar_index = get_vector_index(SIMILAR_PATENTS_COLLECTION)
+
+    if not chunks:
+        # Use the embed_documents method from LangChain's GoogleGenerativeAIEmbeddings
+        # It expects a list of texts and returns a list of embeddings.
+        query_embedding = get_embeddings().embed_documents([text])
+        with span("vector_search"):
+            hits = similar_index.query(query_embedding[0], k=top_k, where=where)  # Get the first (and only) embedding
+        return [_similar_patent(doc, meta, _similarity(distance)) for _, doc, meta, distance in hits]
+
+    vectors = get_embeddings().embed_documents(select_passages(chunks))
+    return [patent for _, patent in rank_similar(_search_passages(similar_index, vectors, top_k, where), top_k)]
+
+def _exclude_where(exclude_document: Optional[str]) -> Optional[Dict]:
+    if exclude_document and SIMILAR_PATENTS_COLLECTION == "langchain":
+        # Only the uploads collection contains the document itself (and has filename_base on every entry)
+        return {"filename_base": {"$ne": exclude_document}}
+    return None
+
+def _search_passages(similar_index, vectors, top_k: int, where: Optional[Dict]) -> List[List[tuple]]:
+    """Each passage's top_k * 2 hits as (doc, meta, distance), nearest first."""
+    hit_lists = []
+    for vector in vectors:
+        with span("vector_search"):
+            hits = similar_index.query(vector, k=top_k * 2, where=where)
+        hit_lists.append([(doc, meta, distance) for _, doc, meta, distance in hits])
+    return hit_lists
+
+def select_passages(chunks: List) -> List:
+    """Up to SIMILAR_MAX_CHUNKS items spread evenly over `chunks` (in document order)."""
+    count = min(len(chunks), SIMILAR_MAX_CHUNKS)
+    step = len(chunks) / count if count else 0
+    return [chunks[int(i * step)] for i in range(count)]
+
+def similar_patent_key(doc: str, meta: Dict) -> str:
+    # Chunks of one uploaded PDF, or one row of the CSV corpus, are the same patent
+    return meta.get("filename_base") or meta.get("id") or doc
+
+def rank_similar(hit_lists: List[List[tuple]], top_k: int = 5) -> List[tuple]:
+    """
+    (key, similar patent) pairs from the hits of each passage, given as (doc, meta, distance)
+    nearest first: each patent is ranked by its summed best similarity per passage.
+    """
+    totals: Dict[str, float] = {}
+    matches: Dict[str, int] = {}
+    best: Dict[str, tuple] = {}
+    for hits in hit_lists:
+        seen = set()
+        for doc, meta, distance in hits:
+            key = similar_patent_key(doc, meta)
+            if key in seen:
+                continue  # hits are nearest first, so this passage already counted the patent's best chunk
+            seen.add(key)
+            similarity = _similarity(distance)
+            totals[key] = totals.get(key, 0.0) + similarity
+            matches[key] = matches.get(key, 0) + 1
+            if key not in best or similarity > best[key][0]:
+                best[key] = (similarity, doc, meta)
+
+    ranked = sorted(totals, key=totals.get, reverse=True)[:top_k]
     similar = []
-    if results and results.get("documents") and results.get("metadatas") and results.get("distances"):
-        documents = results["documents"][0]  # type: ignore
-        metadatas = results["metadatas"][0]  # type: ignore
-        distances = results["distances"][0]  # type: ignore
-        for doc, meta, distance in zip(documents, metadatas, distances):
-            similarity = max(0, 100 - distance * 100)  # Convert distance to similarity percentage
-            similar.append({
-                "id": meta.get("id", "N/A"),
-                "title": meta.get("title", "Untitled"),
-                "similarity": round(similarity, 2),
-                "date": meta.get("date", "Unknown"),
-                "assignee": meta.get("assignee", "N/A"),
-                "excerpt": doc[:200] + "..." if len(doc) > 200 else doc
-            })
+    for key in ranked:
+        similarity, doc, meta = best[key]
+        similar.append((key, {**_similar_patent(doc, meta, similarity), "matchedSections": matches[key]}))
     return similar
 
-def analyze_patent(document_id: str) -> Optional[Dict]:
+def _timed(clock: _CallClock, fn: Callable[[], object]) -> Callable[[], object]:
+    def run():
+        clock.start()
+        _call_clock.set(clock)
+        return fn()
+    return run
+
+def _result(future, clock: _CallClock):
+    """future.result(), timing out only once the task has been running for ANALYSIS_CALL_TIMEOUT."""
+    while True:
+        remaining = clock.remaining()
+        try:
+            return future.result(timeout=CALL_POLL_SECONDS if remaining is None else max(0.0, remaining))
+        except FutureTimeoutError:
+            if clock.expired():
+                raise
+
+def _gather(tasks: Dict[str, Callable[[], object]]) -> Tuple[Dict[str, object], List[str]]:
     """
-    Analyze a specific patent document identified by document_id (filename_base).
-    Fetches all chunks for this document, reconstructs its text, and performs analysis.
+    Run each task on the shared executor and collect the results, plus the keys that fell back.
+    A task that fails, or runs for longer than ANALYSIS_CALL_TIMEOUT once started, is replaced by its
+    fallback value; waiting for a free worker doesn't count.
     """
-    try:
-        # URL decode the document_id to handle special characters
-        import urllib.parse
-        decoded_document_id = urllib.parse.unquote(document_id)
-        print(f"📄 Analyzing document: {decoded_document_id}")
-        
-        # Query ChromaDB for all chunks matching the document_id (filename_base)
-        results = chroma_connector.collection.get(
-            where={"filename_base": decoded_document_id}
-        )
+    clocks = {key: _CallClock() for key in tasks}
+    # Tasks run in the caller's context so their spans count towards the request's profile
+    futures = {key: _executor.submit(in_current_context(_timed(clocks[key], fn))) for key, fn in tasks.items()}
+    results, failed = {}, []
+    for key, future in futures.items():
+        try:
+            results[key] = _result(future, clocks[key])
+            continue
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"⏱️ Analysis step '{key}' timed out after {ANALYSIS_CALL_TIMEOUT}s")
+        except Exception as e:
+            print(f"❌ Analysis step '{key}' failed: {e}")
+        results[key] = FALLBACK_RESULTS.get(key)
+        failed.append(key)
+    return results, failed
 
-        if not results or not results['documents']:
-            print(f"❌ Document not found: {decoded_document_id}")
-            return None
-        
-        print(f"✅ Found {len(results['documents'])} document chunks")
+def _fallback_fields(failed: List[str]) -> List[str]:
+    """The result fields among `failed` task keys, in FALLBACK_RESULTS order."""
+    return [key for key in FALLBACK_RESULTS if key in failed]
 
-        # Sort documents by original page and chunk id if possible, though simple concatenation is often sufficient.
-        # The chunk_id was "source_full_path:page:chunk_index".
-        # For simplicity here, we'll just join them. If order is critical, more sophisticated sorting of chunks is needed.
-        # We assume 'documents' is a list of text strings.
-        full_text = "\n\n".join(results['documents'])
+def _map_sections(full_text: str, chunks: Optional[List[str]]) -> List[str]:
+    section_chars = ANALYSIS_SECTION_TOKENS * CHARS_PER_TOKEN
+    sections = split_sections(chunks or full_text.split("\n\n"), section_chars, ANALYSIS_MAX_SECTIONS)
+    print(f"🧩 Analyzing {len(sections)} sections of up to {max(len(section) for section in sections)} characters")
+    return sections
 
-        # Use metadata from the first chunk as representative, or aggregate if needed.
-        # For analysis, the primary input is the full_text. Metadata for the response can be tricky.
-        # Let's assume the 'title' for the analysis output can be the document_id itself,
-        # or if there's a title field in metadata from PDF extraction, that could be used.
-        # For now, using document_id as title.
+def _run_map_reduce(full_text: str, chunks: Optional[List[str]], similar: Callable[[], List[Dict]]) -> Dict:
+    """Analyze sections of the text in parallel (with the similar-patents search), then merge them."""
+    sections = _map_sections(full_text, chunks)
+    tasks = {
+        f"section {number}": (lambda section=section: analyze_structured(section, max_chars=len(section)))
+        for number, section in enumerate(sections, 1)
+    }
+    tasks["similarPatents"] = similar
+    results, failed = _gather(tasks)
+    similar_patents = results.pop("similarPatents")
 
-        # Use metadata from the first chunk for date/applicant if available, or defaults.
-        first_chunk_metadata = results['metadatas'][0] if results['metadatas'] else {}
+    analyzed = _analyzed_sections(results, sections)
+    if not analyzed:
+        merged = {key: FALLBACK_RESULTS[key] for key in FIELDS}
+        failed += list(FIELDS)
+    else:
+        merged = reduce_section_analyses([analysis for analysis, _ in analyzed], [size for _, size in analyzed])
+    return {**merged, "similarPatents": similar_patents, "fallbackFields": _fallback_fields(failed),
+            "sectionsAnalyzed": len(analyzed), "sectionsTotal": len(sections)}
 
-        print("🤖 Generating analysis...")
-        
+def _analyzed_sections(results: Dict[str, object], sections: List[str]) -> List[tuple]:
+    # Failed sections come back as None
+    return [(analysis, len(section)) for analysis, section in zip(results.values(), sections) if analysis]
+
+def run_analysis(full_text: str, mode: Optional[str] = None, chunks: Optional[List[str]] = None,
+                 document_id: Optional[str] = None, similar_patents: Optional[List[Dict]] = None) -> Dict:
+    """
+    Produce the summary, novelty score, issues, recommendations and similar patents for a text.
+    `mode` overrides ANALYSIS_MODE ("sequential", "concurrent", "structured", "mapreduce" or "auto").
+    `chunks` are the text's chunks in document order; with them, sections follow chunk boundaries and
+    similar patents are searched per passage. `document_id` is excluded from the similar patents.
+    `similar_patents`, if known already (the neighbour graph), replaces the search.
+    "fallbackFields" lists the fields that hold a timeout/error placeholder instead of a real result.
+    """
+    mode = mode or ANALYSIS_MODE
+    if mode == "auto":
+        mode = "mapreduce" if len(full_text) > MAP_REDUCE_MIN_CHARS else "concurrent"
+
+    def similar():
+        if similar_patents is not None:
+            return similar_patents
+        return find_similar_patents(full_text, chunks=chunks, exclude_document=document_id)
+
+    if mode == "mapreduce" and get_analysis_model():
+        return _run_map_reduce(full_text, chunks, similar)
+
+    if mode == "sequential":
         return {
-            "title": first_chunk_metadata.get("title_pdf", document_id),
-            "date": first_chunk_metadata.get("creation_date_pdf", "Unknown Date"),
-            "applicant": first_chunk_metadata.get("author_pdf", "Unknown Applicant"),
             "summary": generate_summary(full_text),
             "noveltyScore": score_novelty(full_text),
             "potentialIssues": find_issues(full_text),
             "recommendations": suggest_improvements(full_text),
-            "similarPatents": find_similar_patents(full_text),
+            "similarPatents": similar(),
+            "fallbackFields": [],
         }
+
+    if mode == "structured":
+        results, failed = _gather({
+            "structured": lambda: analyze_structured(full_text),
+            "similarPatents": similar,
+        })
+        structured = results.pop("structured")
+        if structured is None:
+            # The single call failed (bad JSON, timeout); fall back to one call per field
+            print("⚠️ Structured analysis failed, falling back to concurrent calls")
+            structured, field_failed = _gather({
+                "summary": lambda: generate_summary(full_text),
+                "noveltyScore": lambda: score_novelty(full_text),
+                "potentialIssues": lambda: find_issues(full_text),
+                "recommendations": lambda: suggest_improvements(full_text),
+            })
+            failed += field_failed
+        return {**structured, **results, "fallbackFields": _fallback_fields(failed)}
+
+    results, failed = _gather({
+        "summary": lambda: generate_summary(full_text),
+        "noveltyScore": lambda: score_novelty(full_text),
+        "potentialIssues": lambda: find_issues(full_text),
+        "recommendations": lambda: suggest_improvements(full_text),
+        "similarPatents": similar,
+    })
+    return {**results, "fallbackFields": _fallback_fields(failed)}
+
+def is_complete(analysis: Dict) -> bool:
+    """
+    False if any field is a timeout/error placeholder or a section went unanalyzed; such results must
+    not be cached. Reads the recorded fallbackFields, so it holds for results decoded from JSON too.
+    """
+    if analysis.get("sectionsAnalyzed") != analysis.get("sectionsTotal"):
+        return False
+    return not analysis.get("fallbackFields")
+
+def _load_document(document_id: str):
+    """(decoded document id, chunk texts in document order, first chunk's metadata), or None if it isn't stored."""
+    # URL decode the document_id to handle special characters
+    decoded_document_id = urllib.parse.unquote(document_id)
+    print(f"📄 Analyzing document: {decoded_document_id}")
+
+    # Query ChromaDB for all chunks matching the document_id (filename_base)
+    with span("document_fetch"):
+        results = get_vector_index().get(
+            where={"filename_base": decoded_document_id}
+        )
+
+    if not results or not results['documents']:
+        print(f"❌ Document not found: {decoded_document_id}")
+        return None
+
+    print(f"✅ Found {len(results['documents'])} document chunks")
+
+    # The store returns chunks in no particular order; the chunk_id is "document_name:page:chunk_index"
+    ordered = sorted(
+        zip(results['ids'], results['documents'], results['metadatas']),
+        key=lambda chunk: chunk_position(chunk[0]),
+    )
+    # Use metadata from the first chunk for date/applicant if available, or defaults.
+    return decoded_document_id, [text for _, text, _ in ordered], ordered[0][2] or {}
+
+def _cached_analysis(full_text: str):
+    """(cache key, cached analysis or None); results are keyed by the text itself, so an unchanged document hits."""
+    cache = get_analysis_cache()
+    cache_key = cache.make_key(full_text, MODEL_NAME, f"{PROMPT_VERSION}:{ANALYSIS_MODE}")
+    analysis = cache.get(cache_key)
+    if analysis is not None:
+        print("⚡ Analysis served from cache")
+    else:
+        print("🤖 Generating analysis...")
+    return cache_key, analysis
+
+def _stored_similar_patents(document_id: str) -> Optional[List[Dict]]:
+    """The document's similar patents from the neighbour graph, or None to search live."""
+    from app.services.neighbor_graph import NEIGHBOR_GRAPH, get_neighbor_graph
+
+    if not NEIGHBOR_GRAPH:
+        return None
+    similar_patents = get_neighbor_graph().lookup(document_id)
+    if similar_patents is None:
+        print("🔎 Not in the neighbour graph yet, searching similar patents live")
+    return similar_patents
+
+def _store_analysis(cache_key: str, document_id: str, analysis: Dict):
+    if get_analysis_model() and is_complete(analysis):
+        get_analysis_cache().put(cache_key, document_id, analysis)
+
+def _analysis_response(document_id: str, first_chunk_metadata: Dict, analysis: Dict) -> Dict:
+    # For analysis, the primary input is the full_text; the response's title, date and applicant
+    # come from the PDF metadata of the first chunk, with the document_id as the fallback title.
+    return {
+        "title": first_chunk_metadata.get("title_pdf", document_id),
+        "date": first_chunk_metadata.get("creation_date_pdf", "Unknown Date"),
+        "applicant": first_chunk_metadata.get("author_pdf", "Unknown Applicant"),
+        **analysis,
+    }
+
+def analyze_patent(document_id: str) -> Optional[Dict]:
+    """
+    Analyze a specific patent document identified by document_id (filename_base).
+    Fetches all chunks for this document, reconstructs its text, and performs analysis.
+    Concurrent requests for the same document share one analysis (see single_flight.py).
+    """
+    # Keyed by the decoded id, so "a%20b.pdf" and "a b.pdf" share one analysis
+    return get_single_flight().run("analysis", urllib.parse.unquote(document_id), lambda: _analyze_patent(document_id))
+
+def _analyze_patent(document_id: str) -> Optional[Dict]:
+    try:
+        loaded = _load_document(document_id)
+        if loaded is None:
+            return None
+        decoded_document_id, chunk_texts, first_chunk_metadata = loaded
+        full_text = "\n\n".join(chunk_texts)
+
+        cache_key, analysis = _cached_analysis(full_text)
+        if analysis is None:
+            analysis = run_analysis(full_text, chunks=chunk_texts, document_id=decoded_document_id,
+                                    similar_patents=_stored_similar_patents(decoded_document_id))
+            _store_analysis(cache_key, decoded_document_id, analysis)
+
+        return _analysis_response(decoded_document_id, first_chunk_metadata, analysis)
     except Exception as e:
         print(f"Error analyzing document {document_id}: {e}")
         # import traceback; traceback.print_exc() # For detailed debugging
@@ -147,4 +593,181 @@ def analyze_patent(document_id: str) -> Optional[Dict]:
 
     # except Exception as e:
     #     print(f"Error analyzing document: {e}")
-    #     return None
\ No newline at end of file
+    #     return None
+# --- Async analysis (app/asgi.py) ---
+# The same analysis with the Gemini and embedding calls awaited, so a request waiting on them holds
+# no thread; the chunk fetch, the caches and the vector searches run in worker threads.
+
+async def _agenerate(prompt: str, **kwargs) -> str:
+    """_generate for coroutines, on the model's async client."""
+    clock = _call_clock.get()
+    if clock:
+        clock.pause()
+    with span("llm_rate_limit"):
+        await llm_rate_limiter.acquire_async()
+    if clock:
+        clock.start()
+    try:
+        with span("llm"):
+            response = await get_analysis_model().generate_content_async(
+                prompt, request_options={"timeout": ANALYSIS_CALL_TIMEOUT}, **kwargs)
+            text = response.text
+    except Exception:
+        LLM_REQUESTS.inc(model=MODEL_NAME, status="error")
+        raise
+    usage = getattr(response, "usage_metadata", None)
+    record_llm_call(MODEL_NAME, prompt, text, getattr(usage, "prompt_token_count", None),
+                    getattr(usage, "candidates_token_count", None))
+    return text
+
+async def _afield(key: str, text: str):
+    function, prompt, parse = FIELDS[key]
+    if not get_analysis_model():
+        return function(text)  # the placeholder, no call is made
+    return parse(await _agenerate(prompt(text)))
+
+async def aanalyze_structured(text: str, max_chars: int = 5000) -> Dict:
+    if not get_analysis_model():
+        return analyze_structured(text, max_chars)
+    response_text = await _agenerate(
+        STRUCTURED_PROMPT.format(text=text[:max_chars]),
+        generation_config={"response_mime_type": "application/json"},
+    )
+    return _parse_analysis_json(response_text)
+
+async def areduce_section_analyses(analyses: List[Dict], weights: List[int]) -> Dict:
+    if len(analyses) == 1:
+        return analyses[0]
+    try:
+        return _parse_analysis_json(await _agenerate(
+            _reduce_prompt(analyses),
+            generation_config={"response_mime_type": "application/json"},
+        ))
+    except Exception as e:
+        print(f"⚠️ Merging section analyses failed ({e}); combining them locally")
+        return merge_section_analyses(analyses, weights)
+
+async def _agather(tasks: Dict[str, Callable[[], Awaitable]]) -> Tuple[Dict[str, object], List[str]]:
+    """_gather for coroutine functions: all run at once, each replaced by its fallback value on failure or timeout."""
+    async def timed(task):
+        clock = _CallClock()
+        clock.start()
+        _call_clock.set(clock)  # each run() is its own asyncio task, with its own copy of the context
+        future = asyncio.ensure_future(task())
+        try:
+            while True:
+                remaining = clock.remaining()
+                await asyncio.wait({future}, timeout=CALL_POLL_SECONDS if remaining is None else max(0.0, remaining))
+                if future.done():
+                    return future.result()
+                if clock.expired():
+                    raise asyncio.TimeoutError
+        finally:
+            future.cancel()
+
+    failed = []
+
+    async def run(key, task):
+        try:
+            return await timed(task)
+        except asyncio.TimeoutError:
+            print(f"⏱️ Analysis step '{key}' timed out after {ANALYSIS_CALL_TIMEOUT}s")
+        except Exception as e:
+            print(f"❌ Analysis step '{key}' failed: {e}")
+        failed.append(key)
+        return FALLBACK_RESULTS.get(key)
+
+    results = await asyncio.gather(*(run(key, task) for key, task in tasks.items()))
+    return dict(zip(tasks, results)), failed
+
+async def afind_similar_patents(text: str, top_k: int = 5, chunks: Optional[List[str]] = None,
+                                exclude_document: Optional[str] = None) -> List[Dict]:
+    where = _exclude_where(exclude_document)
+    similar_index = get_vector_index(SIMILAR_PATENTS_COLLECTION)
+    if not chunks:
+        query_embedding = await get_embeddings().aembed_documents([text])
+        with span("vector_search"):
+            hits = await asyncio.to_thread(similar_index.query, query_embedding[0], top_k, where)
+        return [_similar_patent(doc, meta, _similarity(distance)) for _, doc, meta, distance in hits]
+
+    vectors = await get_embeddings().aembed_documents(select_passages(chunks))
+    hit_lists = await asyncio.to_thread(_search_passages, similar_index, vectors, top_k, where)
+    return [patent for _, patent in rank_similar(hit_lists, top_k)]
+
+async def arun_analysis(full_text: str, mode: Optional[str] = None, chunks: Optional[List[str]] = None,
+                        document_id: Optional[str] = None, similar_patents: Optional[List[Dict]] = None) -> Dict:
+    """run_analysis for coroutines; same modes and results."""
+    mode = mode or ANALYSIS_MODE
+    if mode == "auto":
+        mode = "mapreduce" if len(full_text) > MAP_REDUCE_MIN_CHARS else "concurrent"
+
+    async def similar():
+        if similar_patents is not None:
+            return similar_patents
+        return await afind_similar_patents(full_text, chunks=chunks, exclude_document=document_id)
+
+    def field_tasks():
+        return {key: (lambda key=key: _afield(key, full_text)) for key in FIELDS}
+
+    if mode == "mapreduce" and get_analysis_model():
+        sections = _map_sections(full_text, chunks)
+        tasks = {
+            f"section {number}": (lambda section=section: aanalyze_structured(section, max_chars=len(section)))
+            for number, section in enumerate(sections, 1)
+        }
+        tasks["similarPatents"] = similar
+        results, failed = await _agather(tasks)
+        similar_found = results.pop("similarPatents")
+        analyzed = _analyzed_sections(results, sections)
+        if not analyzed:
+            merged = {key: FALLBACK_RESULTS[key] for key in FIELDS}
+            failed += list(FIELDS)
+        else:
+            merged = await areduce_section_analyses([analysis for analysis, _ in analyzed],
+                                                    [size for _, size in analyzed])
+        return {**merged, "similarPatents": similar_found, "fallbackFields": _fallback_fields(failed),
+                "sectionsAnalyzed": len(analyzed), "sectionsTotal": len(sections)}
+
+    if mode == "sequential":
+        analysis = {key: await _afield(key, full_text) for key in FIELDS}
+        return {**analysis, "similarPatents": await similar(), "fallbackFields": []}
+
+    if mode == "structured":
+        results, failed = await _agather({
+            "structured": lambda: aanalyze_structured(full_text),
+            "similarPatents": similar,
+        })
+        structured = results.pop("structured")
+        if structured is None:
+            print("⚠️ Structured analysis failed, falling back to concurrent calls")
+            structured, field_failed = await _agather(field_tasks())
+            failed += field_failed
+        return {**structured, **results, "fallbackFields": _fallback_fields(failed)}
+
+    results, failed = await _agather({**field_tasks(), "similarPatents": similar})
+    return {**results, "fallbackFields": _fallback_fields(failed)}
+
+async def aanalyze_patent(document_id: str) -> Optional[Dict]:
+    """analyze_patent for coroutines (app/asgi.py); it shares in-flight analyses with the threaded callers."""
+    return await get_single_flight().arun("analysis", urllib.parse.unquote(document_id),
+                                          lambda: _aanalyze_patent(document_id))
+
+async def _aanalyze_patent(document_id: str) -> Optional[Dict]:
+    try:
+        loaded = await asyncio.to_thread(_load_document, document_id)
+        if loaded is None:
+            return None
+        decoded_document_id, chunk_texts, first_chunk_metadata = loaded
+        full_text = "\n\n".join(chunk_texts)
+
+        cache_key, analysis = await asyncio.to_thread(_cached_analysis, full_text)
+        if analysis is None:
+            similar_patents = await asyncio.to_thread(_stored_similar_patents, decoded_document_id)
+            analysis = await arun_analysis(full_text, chunks=chunk_texts, document_id=decoded_document_id,
+                                           similar_patents=similar_patents)
+            await asyncio.to_thread(_store_analysis, cache_key, decoded_document_id, analysis)
+
+        return _analysis_response(decoded_document_id, first_chunk_metadata, analysis)
+    except Exception as e:
+        print(f"Error analyzing document {document_id}: {e}")
+        return None
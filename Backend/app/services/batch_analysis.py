@@ -0,0 +1,264 @@
+# app/services/batch_analysis.py
+# Portfolio runs: analyze many documents on a bounded pool and stream one JSON record per document.
+# Every finished document is stored under the run id, so an interrupted run resumes where it stopped.
+#
+#   python -m app.services.batch_analysis --all --concurrency 4 --requests-per-minute 120
+#   python -m app.services.batch_analysis a.pdf b.pdf --run-id <id from an earlier run>
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional
+
+from app.services.paths import STATE_DIR
+from app.services.manifest import get_manifest
+from app.services.rate_limit import TokenBucket
+from app.services.resources import get_vector_index
+from app.services import analysis_service
+
+BATCH_DB_PATH = os.environ.get("BATCH_DB_PATH", os.path.join(STATE_DIR, "batch_runs.sqlite"))
+BATCH_ANALYSIS_CONCURRENCY = int(os.environ.get("BATCH_ANALYSIS_CONCURRENCY", "4"))
+# Most documents analyzed at once across all runs in the process; a run's concurrency is capped to it
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_DOCUMENTS = int(os.environ.get("BATCH_MAX_DOCUMENTS", "5000"))
+
+
+class BatchRunStore:
+    """Per-run document results in SQLite. Only "done" results are reused when a run is resumed."""
+
+    def __init__(self, path: str = BATCH_DB_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, document_ids TEXT, created_at REAL, updated_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " run_id TEXT, document_id TEXT, status TEXT, result TEXT, error TEXT, seconds REAL, finished_at REAL,"
+            " PRIMARY KEY (run_id, document_id))"
+        )
+        self._conn.commit()
+
+    def create(self, document_ids: List[str], run_id: Optional[str] = None) -> str:
+        """Start a run, or resume `run_id`; ids the run doesn't have yet are appended to its list."""
+        run_id = run_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT document_ids FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO runs (run_id, document_ids, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (run_id, json.dumps(document_ids), now, now),
+                )
+            else:
+                stored = json.loads(row[0])
+                known = set(stored)
+                merged = stored + [document_id for document_id in document_ids if document_id not in known]
+                self._conn.execute(
+                    "UPDATE runs SET document_ids = ?, updated_at = ? WHERE run_id = ?",
+                    (json.dumps(merged), now, run_id),
+                )
+            self._conn.commit()
+        return run_id
+
+    def get_run(self, run_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_ids, created_at, updated_at FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM results WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall())
+        document_ids = json.loads(row[0])
+        return {
+            "run_id": run_id,
+            "documents": len(document_ids),
+            "document_ids": document_ids,
+            "counts": counts,
+            "remaining": len(document_ids) - counts.get("done", 0),
+            "created_at": row[1],
+            "updated_at": row[2],
+        }
+
+    def finished(self, run_id: str) -> Dict[str, Dict]:
+        """Stored "done" records of a run by document id."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, result, seconds FROM results WHERE run_id = ? AND status = 'done'", (run_id,)
+            ).fetchall()
+        return {document_id: {"result": json.loads(result), "seconds": seconds} for document_id, result, seconds in rows}
+
+    def record(self, run_id: str, document_id: str, status: str, result: Optional[Dict], error: Optional[str],
+               seconds: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (run_id, document_id, status, result, error, seconds, finished_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, document_id, status, json.dumps(result) if result is not None else None, error, seconds,
+                 time.time()),
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time(), run_id))
+            self._conn.commit()
+
+
+_store: Optional[BatchRunStore] = None
+_store_lock = threading.Lock()
+
+
+def get_batch_store() -> BatchRunStore:
+    """Return the process-wide batch run store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BatchRunStore()
+    return _store
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """The pool every batch run analyzes its documents on, BATCH_MAX_CONCURRENCY threads."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, BATCH_MAX_CONCURRENCY), thread_name_prefix="batch")
+    return _executor
+
+
+def list_all_documents() -> List[str]:
+    """
+    Every ingested document: those in the manifest, and those whose chunks were stored before the
+    manifest existed (found by their filename_base).
+    """
+    stored = get_vector_index().get()
+    stored_ids = {(metadata or {}).get("filename_base") for metadata in stored["metadatas"]} - {None}
+    return sorted(stored_ids | set(get_manifest().list_documents()))
+
+
+def set_rate_limit(requests_per_minute: float):
+    """Cap Gemini calls per minute for every analysis in this process (0 removes the cap)."""
+    analysis_service.llm_rate_limiter = TokenBucket(
+        rate=requests_per_minute / 60.0, capacity=analysis_service.ANALYSIS_MAX_WORKERS
+    )
+
+
+def _analyze_one(run_id: str, document_id: str) -> Dict:
+    started = time.perf_counter()
+    try:
+        result = analysis_service.analyze_patent(document_id)
+        error = None if result else "Analysis not found or failed"
+    except Exception as e:
+        result, error = None, str(e)
+    seconds = round(time.perf_counter() - started, 3)
+    if result is None:
+        status = "failed"
+    elif analysis_service.is_complete(result):
+        status = "done"
+    else:
+        status = "partial"  # some calls fell back to placeholders; retried when the run is resumed
+    # Stored from the worker, so results survive a client that disconnects mid-run
+    get_batch_store().record(run_id, document_id, status, result, error, seconds)
+    return {"type": "result", "run_id": run_id, "document_id": document_id, "status": status,
+            "seconds": seconds, "result": result, "error": error}
+
+
+def run_batch(document_ids: List[str], run_id: Optional[str] = None,
+              concurrency: int = BATCH_ANALYSIS_CONCURRENCY) -> Iterator[Dict]:
+    """
+    Analyze `document_ids` with at most `concurrency` (capped to BATCH_MAX_CONCURRENCY) documents in
+    flight and yield one record per
+    document as it finishes, then a summary record. With the `run_id` of an earlier run, documents
+    that already finished are replayed from the store instead of being analyzed again.
+    Closing the generator cancels the documents that haven't started.
+    """
+    store = get_batch_store()
+    concurrency = min(max(1, concurrency), BATCH_MAX_CONCURRENCY)
+    document_ids = list(dict.fromkeys(document_ids))  # drop duplicates, keep order
+    run_id = store.create(document_ids, run_id)
+    finished = store.finished(run_id)
+    started = time.perf_counter()
+    counts = {"done": 0, "partial": 0, "failed": 0, "resumed": 0}
+
+    for document_id in document_ids:
+        if document_id in finished:
+            counts["resumed"] += 1
+            yield {"type": "result", "run_id": run_id, "document_id": document_id, "status": "done",
+                   "resumed": True, **finished[document_id], "error": None}
+    pending = [document_id for document_id in document_ids if document_id not in finished]
+    print(f"📦 Batch {run_id}: {len(pending)} to analyze, {counts['resumed']} already done, concurrency {concurrency}")
+
+    executor = _get_executor()
+    in_flight = set()
+    try:
+        queue = iter(pending)
+        # Submit lazily so at most `concurrency` documents are queued or running
+        for document_id in queue:
+            in_flight.add(executor.submit(_analyze_one, run_id, document_id))
+            if len(in_flight) >= concurrency:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                counts[record["status"]] += 1
+                yield record
+                next_id = next(queue, None)
+                if next_id is not None:
+                    in_flight.add(executor.submit(_analyze_one, run_id, next_id))
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    yield {"type": "summary", "run_id": run_id, "documents": len(document_ids), **counts,
+           "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many documents and write the results as NDJSON.")
+    parser.add_argument("document_ids", nargs="*", help="documents to analyze (filename_base)")
+    parser.add_argument("--all", action="store_true", help="analyze every ingested document")
+    parser.add_argument("--run-id", help="resume this run; finished documents are not analyzed again")
+    parser.add_argument("--concurrency", type=int, default=BATCH_ANALYSIS_CONCURRENCY, help="documents in flight")
+    parser.add_argument("--requests-per-minute", type=float, default=None, help="cap on Gemini calls per minute")
+    parser.add_argument("--output", help="NDJSON output file (default: batch_<run_id>.ndjson)")
+    args = parser.parse_args()
+
+    document_ids = args.document_ids
+    if args.run_id and not document_ids and not args.all:
+        run = get_batch_store().get_run(args.run_id)
+        if run is None:
+            parser.error(f"unknown run id {args.run_id}")
+        document_ids = run["document_ids"]
+    elif args.all:
+        document_ids = list_all_documents()
+    if not document_ids:
+        parser.error("give document ids, --all, or the --run-id of an earlier run")
+    if args.requests_per_minute is not None:
+        set_rate_limit(args.requests_per_minute)
+
+    run_id = args.run_id or uuid.uuid4().hex
+    output = args.output or f"batch_{run_id}.ndjson"
+    # Service logs go to stdout, so the records are written to a file
+    with open(output, "w") as f:
+        for record in run_batch(document_ids, run_id, args.concurrency):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            if record["type"] == "summary":
+                print(f"✅ Batch {run_id}: {record['done'] + record['resumed']} done, {record['partial']} partial, "
+                      f"{record['failed']} failed in {record['seconds']}s → {output}")
+
+
+if __name__ == "__main__":
+    main()
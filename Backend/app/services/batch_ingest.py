@@ -0,0 +1,55 @@
+# app/services/batch_ingest.py
+# Ingest a directory of PDFs. Whole files are parsed and split in parallel on a process pool,
+# while embedding and storing stay in this process (one writer to ChromaDB).
+#
+#   python -m app.services.batch_ingest /path/to/pdfs --workers 8
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.services.load_documents import load_and_split_pdf
+from app.services.process import process_pdf_to_chroma, is_unchanged
+
+
+def _parse(pdf_path: str):
+    # Each worker handles a whole file, so no nested page-level pool
+    return load_and_split_pdf(pdf_path, workers=1)
+
+
+def ingest_directory(pdf_dir: str, workers: int = os.cpu_count() or 1):
+    pdf_paths = sorted(
+        os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")
+    )
+    pending = [path for path in pdf_paths if not is_unchanged(path)]
+    print(f"📚 {len(pdf_paths)} PDFs found, {len(pdf_paths) - len(pending)} already up to date")
+
+    started = time.perf_counter()
+    ingested, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_parse, path): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                chunks = future.result()
+                ingested.append(process_pdf_to_chroma(path, chunks=chunks))
+            except Exception as e:
+                print(f"❌ Failed to ingest {os.path.basename(path)}: {e}")
+                failed.append(path)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Ingested {len(ingested)} PDFs in {elapsed:.1f}s ({len(failed)} failed)")
+    return ingested, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest every PDF in a directory into ChromaDB.")
+    parser.add_argument("pdf_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="PDFs parsed in parallel")
+    args = parser.parse_args()
+    _, failed = ingest_directory(args.pdf_dir, args.workers)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# app/services/chunking.py
+# Splits extracted PDF pages into the chunks that are embedded and stored.
+#
+#   fixed   500-character windows with 80 characters of overlap, split page by page (the original splitter)
+#   patent  follows the filing's structure: sections (abstract, field, background, summary, drawings,
+#           description, claims), then numbered paragraphs ([0012]) or claims ("12. The method of claim 1"),
+#           packed into chunks of about CHUNK_TARGET_TOKENS. The text is read as one stream, so a
+#           paragraph that continues on the next page stays in one chunk; no overlap is added.
+#
+# Both return LangChain Documents with "source" and "page" metadata; a patent chunk carries the page
+# it starts on and its section.
+#
+#   python -m benchmarks.bench_chunking     # chunk count, embedding cost and hit rate per strategy
+import bisect
+import os
+import re
+from typing import TYPE_CHECKING, List, NamedTuple, Tuple
+
+from app.services.metrics import estimate_tokens
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", "patent")
+CHUNK_TARGET_TOKENS = int(os.environ.get("CHUNK_TARGET_TOKENS", "256"))
+# A single paragraph or claim up to this size stays whole; longer ones are split at sentences
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "400"))
+# A section's last chunk smaller than this is appended to the one before it
+CHUNK_MIN_TOKENS = int(os.environ.get("CHUNK_MIN_TOKENS", "64"))
+
+STRATEGIES = ("fixed", "patent")
+# Strategies that split each page on its own, so page ranges can be split in parallel workers
+PAGE_LOCAL_STRATEGIES = ("fixed",)
+
+# Section name -> heading, matched against a whole line
+SECTION_HEADINGS = [
+    ("abstract", r"abstract(?: of the disclosure)?"),
+    ("field", r"(?:technical )?field(?: of the (?:invention|disclosure))?"),
+    ("background", r"background(?: of the (?:invention|disclosure))?|(?:description of (?:the )?)?related art"),
+    ("summary", r"(?:brief )?summary(?: of the (?:invention|disclosure))?"),
+    ("drawings", r"brief description of (?:the )?(?:drawings|figures)"),
+    ("description", r"(?:detailed )?description(?: of (?:the )?(?:invention|(?:preferred |example )?embodiments?))?"),
+    ("claims", r"claims|what is claimed is:?|(?:we|i) claim:?|the invention claimed is:?"),
+]
+HEADING_RE = re.compile(
+    r"^[ \t]*(?:" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in SECTION_HEADINGS) + r")[ \t]*\.?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+PARAGRAPH_RE = re.compile(r"^[ \t]*\[\d{3,5}\]", re.MULTILINE)  # [0012]
+CLAIM_RE = re.compile(r"^[ \t]*\d{1,3}[ \t]*[.)][ \t]+(?=\S)", re.MULTILINE)  # 12. The method of claim 1
+BLANK_LINE_RE = re.compile(r"\n[ \t]*\n")
+SENTENCE_END_RE = re.compile(r"(?<=[.;:])\s+(?=[A-Z(\[\"0-9])")
+
+
+class _Unit(NamedTuple):
+    text: str
+    start: int  # offset in the document text, for the page lookup
+    section: str
+
+
+def fixed_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=80,
+        length_function=len
+    )
+
+
+def _sections(text: str) -> List[Tuple[str, int, int]]:
+    """(section, start, end) spans; text before the first heading (title, front page) is "front"."""
+    bounds = [("front", 0)]
+    for match in HEADING_RE.finditer(text):
+        bounds.append((match.lastgroup, match.start()))
+    spans = []
+    for (section, start), (_, end) in zip(bounds, bounds[1:] + [("", len(text))]):
+        if text[start:end].strip():
+            spans.append((section, start, end))
+    return spans
+
+
+def _units(text: str, section: str, start: int, end: int) -> List[_Unit]:
+    """Split a section at claims (in the claims section), numbered paragraphs, or else blank lines."""
+    body = text[start:end]
+    pattern = CLAIM_RE if section == "claims" else PARAGRAPH_RE
+    cuts = [match.start() for match in pattern.finditer(body)]
+    if not cuts:
+        cuts = [match.end() for match in BLANK_LINE_RE.finditer(body)]
+    units = []
+    for left, right in zip([0] + cuts, cuts + [len(body)]):
+        # Lines are wrapped at the page width, so collapse the line breaks inside a unit
+        unit_text = " ".join(body[left:right].split())
+        if unit_text:
+            units.append(_Unit(unit_text, start + left, section))
+    return units
+
+
+def _split_words(text: str, target_tokens: int) -> List[str]:
+    words = text.split(" ")
+    step = max(1, len(words) * target_tokens // max(1, estimate_tokens(text)))
+    return [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+
+def _split_long(unit: _Unit, target_tokens: int) -> List[_Unit]:
+    """Pieces of an oversized unit of about `target_tokens`, cut at sentence ends (at words inside a long sentence)."""
+    sentences = []
+    for sentence in SENTENCE_END_RE.split(unit.text):
+        if estimate_tokens(sentence) > target_tokens:
+            sentences.extend(_split_words(sentence, target_tokens))
+        else:
+            sentences.append(sentence)
+    pieces, current = [], ""
+    for sentence in sentences:
+        candidate = f"{current} {sentence}" if current else sentence
+        if current and estimate_tokens(candidate) > target_tokens:
+            pieces.append(current)
+            candidate = sentence
+        current = candidate
+    if current:
+        pieces.append(current)
+    # Pieces keep the unit's offset: they start on its page or shortly after
+    return [_Unit(piece, unit.start, unit.section) for piece in pieces]
+
+
+def _pack(units: List[_Unit], target_tokens: int, max_tokens: int, min_tokens: int) -> List[_Unit]:
+    """Join consecutive units of one section into chunks of up to `target_tokens`."""
+    chunks: List[_Unit] = []
+    current = None
+    for unit in units:
+        if estimate_tokens(unit.text) > max_tokens:
+            pieces = _split_long(unit, target_tokens)
+        else:
+            pieces = [unit]
+        for piece in pieces:
+            if current and current.section == piece.section and \
+                    estimate_tokens(current.text) + estimate_tokens(piece.text) <= target_tokens:
+                current = current._replace(text=f"{current.text}\n{piece.text}")
+                continue
+            if current:
+                chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+
+    # Fold a small section tail into the chunk before it when the result stays within the maximum
+    packed: List[_Unit] = []
+    for index, chunk in enumerate(chunks):
+        section_ends = index + 1 == len(chunks) or chunks[index + 1].section != chunk.section
+        if section_ends and packed and packed[-1].section == chunk.section and \
+                estimate_tokens(chunk.text) < min_tokens and \
+                estimate_tokens(packed[-1].text) + estimate_tokens(chunk.text) <= max_tokens:
+            packed[-1] = packed[-1]._replace(text=f"{packed[-1].text}\n{chunk.text}")
+        else:
+            packed.append(chunk)
+    return packed
+
+
+def split_patent(pages: List["Document"], target_tokens: int = CHUNK_TARGET_TOKENS,
+                 max_tokens: int = CHUNK_MAX_TOKENS, min_tokens: int = CHUNK_MIN_TOKENS) -> List["Document"]:
+    """Structure-aware chunks of the pages of one document, in document order."""
+    from langchain.schema import Document
+
+    if not pages:
+        return []
+    texts, page_starts, page_numbers, offset = [], [], [], 0
+    for page in pages:
+        page_starts.append(offset)
+        page_numbers.append(page.metadata.get("page", 0))
+        texts.append(page.page_content)
+        offset += len(page.page_content) + 1
+    text = "\n".join(texts)
+
+    units = []
+    for section, start, end in _sections(text):
+        units.extend(_units(text, section, start, end))
+    metadata = {key: value for key, value in pages[0].metadata.items() if key != "page"}
+    return [
+        Document(page_content=chunk.text, metadata={
+            **metadata,
+            "page": page_numbers[bisect.bisect_right(page_starts, chunk.start) - 1],
+            "section": chunk.section,
+        })
+        for chunk in _pack(units, target_tokens, max_tokens, min_tokens)
+    ]
+
+
+def split_documents(pages: List["Document"], strategy: str = CHUNKING_STRATEGY) -> List["Document"]:
+    """Chunks of extracted pages (one Document per page, in page order) using `strategy`."""
+    if strategy == "fixed":
+        return fixed_splitter().split_documents(pages)
+    if strategy == "patent":
+        # Pages of several files are chunked file by file, so no chunk spans two documents
+        by_source = {}
+        for page in pages:
+            by_source.setdefault(page.metadata.get("source"), []).append(page)
+        return [chunk for source_pages in by_source.values() for chunk in split_patent(source_pages)]
+    raise ValueError(f"Unknown chunking strategy: {strategy!r} (expected one of {', '.join(STRATEGIES)})")
@@ -0,0 +1,182 @@
+# app/services/context_builder.py
+# Turns the retrieved chunks into the context of the /query prompt. Neighbouring chunks of one page
+# share up to 80 characters of overlap, and the same paragraph often comes back from several
+# uploads, so concatenating the hits verbatim repeats text. Here adjacent chunks are merged,
+# near-duplicates dropped, passages optionally re-ranked against the question, and the result
+# packed into a token budget.
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.services.chunking import CHUNK_TARGET_TOKENS
+from app.services.lexical_index import tokenize
+from app.services.metrics import estimate_tokens, CHARS_PER_TOKEN
+from app.services.process import chunk_position
+
+# Set to 0 to send the retrieved chunks unchanged, as before
+CONTEXT_BUILDER_ENABLED = os.environ.get("CONTEXT_BUILDER", "1") != "0"
+# Chunks retrieved per question (vector_db/db_handler.py); the default budget holds that many
+# chunks of the chunker's target size, so it trims the occasional long chunk rather than every context
+CONTEXT_CHUNKS = 5
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", str(CONTEXT_CHUNKS * CHUNK_TARGET_TOKENS)))
+# Share of a passage's word 3-grams found in a better-ranked passage (of the shorter of the two)
+# above which it counts as a duplicate
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# Re-rank passages by how many of the question's terms they contain (ties keep retrieval order)
+CONTEXT_RERANK = os.environ.get("CONTEXT_RERANK", "0") == "1"
+
+MAX_OVERLAP_CHARS = 200  # longest chunk overlap looked for when merging
+MIN_TRUNCATED_TOKENS = 40  # a passage cut shorter than this is dropped instead
+SEPARATOR = "\n\n---\n\n"
+
+
+class Passage(NamedTuple):
+    text: str
+    chunk_ids: List[str]
+    rank: int  # best retrieval rank among its chunks, 0 = best
+
+
+class Context(NamedTuple):
+    text: str
+    passages: List[Passage]
+    stats: Dict
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that `right` starts with."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_key(metadata: Dict) -> Optional[Tuple[str, float, float]]:
+    chunk_id = metadata.get("id")
+    if not chunk_id:
+        return None
+    page, index = chunk_position(chunk_id)
+    if page == float("inf"):
+        return None
+    return chunk_id.rsplit(":", 2)[0], page, index
+
+
+def merge_adjacent(chunks: Sequence[Tuple[str, Dict]]) -> List[Passage]:
+    """
+    Merge chunks that follow each other on the same page into one passage, dropping the text they
+    share. `chunks` are (text, metadata) in retrieval order; passages keep the best rank of their parts.
+    """
+    keyed = []
+    for rank, (text, metadata) in enumerate(chunks):
+        keyed.append((_merge_key(metadata or {}), rank, text, (metadata or {}).get("id", "Unknown")))
+    # Walk each page's chunks in document order
+    ordered = sorted(keyed, key=lambda item: (item[0] is None, item[0] or ("", 0, 0), item[1]))
+    passages: List[Passage] = []
+    previous_key = None
+    for key, rank, text, chunk_id in ordered:
+        if passages and key and previous_key and key[:2] == previous_key[:2] and key[2] == previous_key[2] + 1:
+            last = passages[-1]
+            overlap = _overlap(last.text, text)
+            joined = last.text + text[overlap:] if overlap else f"{last.text} {text}"
+            passages[-1] = Passage(joined, last.chunk_ids + [chunk_id], min(last.rank, rank))
+        elif passages and key and previous_key == key:
+            continue  # the same chunk retrieved twice
+        else:
+            passages.append(Passage(text, [chunk_id], rank))
+        previous_key = key
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(passages: List[Passage], threshold: float = CONTEXT_DEDUP_THRESHOLD) -> List[Passage]:
+    """Keep a passage only if its shingle overlap with every better-ranked kept passage is below `threshold`."""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        # Relative to the smaller set, so a short chunk repeated inside a longer passage is caught too
+        if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold
+               for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rerank(passages: List[Passage], question: str) -> List[Passage]:
+    """Order passages by the share of distinct question terms they contain; retrieval rank breaks ties."""
+    terms = set(tokenize(question))
+    if not terms:
+        return passages
+
+    def coverage(passage: Passage) -> float:
+        return len(terms & set(tokenize(passage.text))) / len(terms)
+
+    return sorted(passages, key=lambda passage: (-coverage(passage), passage.rank))
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut `text` to about `tokens` tokens, at a sentence end if one is close, else at a word."""
+    cut = text[:tokens * CHARS_PER_TOKEN]
+    sentence_end = cut.rfind(". ")
+    if sentence_end > len(cut) * 0.6:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0]
+
+
+def pack(passages: List[Passage], budget: int) -> Tuple[List[Passage], int]:
+    """Take passages in order until `budget` tokens are used; the first that doesn't fit is truncated."""
+    packed, used, truncated = [], 0, 0
+    for passage in passages:
+        tokens = estimate_tokens(passage.text)
+        if used + tokens <= budget:
+            packed.append(passage)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            packed.append(passage._replace(text=_truncate(passage.text, remaining)))
+            truncated += 1
+        break
+    return packed, truncated
+
+
+def build_context(results, question: str, budget: int = CONTEXT_TOKEN_BUDGET) -> Context:
+    """
+    Context for `question` from retrieval results, (Document, score) pairs best first.
+    stats reports the tokens retrieved against the tokens sent, split into what merging and
+    deduplication saved (dedupSavedTokens) and what was cut to fit the budget (budgetCutTokens).
+    """
+    chunks = [(doc.page_content, doc.metadata or {}) for doc, _ in results]
+    # Both counts are of the joined text, i.e. what the prompt would contain
+    retrieved_tokens = estimate_tokens(SEPARATOR.join(text for text, _ in chunks))
+    if not CONTEXT_BUILDER_ENABLED:
+        passages = [Passage(text, [metadata.get("id", "Unknown")], rank) for rank, (text, metadata) in enumerate(chunks)]
+        text = SEPARATOR.join(passage.text for passage in passages)
+        return Context(text, passages, {"retrievedTokens": retrieved_tokens, "contextTokens": retrieved_tokens,
+                                        "savedTokens": 0, "dedupSavedTokens": 0, "budgetCutTokens": 0})
+
+    merged = merge_adjacent(chunks)
+    unique = drop_near_duplicates(merged)
+    ordered = rerank(unique, question) if CONTEXT_RERANK else unique
+    deduplicated_tokens = estimate_tokens(SEPARATOR.join(passage.text for passage in ordered))
+    packed, truncated = pack(ordered, budget)
+    text = SEPARATOR.join(passage.text for passage in packed)
+    context_tokens = estimate_tokens(text)
+    stats = {
+        "retrievedTokens": retrieved_tokens,
+        "contextTokens": context_tokens,
+        "savedTokens": retrieved_tokens - context_tokens,
+        "dedupSavedTokens": retrieved_tokens - deduplicated_tokens,
+        "budgetCutTokens": deduplicated_tokens - context_tokens,
+        "chunks": len(chunks),
+        "passages": len(packed),
+        "mergedChunks": len(chunks) - len(merged),
+        "duplicatesDropped": len(merged) - len(unique),
+        "droppedForBudget": len(ordered) - len(packed),
+        "truncated": truncated,
+    }
+    return Context(text, packed, stats)
@@ -0,0 +1,117 @@
+# app/services/csv_loader.py
+# Streaming loader for the patent CSV dump. Reads only the columns we embed or keep as metadata,
+# with fixed dtypes, and turns each chunk into texts/ids/metadata with column operations.
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List, NamedTuple
+
+import pandas as pd
+
+# Column -> dtype for everything the ingest needs; other columns are never parsed.
+# Plain str (not the "string" extension dtype) keeps tolist() on the fast path.
+PATENT_COLUMNS = {
+    "Title": str,
+    "Field Of Invention": str,
+    "Application Date": str,
+    "Applicant Name": str,
+}
+
+# Metadata key -> CSV column
+METADATA_COLUMNS = {
+    "title": "Title",
+    "date": "Application Date",
+    "assignee": "Applicant Name",
+}
+
+
+class CsvBatch(NamedTuple):
+    source_file: str
+    start: int
+    texts: List[str]
+    ids: List[str]
+    metadatas: List[Dict]
+
+
+def list_csv_files(data_dir: str) -> List[str]:
+    return sorted(f for f in os.listdir(data_dir) if f.endswith(".csv"))
+
+
+def build_batch(df: pd.DataFrame, source_file: str, start: int) -> CsvBatch:
+    """Turn one chunk of a CSV into embedding texts, stable ids and Chroma metadata."""
+    texts = (df["Title"] + " - " + df["Field Of Invention"]).tolist()
+    ids = (source_file + ":" + pd.RangeIndex(start, start + len(df)).astype(str)).tolist()
+    # Zip whole columns instead of building a dict per row through pandas
+    keys = list(METADATA_COLUMNS)
+    columns = [df[METADATA_COLUMNS[key]].tolist() for key in keys]
+    metadatas = [{"source_file": source_file, **dict(zip(keys, values))} for values in zip(*columns)]
+    return CsvBatch(source_file, start, texts, ids, metadatas)
+
+
+def iter_file_batches(path: str, batch_size: int) -> Iterator[CsvBatch]:
+    source_file = os.path.basename(path)
+    start = 0
+    # Empty cells come back as "" rather than NaN, so no fillna pass is needed
+    reader = pd.read_csv(path, usecols=list(PATENT_COLUMNS), dtype=PATENT_COLUMNS,
+                         keep_default_na=False, chunksize=batch_size)
+    for df in reader:
+        yield build_batch(df, source_file, start)
+        start += len(df)
+
+
+def iter_patent_batches(data_dir: str, batch_size: int, workers: int = 1) -> Iterator[CsvBatch]:
+    """
+    Yield CsvBatch objects for every CSV in data_dir. With workers > 1 several files are parsed
+    at once on threads (the pandas C parser releases the GIL); a bounded queue keeps at most
+    a few batches per worker buffered, so memory stays proportional to batch_size.
+    """
+    paths = [os.path.join(data_dir, f) for f in list_csv_files(data_dir)]
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield from iter_file_batches(path, batch_size)
+        return
+
+    batches: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+    files: "queue.Queue" = queue.Queue()
+    for path in paths:
+        files.put(path)
+    done = object()
+    stop = threading.Event()
+
+    def worker():
+        try:
+            while not stop.is_set():
+                try:
+                    path = files.get_nowait()
+                except queue.Empty:
+                    break
+                for batch in iter_file_batches(path, batch_size):
+                    if stop.is_set():
+                        break
+                    batches.put(batch)
+        except Exception as e:
+            batches.put(e)
+        finally:
+            batches.put(done)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(workers, len(paths)))]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = batches.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        # Unblock workers if the consumer stopped early
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
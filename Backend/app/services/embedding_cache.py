@@ -0,0 +1,146 @@
+# app/services/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.paths import CACHE_DIR
+from app.services.metrics import record_cache
+
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE", "1") != "0"
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embedding_cache.sqlite"))
+
+
+class EmbeddingStore:
+    """On-disk map from sha256(model, kind, text) to a float32 vector stored as a blob."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        record_cache("embeddings", True, hits)
+        record_cache("embeddings", False, misses)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings client and only forwards texts that are not cached yet.
+    Documents and queries are cached separately because Gemini embeds them with different task types.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, store: "EmbeddingStore"):
+        self.underlying = underlying
+        self.model = model
+        self.store = store
+
+    def _lookup(self, texts: List[str], kind: str):
+        """(keys, cached vectors by key, texts to embed by key) for a batch."""
+        keys = [self.store.make_key(self.model, kind, text) for text in texts]
+        cached = self.store.get_many(list(set(keys)))
+
+        # Deduplicate within the batch so each distinct text is embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def _complete(self, keys: List[str], cached: Dict, missing: Dict, vectors) -> List[List[float]]:
+        if missing:
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            cached.update(fresh)
+        self.store.record(hits=len(keys) - len(missing), misses=len(missing))
+        return [cached[key] for key in keys]
+
+    def _embed(self, texts: List[str], kind: str, embed_missing) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts, kind)
+        vectors = embed_missing(list(missing.values())) if missing else []
+        return self._complete(keys, cached, missing, vectors)
+
+    async def _aembed(self, texts: List[str], kind: str, aembed_missing) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts, kind)
+        vectors = await aembed_missing(list(missing.values())) if missing else []
+        return self._complete(keys, cached, missing, vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document", self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query", lambda missing: [self.underlying.embed_query(missing[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed(texts, "document", self.underlying.aembed_documents)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def embed_missing(missing):
+            return [await self.underlying.aembed_query(missing[0])]
+
+        return (await self._aembed([text], "query", embed_missing))[0]
+
+
+_embedding_store: Optional[EmbeddingStore] = None
+_embedding_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Return the process-wide embedding store, opening it on first use."""
+    global _embedding_store
+    if _embedding_store is None:
+        with _embedding_store_lock:
+            if _embedding_store is None:
+                _embedding_store = EmbeddingStore()
+    return _embedding_store
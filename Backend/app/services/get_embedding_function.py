@@ -1,13 +1,74 @@
 import os
+from typing import List
 from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.services.embedding_cache import CachedEmbeddings, get_embedding_store, EMBEDDING_CACHE_ENABLED
+from app.services.metrics import span, EMBEDDING_REQUESTS, EMBEDDING_TEXTS
+from app.services.single_flight import get_single_flight
+
+EMBEDDING_MODEL = "models/text-embedding-004"
 
 # Load environment variables from .env file
 load_dotenv()
+
+class MeteredEmbeddings(Embeddings):
+    """
+    Counts and times the calls that actually reach the embedding API (i.e. cache misses).
+    Identical calls made at the same time share one request (see single_flight.py).
+    """
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        EMBEDDING_REQUESTS.inc(kind="document")
+        EMBEDDING_TEXTS.inc(len(texts), kind="document")
+        with span("embedding_api"):
+            return self.underlying.embed_documents(texts)
+
+    def _embed_query(self, text: str) -> List[float]:
+        EMBEDDING_REQUESTS.inc(kind="query")
+        EMBEDDING_TEXTS.inc(kind="query")
+        with span("embedding_api"):
+            return self.underlying.embed_query(text)
+
+    async def _aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        EMBEDDING_REQUESTS.inc(kind="document")
+        EMBEDDING_TEXTS.inc(len(texts), kind="document")
+        with span("embedding_api"):
+            return await self.underlying.aembed_documents(texts)
+
+    async def _aembed_query(self, text: str) -> List[float]:
+        EMBEDDING_REQUESTS.inc(kind="query")
+        EMBEDDING_TEXTS.inc(kind="query")
+        with span("embedding_api"):
+            return await self.underlying.aembed_query(text)
+
+    # Coalesced within the process only: vectors are too bulky to pass between processes through
+    # SQLite, and the embedding cache already shares them across processes
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return get_single_flight().run("embedding", "document\0" + "\0".join(texts),
+                                       lambda: self._embed_documents(texts), across_processes=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_single_flight().run("embedding", "query\0" + text, lambda: self._embed_query(text),
+                                       across_processes=False)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await get_single_flight().arun("embedding", "document\0" + "\0".join(texts),
+                                              lambda: self._aembed_documents(texts), across_processes=False)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await get_single_flight().arun("embedding", "query\0" + text, lambda: self._aembed_query(text),
+                                              across_processes=False)
+
 def get_embedding_function():
     """
     Returns Google Gemini embedding function.
     Relies on GOOGLE_API_KEY environment variable being set.
+    Unless EMBEDDING_CACHE=0, the client is wrapped in a persistent cache so the same
+    text is never sent to the API twice.
     """
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
@@ -15,4 +76,7 @@ def get_embedding_function():
     # The GoogleGenerativeAIEmbeddings class will internally use this environment variable
     # or you can pass it explicitly: GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=api_key)
     # Langchain typically checks os.environ["GOOGLE_API_KEY"] automatically.
-    return GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    embeddings = MeteredEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL))
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, EMBEDDING_MODEL, get_embedding_store())
@@ -0,0 +1,179 @@
+# app/services/jobs.py
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from app.services.paths import STATE_DIR
+from app.services.process import process_pdf_to_chroma
+from app.services.metrics import span
+
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(STATE_DIR, "jobs.sqlite"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "16"))  # queued + running jobs per process
+# A running job that hasn't reported progress for this long is assumed to belong to a dead process
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "900"))
+
+JOB_FIELDS = ("id", "filename", "document_id", "status", "stage", "pages_parsed", "chunks_total",
+              "chunks_embedded", "chunks_stored", "error", "created_at", "updated_at")
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room for another job."""
+
+
+class JobQueue:
+    """
+    Runs PDF ingestion jobs on a bounded thread pool. Every job and its progress counters
+    live in a SQLite table, so any web worker can answer status requests and queued jobs
+    survive a restart.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, max_workers: int = INGEST_WORKERS,
+                 max_pending: int = INGEST_QUEUE_SIZE):
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, filename TEXT, file_path TEXT, document_id TEXT,"
+            " status TEXT, stage TEXT, pages_parsed INTEGER DEFAULT 0, chunks_total INTEGER DEFAULT 0,"
+            " chunks_embedded INTEGER DEFAULT 0, chunks_stored INTEGER DEFAULT 0, error TEXT,"
+            " created_at REAL, updated_at REAL)"
+        )
+        self._conn.commit()
+        self._resume()
+
+    def submit(self, file_path: str, filename: str) -> Dict:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Ingestion queue is full ({self.max_pending} jobs pending).")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, filename, file_path, document_id, status, stage, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                    (job_id, filename, file_path, os.path.basename(file_path), now, now),
+                )
+                self._conn.commit()
+            self._executor.submit(self._run, job_id, file_path)
+        except BaseException:
+            # The job never reached the pool, so _run won't give its slot back
+            with self._lock:
+                self._pending -= 1
+            raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def find_active(self, file_path: str) -> Optional[Dict]:
+        """The queued or running job for this file, if there is one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE file_path = ? AND status IN ('queued', 'running')"
+                " ORDER BY created_at LIMIT 1",
+                (file_path,),
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"pending_in_process": self._pending, "max_pending": self.max_pending, "jobs": counts}
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _claim(self, job_id: str) -> bool:
+        """Atomically move a job from queued to running, so only one process picks it up."""
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'parsing', updated_at = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount
+            self._conn.commit()
+        return claimed == 1
+
+    def _run(self, job_id: str, file_path: str):
+        try:
+            if not self._claim(job_id):
+                return
+
+            def progress(**counters):
+                if "chunks_stored" in counters:
+                    stage = "storing"
+                elif "chunks_embedded" in counters or "chunks_total" in counters:
+                    stage = "embedding"
+                else:
+                    stage = "parsing"
+                self._update(job_id, stage=stage, **counters)
+
+            print(f"📤 Processing upload: {os.path.basename(file_path)} (job {job_id})")
+            with span("ingest"):
+                document_id = process_pdf_to_chroma(file_path, progress=progress)
+            self._update(job_id, status="done", stage="done", document_id=document_id)
+            print(f"✅ Upload complete: {document_id}")
+        except Exception as e:
+            print(f"❌ Processing error in job {job_id}: {e}")
+            traceback.print_exc()
+            self._update(job_id, status="failed", stage="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _resume(self):
+        """Re-queue jobs left behind by a restart: queued ones, and running ones that went stale."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'queued' WHERE status = 'running' AND updated_at < ?",
+                (now - JOB_STALE_SECONDS,),
+            )
+            self._conn.commit()
+            leftovers = self._conn.execute(
+                "SELECT id, file_path FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        for job_id, file_path in leftovers:
+            if not os.path.exists(file_path):
+                self._update(job_id, status="failed", stage="failed", error="Uploaded file no longer exists.")
+                continue
+            with self._lock:
+                self._pending += 1
+            self._executor.submit(self._run, job_id, file_path)
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide ingestion queue, starting it (and resuming old jobs) on first use."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,210 @@
+# app/services/lexical_index.py
+# BM25 keyword index over the stored chunks, maintained by process_pdf_to_chroma as chunks are
+# stored or removed. Exact claim terms, part numbers and chemical names that embeddings blur are
+# matched here, and the results are fused with the vector hits in db_handler.retrieve.
+#
+#   python -m app.services.lexical_index rebuild     # index everything already in the vector store
+import argparse
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.services.paths import STATE_DIR
+
+LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", os.path.join(STATE_DIR, "lexical_index.sqlite"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank constant of reciprocal-rank fusion
+
+# Keeps hyphenated/dotted identifiers ("phase-change", "h2so4", "es-1234.5") as one token
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+SEPARATOR_RE = re.compile(r"[-./]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "what how does do can said".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms without stopwords; compound identifiers are indexed whole and by their parts."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if SEPARATOR_RE.search(token):
+            tokens.extend(part for part in SEPARATOR_RE.split(token) if part not in STOPWORDS)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    Inverted index in SQLite. Postings are keyed (term, document_id, chunk_id), so a query scoped
+    to one document reads only that document's postings, and document statistics (chunk count and
+    total length) give BM25 its N and average length for either scope.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT, document_id TEXT, chunk_id TEXT, tf INTEGER,"
+            " PRIMARY KEY (term, document_id, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, document_id TEXT, length INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (document_id TEXT PRIMARY KEY, chunks INTEGER, total_length INTEGER)"
+        )
+        self._conn.commit()
+
+    def _delete_chunks(self, chunk_ids: List[str]):
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+
+    def _update_document_stats(self, document_ids):
+        for document_id in document_ids:
+            chunks, total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE document_id = ?", (document_id,)
+            ).fetchone()
+            if chunks:
+                self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (document_id, chunks, total_length))
+            else:
+                self._conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+
+    def add(self, document_id: str, chunks: Dict[str, str]):
+        """Index (or re-index) chunks of one document, given as {chunk_id: text}."""
+        postings, lengths = [], []
+        for chunk_id, text in chunks.items():
+            terms = Counter(tokenize(text))
+            lengths.append((chunk_id, document_id, sum(terms.values())))
+            postings.extend((term, document_id, chunk_id, tf) for term, tf in terms.items())
+        with self._lock:
+            self._delete_chunks(list(chunks))
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", lengths)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", postings)
+            self._update_document_stats([document_id])
+            self._conn.commit()
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            document_ids = set()
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                document_ids.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT document_id FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch))
+            self._delete_chunks(list(chunk_ids))
+            self._update_document_stats(document_ids)
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 10, document_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score) for the query, optionally within one document."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scope = " AND p.document_id = ?" if document_id else ""
+        with self._lock:
+            if document_id:
+                row = self._conn.execute(
+                    "SELECT chunks, total_length FROM documents WHERE document_id = ?", (document_id,)
+                ).fetchone()
+            else:
+                row = self._conn.execute("SELECT SUM(chunks), SUM(total_length) FROM documents").fetchone()
+            total_chunks, total_length = row if row and row[0] else (0, 0)
+            if not total_chunks:
+                return []
+            average_length = total_length / total_chunks
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                params = (term, document_id) if document_id else (term,)
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id"
+                    f" WHERE p.term = ?{scope}", params
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total_chunks - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def clear(self):
+        with self._lock:
+            for table in ("postings", "chunks", "documents"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            documents, chunks = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents"
+            ).fetchone()
+        return {"documents": documents, "chunks": chunks}
+
+
+_lexical_index: Optional[LexicalIndex] = None
+_lexical_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Return the process-wide BM25 index, opening it on first use."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_index_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex()
+    return _lexical_index
+
+
+def rebuild(collection_name: str = "langchain") -> int:
+    """Re-index every chunk stored in the vector store, e.g. documents ingested before this index existed."""
+    from app.services.resources import get_vector_index
+
+    stored = get_vector_index(collection_name).get()
+    by_document: Dict[str, Dict[str, str]] = {}
+    for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        document_id = (metadata or {}).get("filename_base") or os.path.basename(chunk_id.rsplit(":", 2)[0])
+        by_document.setdefault(document_id, {})[chunk_id] = text or ""
+    index = get_lexical_index()
+    index.clear()
+    for document_id, chunks in by_document.items():
+        index.add(document_id, chunks)
+    return len(stored["ids"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the BM25 keyword index.")
+    parser.add_argument("command", choices=["rebuild", "stats"])
+    parser.add_argument("--collection", default="langchain")
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        print(f"✅ Indexed {rebuild(args.collection)} chunks")
+    print(get_lexical_index().stats())
+
+
+if __name__ == "__main__":
+    main()
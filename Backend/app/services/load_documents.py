@@ -1,26 +1,88 @@
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from app.services.chunking import CHUNKING_STRATEGY, PAGE_LOCAL_STRATEGIES, split_documents
 
-def load_and_split_pdf(pdf_filename: str):
+# Page-parallel extraction kicks in for PDFs with at least this many pages
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_PARSE_WORKERS = int(os.environ.get("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the web process has threads (request handlers, the ingest
+            # queue) and open clients and SQLite connections that a forked child would inherit
+            _pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _load_and_split_pages(pdf_filename: str, first_page: int, last_page: int,
+                          strategy: Optional[str] = None) -> List[Document]:
+    """
+    Extract pages [first_page, last_page) of a PDF and split them with `strategy`, or return the
+    pages unsplit when it is None; runs inside a pool worker.
+    """
+    import pypdf
+
+    reader = pypdf.PdfReader(pdf_filename)
+    # Same text and metadata as PyPDFLoader produces for these pages
+    documents = [
+        Document(page_content=reader.pages[page_number].extract_text(),
+                 metadata={"source": pdf_filename, "page": page_number})
+        for page_number in range(first_page, last_page)
+    ]
+    return split_documents(documents, strategy) if strategy else documents
+
+def count_pages(pdf_filename: str) -> int:
+    import pypdf
+
+    return len(pypdf.PdfReader(pdf_filename).pages)
+
+def load_and_split_pdf(pdf_filename: str, progress: Optional[Callable[..., None]] = None,
+                       workers: Optional[int] = None, strategy: str = CHUNKING_STRATEGY):
     """
     Loads a PDF document from the `data` folder and splits it into smaller chunks.
     Returns a list of LangChain Document objects.
+    `progress`, if given, is called with pages_parsed once the PDF has been read.
+    Long PDFs are extracted and split page-parallel on a process pool (`workers`, default
+    PDF_PARSE_WORKERS); chunks come back in page order with the same metadata either way.
+    `strategy` is the chunking strategy (see app/services/chunking.py).
     """
     # The pdf_filename argument is expected to be the full path to the PDF.
     if not os.path.exists(pdf_filename):
         raise FileNotFoundError(f"ERROR: File not found at {pdf_filename}")
 
+    workers = PDF_PARSE_WORKERS if workers is None else workers
+    page_count = count_pages(pdf_filename) if workers > 1 else 0
+
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        # Contiguous page ranges, collected in submission order to keep page order stable
+        per_worker = -(-page_count // workers)
+        # Page-local splitting runs in the workers too; otherwise they only extract and the
+        # document is split here, where its text can be read across the page ranges
+        worker_strategy = strategy if strategy in PAGE_LOCAL_STRATEGIES else None
+        pool = _get_pool()
+        futures = [
+            pool.submit(_load_and_split_pages, pdf_filename, first, min(first + per_worker, page_count),
+                        worker_strategy)
+            for first in range(0, page_count, per_worker)
+        ]
+        parts = [part for future in futures for part in future.result()]
+        if progress:
+            progress(pages_parsed=page_count)
+        return parts if worker_strategy else split_documents(parts, strategy)
+
     # Load and split
     loader = PyPDFLoader(pdf_filename) # Use pdf_filename directly
     documents = loader.load()
+    if progress:
+        progress(pages_parsed=len(documents))
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=80,
-        length_function=len
-    )
-    chunks = text_splitter.split_documents(documents)
-
-    return chunks
+    return split_documents(documents, strategy)
@@ -0,0 +1,117 @@
+# app/services/manifest.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.services.paths import STATE_DIR
+
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", os.path.join(STATE_DIR, "manifest.sqlite"))
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentManifest:
+    """
+    Records what has been ingested per document: the file hash, the hash of every chunk
+    and when it was ingested. Lets ingestion skip unchanged files and touch only the chunks
+    that changed, without listing the whole Chroma collection.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " document_id TEXT PRIMARY KEY, source TEXT, file_hash TEXT,"
+            " chunk_count INTEGER, ingested_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " document_id TEXT, chunk_id TEXT, chunk_hash TEXT,"
+            " PRIMARY KEY (document_id, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(file_hash)")
+        self._conn.commit()
+
+    def get_document(self, document_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_id, source, file_hash, chunk_count, ingested_at FROM documents WHERE document_id = ?",
+                (document_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("document_id", "source", "file_hash", "chunk_count", "ingested_at"), row))
+
+    def find_by_hash(self, file_hash: str) -> Optional[str]:
+        """Id of the first document ingested from a file with this hash."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_id FROM documents WHERE file_hash = ? ORDER BY ingested_at LIMIT 1", (file_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def has_document(self, document_id: str) -> bool:
+        return self.get_document(document_id) is not None
+
+    def get_chunk_hashes(self, document_id: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, chunk_hash FROM chunks WHERE document_id = ?", (document_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def list_documents(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT document_id FROM documents ORDER BY document_id").fetchall()
+        return [row[0] for row in rows]
+
+    def record(self, document_id: str, source: str, file_hash: str, chunk_hashes: Dict[str, str]):
+        """Replace the manifest entry of a document after it has been (re-)ingested."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self._conn.executemany(
+                "INSERT INTO chunks (document_id, chunk_id, chunk_hash) VALUES (?, ?, ?)",
+                [(document_id, chunk_id, chunk_hash) for chunk_id, chunk_hash in chunk_hashes.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (document_id, source, file_hash, chunk_count, ingested_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (document_id, source, file_hash, len(chunk_hashes), time.time()),
+            )
+            self._conn.commit()
+
+    def remove(self, document_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self._conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            self._conn.commit()
+
+
+_manifest: Optional[DocumentManifest] = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> DocumentManifest:
+    """Return the process-wide document manifest, opening it on first use."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = DocumentManifest()
+    return _manifest
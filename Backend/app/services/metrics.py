@@ -0,0 +1,242 @@
+# app/services/metrics.py
+# Process-wide counters and histograms rendered in the Prometheus text format for /metrics, plus
+# spans: timed pipeline stages that feed the stage histogram and, when a request asked for it
+# (X-Profile header), that request's stage breakdown returned as a Server-Timing header.
+# Each web worker process keeps its own values.
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CHARS_PER_TOKEN = 4  # estimate used when a client doesn't report token usage
+
+_metrics: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics -------------------------------------------------------------------------------
+
+STAGE_SECONDS = Histogram("patent_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+HTTP_REQUESTS = Counter("patent_http_requests_total", "HTTP requests by route and status.",
+                        ["endpoint", "method", "status"])
+HTTP_SECONDS = Histogram("patent_http_request_seconds", "HTTP request latency until the response is returned.",
+                         ["endpoint"])
+EMBEDDING_REQUESTS = Counter("patent_embedding_requests_total", "Calls to the embedding API.", ["kind"])
+EMBEDDING_TEXTS = Counter("patent_embedding_texts_total", "Texts sent to the embedding API.", ["kind"])
+CACHE_REQUESTS = Counter("patent_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+LLM_REQUESTS = Counter("patent_llm_requests_total", "LLM calls by model and outcome.", ["model", "status"])
+LLM_TOKENS = Counter("patent_llm_tokens_total", "LLM tokens by model and direction (estimated when not reported).",
+                     ["model", "direction"])
+CONTEXT_TOKENS = Counter("patent_context_tokens_total",
+                         "Estimated /query context tokens as retrieved, after merging and deduplication, and as sent after packing into the budget.",
+                         ["stage"])
+UPLOADS = Counter("patent_uploads_total", "Uploads by outcome: new, duplicate (already ingested) or in_progress.",
+                  ["result"])
+PDF_PAGES = Counter("patent_pdf_pages_parsed_total", "PDF pages parsed during ingestion.")
+CHUNKS_STORED = Counter("patent_chunks_stored_total", "Chunks written to the vector store.")
+COALESCED = Counter("patent_coalesced_requests_total",
+                    "Calls that waited for an identical in-flight computation instead of starting their own, "
+                    "by kind and by whether the other call was in this process or another one.",
+                    ["kind", "scope"])
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def record_llm_call(model: str, prompt: str, output: str, input_tokens: Optional[int] = None,
+                    output_tokens: Optional[int] = None):
+    LLM_REQUESTS.inc(model=model, status="ok")
+    LLM_TOKENS.inc(input_tokens or estimate_tokens(prompt), model=model, direction="input")
+    LLM_TOKENS.inc(output_tokens or estimate_tokens(output), model=model, direction="output")
+
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_REQUESTS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+# --- Spans and per-request profiles -----------------------------------------------------------
+
+class Profile:
+    """Stage timings collected for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans.append((stage, seconds))
+
+    def breakdown(self) -> Dict[str, Dict]:
+        """{stage: {"ms": total, "count": n}} in the order the stages first finished."""
+        stages: Dict[str, Dict] = {}
+        with self._lock:
+            for stage, seconds in self.spans:
+                entry = stages.setdefault(stage, {"ms": 0.0, "count": 0})
+                entry["ms"] += seconds * 1000
+                entry["count"] += 1
+        return stages
+
+    def server_timing(self) -> str:
+        parts = [
+            f'{stage};dur={entry["ms"]:.1f}' + (f';desc="{entry["count"]} calls"' if entry["count"] > 1 else "")
+            for stage, entry in self.breakdown().items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_profile = contextvars.ContextVar("profile", default=None)  # Optional[Profile]
+
+
+def start_profile() -> Profile:
+    profile = Profile()
+    _current_profile.set(profile)
+    return profile
+
+
+def current_profile() -> Optional[Profile]:
+    return _current_profile.get()
+
+
+def stop_profile():
+    _current_profile.set(None)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record `seconds` spent in `stage`, for work timed piecewise rather than as one block."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as `stage`: observed in STAGE_SECONDS and added to the request's profile, if any."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """Bind fn to a copy of the caller's context, so spans in pool threads reach the request's profile."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
@@ -0,0 +1,366 @@
+# app/services/neighbor_graph.py
+# Precomputed similar patents. For every ingested document, an offline job picks the same passages
+# /analyze would search (select_passages over the stored chunk embeddings) and scores them against
+# every entry of SIMILAR_PATENTS_COLLECTION with block matrix products. It keeps each passage's
+# nearest 2 * top_k hits and ranks them with rank_similar, as the live search does. The result is
+# one SQLite row per document, so /analyze reads its similar patents with one lookup instead of
+# embedding passages and running a query for each.
+#
+# process_pdf_to_chroma updates the graph when a document is added or changes; with the uploads
+# collection as the target, documents whose lists the new one could enter are recomputed too. Those
+# few rows are searched with index queries, as /analyze searches live, so an upload doesn't scan the
+# whole collection; only `build` scans.
+# Documents the graph hasn't seen, or that changed since their row was computed, fall back to the
+# live search. Rebuild after reloading the CSV corpus (vector_store.py).
+#
+#   python -m app.services.neighbor_graph build              # every ingested document
+#   python -m app.services.neighbor_graph build a.pdf b.pdf  # only these
+#   python -m app.services.neighbor_graph stats
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.services.analysis_service import (
+    _exclude_where, _search_passages, rank_similar, select_passages, similar_patent_key,
+)
+from app.services.manifest import get_manifest
+from app.services.metrics import record_cache
+from app.services.paths import STATE_DIR
+from app.services.process import chunk_position
+from app.services.resources import SIMILAR_PATENTS_COLLECTION, get_vector_index
+
+NEIGHBOR_GRAPH_PATH = os.environ.get("NEIGHBOR_GRAPH_PATH", os.path.join(STATE_DIR, "neighbors.sqlite"))
+# 0 = /analyze always searches live and ingest leaves the graph alone
+NEIGHBOR_GRAPH = os.environ.get("NEIGHBOR_GRAPH", "1") != "0"
+NEIGHBOR_TOP_K = int(os.environ.get("NEIGHBOR_TOP_K", "5"))
+SCAN_BATCH_ROWS = 16384  # target entries scored at once
+PASSAGE_BLOCK_ROWS = 1024  # passages scored at once; a block's distances are 1024 x 16384 floats (64 MB)
+BUILD_GROUP_DOCUMENTS = 512  # documents whose passages share one scan of the target
+
+
+class NeighborGraph:
+    def __init__(self, path: str = NEIGHBOR_GRAPH_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # neighbors: the similarPatents list; keys: the similar_patent_key of every hit kept for any
+        # passage; passages: the chunk ids searched; thresholds: each passage's 2 * top_k-th distance.
+        # keys and thresholds tell the incremental update whether a changed document can affect the row.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS neighbors ("
+            " document_id TEXT PRIMARY KEY, file_hash TEXT, collection TEXT, top_k INTEGER,"
+            " neighbors TEXT, keys TEXT, passages TEXT, thresholds TEXT, computed_at REAL)"
+        )
+        self._conn.commit()
+
+    def put(self, rows: Dict[str, Dict]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO neighbors (document_id, file_hash, collection, top_k, neighbors, keys,"
+                " passages, thresholds, computed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (document_id, row["file_hash"], row["collection"], row["top_k"], json.dumps(row["neighbors"]),
+                     json.dumps(row["keys"]), json.dumps(row["passages"]), json.dumps(row["thresholds"]), time.time())
+                    for document_id, row in rows.items()
+                ],
+            )
+            self._conn.commit()
+
+    def lookup(self, document_id: str, top_k: int = NEIGHBOR_TOP_K) -> Optional[List[Dict]]:
+        """
+        The document's similar patents, or None if it has no row, the row was computed for another
+        collection or a smaller top_k, or the document has been re-ingested with different bytes since.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash, collection, top_k, neighbors FROM neighbors WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        if row is not None:
+            file_hash, collection, computed_top_k, neighbors = row
+            current = get_manifest().get_document(document_id) or {}
+            if collection == SIMILAR_PATENTS_COLLECTION and computed_top_k >= top_k and \
+                    file_hash == (current.get("file_hash") or ""):
+                record_cache("neighbor_graph", True)
+                return json.loads(neighbors)[:top_k]
+        record_cache("neighbor_graph", False)
+        return None
+
+    def rows(self) -> Dict[str, Dict]:
+        """Every document's keys, passages and thresholds, for the incremental update."""
+        with self._lock:
+            fetched = self._conn.execute(
+                "SELECT document_id, keys, passages, thresholds FROM neighbors WHERE collection = ?",
+                (SIMILAR_PATENTS_COLLECTION,),
+            ).fetchall()
+        return {
+            document_id: {"keys": json.loads(keys), "passages": json.loads(passages),
+                          "thresholds": json.loads(thresholds)}
+            for document_id, keys, passages, thresholds in fetched
+        }
+
+    def remove(self, document_ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM neighbors WHERE document_id = ?", [(doc,) for doc in document_ids])
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            documents, oldest, newest = self._conn.execute(
+                "SELECT COUNT(*), MIN(computed_at), MAX(computed_at) FROM neighbors"
+            ).fetchone()
+        return {"documents": documents, "oldest": oldest, "newest": newest}
+
+
+_neighbor_graph: Optional[NeighborGraph] = None
+_neighbor_graph_lock = threading.Lock()
+
+
+def get_neighbor_graph() -> NeighborGraph:
+    """Return the process-wide neighbour graph, opening it on first use."""
+    global _neighbor_graph
+    if _neighbor_graph is None:
+        with _neighbor_graph_lock:
+            if _neighbor_graph is None:
+                _neighbor_graph = NeighborGraph()
+    return _neighbor_graph
+
+
+# --- Computing neighbours ---
+
+def _passages(document_ids: List[str]):
+    """(owner index per passage, passage chunk ids, passage vectors) of each document's searched passages."""
+    source = get_vector_index()
+    owners, passage_ids, vectors = [], [], []
+    for number, document_id in enumerate(document_ids):
+        stored = source.get(where={"filename_base": document_id}, include_embeddings=True)
+        order = sorted(range(len(stored["ids"])), key=lambda i: chunk_position(stored["ids"][i]))
+        for i in select_passages(order):
+            owners.append(number)
+            passage_ids.append(stored["ids"][i])
+            vectors.append(stored["embeddings"][i])
+    return np.array(owners, dtype=np.int64), passage_ids, np.array(vectors, dtype=np.float32)
+
+
+def _nearest(document_ids: List[str], owners: np.ndarray, vectors: np.ndarray, keep: int):
+    """
+    The `keep` nearest target entries of every passage: (distances, entry numbers) sorted nearest
+    first, padded with inf / -1, and {entry number: (document, metadata)} for the entries kept.
+    A passage never matches chunks of its own document.
+    """
+    target = get_vector_index(SIMILAR_PATENTS_COLLECTION)
+    exclude_self = SIMILAR_PATENTS_COLLECTION == "langchain"
+    numbers = {document_id: number for number, document_id in enumerate(document_ids)}
+    passage_norms = (vectors * vectors).sum(axis=1)
+    best_distances = np.full((len(vectors), keep), np.inf, dtype=np.float32)
+    best_entries = np.full((len(vectors), keep), -1, dtype=np.int64)
+    entries: Dict[int, tuple] = {}
+
+    offset = 0
+    for batch in target.scan(SCAN_BATCH_ROWS):
+        embeddings = batch["embeddings"]
+        norms = (embeddings * embeddings).sum(axis=1)
+        batch_entries = np.arange(offset, offset + len(embeddings), dtype=np.int64)
+        if exclude_self:
+            entry_owners = np.array([numbers.get((meta or {}).get("filename_base"), -1) for meta in batch["metadatas"]])
+        for start in range(0, len(vectors), PASSAGE_BLOCK_ROWS):
+            block = slice(start, start + PASSAGE_BLOCK_ROWS)
+            distances = norms[None, :] - 2 * (vectors[block] @ embeddings.T) + passage_norms[block, None]
+            if exclude_self:
+                distances[owners[block, None] == entry_owners[None, :]] = np.inf
+            merged_distances = np.concatenate([best_distances[block], distances], axis=1)
+            merged_entries = np.concatenate(
+                [best_entries[block], np.broadcast_to(batch_entries, distances.shape)], axis=1)
+            top = np.argpartition(merged_distances, keep - 1, axis=1)[:, :keep]
+            best_distances[block] = np.take_along_axis(merged_distances, top, axis=1)
+            best_entries[block] = np.take_along_axis(merged_entries, top, axis=1)
+
+        # Keep the documents and metadata of the entries still in some passage's list
+        kept = set(best_entries[best_distances < np.inf].tolist())
+        entries = {entry: value for entry, value in entries.items() if entry in kept}
+        for entry in kept:
+            if entry >= offset:
+                position = entry - offset
+                entries[entry] = (batch["documents"][position] or "", batch["metadatas"][position] or {})
+        offset += len(embeddings)
+
+    order = np.argsort(best_distances, axis=1, kind="stable")
+    return np.take_along_axis(best_distances, order, axis=1), np.take_along_axis(best_entries, order, axis=1), entries
+
+
+def compute_neighbors(document_ids: List[str], top_k: int = NEIGHBOR_TOP_K) -> Dict[str, Dict]:
+    """Graph rows for `document_ids`, computed together in one scan of the target collection."""
+    document_ids = list(document_ids)
+    owners, passage_ids, vectors = _passages(document_ids)
+    keep = top_k * 2  # hits per passage, as in find_similar_patents
+    if len(vectors):
+        distances, entry_numbers, entries = _nearest(document_ids, owners, vectors, keep)
+
+    rows = {}
+    for number, document_id in enumerate(document_ids):
+        passages = np.flatnonzero(owners == number)
+        if not len(passages):
+            continue  # nothing stored under this name
+        hit_lists = [
+            [(*entries[entry], float(distance))
+             for distance, entry in zip(distances[p], entry_numbers[p]) if distance < np.inf]
+            for p in passages
+        ]
+        rows[document_id] = _row(document_id, [passage_ids[p] for p in passages], hit_lists, top_k)
+    return rows
+
+
+def search_neighbors(document_ids: List[str], top_k: int = NEIGHBOR_TOP_K) -> Dict[str, Dict]:
+    """
+    Graph rows for a few `document_ids`, with one index query per passage as the live search runs
+    them, instead of a scan of the whole target collection. For the incremental update.
+    """
+    target = get_vector_index(SIMILAR_PATENTS_COLLECTION)
+    rows = {}
+    for document_id in document_ids:
+        _, passage_ids, vectors = _passages([document_id])
+        if not len(vectors):
+            continue
+        hit_lists = _search_passages(target, vectors, top_k, _exclude_where(document_id))
+        rows[document_id] = _row(document_id, passage_ids, hit_lists, top_k)
+    return rows
+
+
+def _row(document_id: str, passage_ids: List[str], hit_lists: List[List[tuple]], top_k: int) -> Dict:
+    """A document's graph row from each passage's kept hits, (doc, meta, distance) nearest first."""
+    keep = top_k * 2
+    return {
+        "file_hash": (get_manifest().get_document(document_id) or {}).get("file_hash") or "",
+        "collection": SIMILAR_PATENTS_COLLECTION,
+        "top_k": top_k,
+        "neighbors": [patent for _, patent in rank_similar(hit_lists, top_k)],
+        "keys": sorted({similar_patent_key(doc, meta) for hits in hit_lists for doc, meta, _ in hits}),
+        "passages": passage_ids,
+        # A passage with fewer than `keep` hits takes any new entry
+        "thresholds": [float(hits[-1][2]) if len(hits) >= keep else float("inf") for hits in hit_lists],
+    }
+
+
+def build(document_ids: Optional[List[str]] = None, top_k: int = NEIGHBOR_TOP_K) -> int:
+    """Compute and store the rows of `document_ids` (default: every ingested document)."""
+    from app.services.batch_analysis import list_all_documents
+
+    document_ids = list(document_ids or list_all_documents())
+    graph = get_neighbor_graph()
+    started = time.perf_counter()
+    built = 0
+    for start in range(0, len(document_ids), BUILD_GROUP_DOCUMENTS):
+        rows = compute_neighbors(document_ids[start:start + BUILD_GROUP_DOCUMENTS], top_k)
+        graph.put(rows)
+        built += len(rows)
+        print(f"🕸️ Neighbour graph: {built}/{len(document_ids)} documents "
+              f"({built / max(time.perf_counter() - started, 1e-9):.1f}/s)")
+    return built
+
+
+def _affected_by(document_id: str, rows: Dict[str, Dict]) -> List[str]:
+    """
+    Documents whose lists `document_id` (just added or changed, in the uploads collection) may
+    change: those with one of its chunks among their hits, and those with a passage that its chunks
+    come nearer to than the passage's last kept hit. Passages that are no longer stored count as changed.
+    """
+    affected = {other for other, row in rows.items() if document_id in row["keys"]}
+    candidates = [other for other in rows if other not in affected and other != document_id]
+    index = get_vector_index()
+    chunks = index.get(where={"filename_base": document_id}, include_embeddings=True)["embeddings"]
+    passage_ids = [passage for other in candidates for passage in rows[other]["passages"]]
+    stored = index.get(ids=passage_ids, include_embeddings=True) if passage_ids else {"ids": []}
+    positions = {passage: position for position, passage in enumerate(stored["ids"])}
+    if not len(chunks):
+        return sorted(affected)
+
+    chunk_norms = (chunks * chunks).sum(axis=1)
+    owners, thresholds, rows_found = [], [], []
+    for other in candidates:
+        for passage, threshold in zip(rows[other]["passages"], rows[other]["thresholds"]):
+            if passage not in positions:
+                affected.add(other)
+                continue
+            owners.append(other)
+            thresholds.append(threshold)
+            rows_found.append(positions[passage])
+    if rows_found:
+        vectors = stored["embeddings"][rows_found]
+        vector_norms = (vectors * vectors).sum(axis=1)
+        nearest = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), PASSAGE_BLOCK_ROWS):
+            block = slice(start, start + PASSAGE_BLOCK_ROWS)
+            distances = chunk_norms[None, :] - 2 * (vectors[block] @ chunks.T) + vector_norms[block, None]
+            nearest[block] = distances.min(axis=1)
+        affected.update(owner for owner, distance, threshold in zip(owners, nearest, thresholds)
+                        if distance < threshold)
+    return sorted(affected)
+
+
+def affected_documents(document_id: str) -> List[str]:
+    """The other documents whose rows update_document(document_id) recomputes."""
+    if SIMILAR_PATENTS_COLLECTION != "langchain":
+        return []
+    return _affected_by(document_id, get_neighbor_graph().rows())
+
+
+def update_document(document_id: str, top_k: int = NEIGHBOR_TOP_K, affected: Optional[List[str]] = None) -> int:
+    """
+    Recompute a document's row after it was ingested, and the rows it may now belong to when
+    similar patents come from the uploads collection (`affected`, if the caller has them already).
+    Returns the number of rows written.
+    """
+    if affected is None:
+        affected = affected_documents(document_id)
+    rows = search_neighbors([document_id, *affected], top_k)
+    get_neighbor_graph().put(rows)
+    return len(rows)
+
+
+def update_on_ingest(document_id: str):
+    """process_pdf_to_chroma's hook: keep the graph current, or leave the documents to the live search."""
+    if not NEIGHBOR_GRAPH:
+        return
+    graph = get_neighbor_graph()
+    stale = [document_id]
+    try:
+        started = time.perf_counter()
+        if SIMILAR_PATENTS_COLLECTION == "langchain":
+            # Until the affected rows are known, any row may be one this document changes
+            rows = graph.rows()
+            stale += [other for other in rows if other != document_id]
+            affected = _affected_by(document_id, rows)
+            stale = [document_id, *affected]
+        else:
+            affected = []
+        updated = update_document(document_id, affected=affected)
+        print(f"🕸️ Neighbour graph: {updated} documents updated in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        # A stale row would be wrong, a missing one only means a live search
+        graph.remove(stale)
+        print(f"⚠️ Neighbour graph update failed for {document_id}; {len(stale)} documents will be searched live: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed similar-patents graph.")
+    parser.add_argument("command", choices=["build", "stats"])
+    parser.add_argument("documents", nargs="*", help="documents to (re)compute (default: all)")
+    parser.add_argument("--top-k", type=int, default=NEIGHBOR_TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        built = build(args.documents, args.top_k)
+        print(f"✅ {built} documents in {time.perf_counter() - started:.1f}s")
+    else:
+        print(get_neighbor_graph().stats())
+
+
+if __name__ == "__main__":
+    main()
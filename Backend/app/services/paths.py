@@ -0,0 +1,15 @@
+# app/services/paths.py
+# Locations of on-disk state shared by the services, all relative to the app package.
+import os
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Root of everything below; APP_DATA_DIR moves it, e.g. to a scratch directory for benchmarks
+DATA_DIR = os.environ.get("APP_DATA_DIR", APP_DIR)
+
+CHROMA_PATH = os.path.join(DATA_DIR, "chroma_db")
+# Derived data that can be rebuilt (analysis results, embeddings)
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+# Bookkeeping that must survive restarts (ingestion jobs)
+STATE_DIR = os.path.join(DATA_DIR, "state")
+# Local vector index files (see vector_db/local_index.py), one directory per collection
+INDEX_DIR = os.path.join(DATA_DIR, "vector_index")
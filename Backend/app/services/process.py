@@ -1,13 +1,29 @@
+import math
 import os
-from langchain.schema import Document
-from app.services.get_embedding_function import get_embedding_function
-from app.services.load_documents import load_and_split_pdf
-from langchain_chroma import Chroma
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+from app.services.analysis_cache import get_analysis_cache
+from app.services.query_cache import get_query_cache, GLOBAL_SCOPE
+from app.services.lexical_index import get_lexical_index
+from app.services.metrics import span, PDF_PAGES, CHUNKS_STORED
+from app.services.manifest import get_manifest, file_sha256, chunk_sha256
+from app.services.resources import get_embeddings, get_vector_index
 
-CHROMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "chroma_db"))
+# LangChain and the PDF parser are imported when a document is ingested, not with this module,
+# so the web process (and analysis_service, for chunk_position) starts without them
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+# Chunks are embedded and stored in batches so progress can be reported while a large PDF is ingested
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "100"))
 
 def calculate_chunk_ids(chunks):
-    """Generate unique IDs for each chunk based on source and page."""
+    """
+    Generate unique IDs for each chunk from the document name and page. The name, not the storage
+    path, so a re-upload of the same document (stored under a new content hash) keeps the ids of
+    its unchanged pages.
+    """
+    from langchain.schema import Document
+
     last_page_id = None
     current_chunk_index = 0
     updated_chunks = []
@@ -16,7 +32,7 @@ def calculate_chunk_ids(chunks):
         source_full_path = chunk.metadata.get("source", "unknown")
         filename_base = os.path.basename(source_full_path)
         page = chunk.metadata.get("page", "0")
-        current_page_id = f"{source_full_path}:{page}" # Keep original source for page ID if needed
+        current_page_id = f"{filename_base}:{page}"
 
         if current_page_id == last_page_id:
             current_chunk_index += 1
@@ -40,36 +56,122 @@ def calculate_chunk_ids(chunks):
 
     return updated_chunks
 
-def process_pdf_to_chroma(pdf_filename: str):
-    """Full pipeline: load PDF → split → embed → store in ChromaDB."""
-    chunks = load_and_split_pdf(pdf_filename)
-    embedding_function = get_embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+def chunk_position(chunk_id: str) -> Tuple[float, float]:
+    """(page, chunk index) encoded in a chunk id, for putting chunks back in document order."""
+    # The document name may itself contain ":", so split from the right
+    try:
+        _, page, index = chunk_id.rsplit(":", 2)
+        return int(page), int(index)
+    except ValueError:
+        return math.inf, math.inf
+
+def _stored_chunk_hashes(index, document_id: str):
+    """Chunk hashes of a document ingested before the manifest existed, read from the vector store by document."""
+    stored = index.get(where={"filename_base": document_id})
+    return {chunk_id: chunk_sha256(text) for chunk_id, text in zip(stored["ids"], stored["documents"])}
+
+def is_unchanged(pdf_filename: str) -> bool:
+    """True if this exact file has already been ingested under its name."""
+    previous = get_manifest().get_document(os.path.basename(pdf_filename))
+    return bool(previous) and previous["file_hash"] == file_sha256(pdf_filename)
+
+def process_pdf_to_chroma(pdf_filename: str, progress: Optional[Callable[..., None]] = None,
+                          chunks: Optional[List["Document"]] = None):
+    """
+    Full pipeline: load PDF → split → embed → store in ChromaDB.
+    Only chunks that changed since the last ingest of the same document are embedded and stored;
+    an unchanged file is skipped before it is parsed.
+    `progress`, if given, is called with keyword counters (pages_parsed, chunks_total,
+    chunks_embedded, chunks_stored) as each stage advances.
+    `chunks` lets a caller that already split the PDF (e.g. the batch ingest) skip parsing here.
+    """
+    report = progress or (lambda **counters: None)
+    document_id = os.path.basename(pdf_filename)
+    manifest = get_manifest()
+
+    file_hash = file_sha256(pdf_filename)
+    previous = manifest.get_document(document_id)
+    if previous and previous["file_hash"] == file_hash:
+        print("✅ Document already exists in database.")
+        report(chunks_total=0)
+        return document_id
+
+    if chunks is None:
+        from app.services.load_documents import load_and_split_pdf
+
+        with span("parse"):
+            chunks = load_and_split_pdf(pdf_filename, progress=report)
+    PDF_PAGES.inc(len({chunk.metadata.get("page") for chunk in chunks}))
+    embedding_function = get_embeddings()
+    index = get_vector_index()
+    lexical_index = get_lexical_index()
 
     chunks_with_ids = calculate_chunk_ids(chunks)
-    
-    # Get existing IDs to avoid duplicates
-    existing_ids = set(db.get(include=[])["ids"])
+    chunk_hashes = {chunk.metadata["id"]: chunk_sha256(chunk.page_content) for chunk in chunks_with_ids}
+
+    # Diff against what is stored for this document only
+    if previous:
+        stored_hashes = manifest.get_chunk_hashes(document_id)
+    else:
+        stored_hashes = _stored_chunk_hashes(index, document_id)
+    stale_ids = [chunk_id for chunk_id in stored_hashes if chunk_id not in chunk_hashes]
     new_chunks = []
     print(f"📄 Processing {len(chunks)} document chunks...")
 
     for chunk in chunks_with_ids:
-        if chunk.metadata["id"] not in existing_ids:
+        chunk_id = chunk.metadata["id"]
+        if stored_hashes.get(chunk_id) != chunk_hashes[chunk_id]:
             new_chunks.append({
                 "page_content": chunk.page_content,
                 "metadata": chunk.metadata
             })
 
+    report(chunks_total=len(new_chunks))
+
+    if stale_ids:
+        print(f"🗑️ Removing {len(stale_ids)} chunks that are no longer in the document...")
+        index.delete(stale_ids)
+        lexical_index.delete(stale_ids)
+
     if new_chunks:
-        print(f"💾 Storing {len(new_chunks)} new chunks in database...")
-        db.add_texts(
-            texts=[chunk["page_content"] for chunk in new_chunks],
-            metadatas=[chunk["metadata"] for chunk in new_chunks],
-            ids=[chunk["metadata"]["id"] for chunk in new_chunks]
-        )
+        print(f"💾 Storing {len(new_chunks)} new or changed chunks in database...")
+        embedded = stored = 0
+        for start in range(0, len(new_chunks), EMBED_BATCH_SIZE):
+            batch = new_chunks[start:start + EMBED_BATCH_SIZE]
+            texts = [chunk["page_content"] for chunk in batch]
+            with span("embed"):
+                embeddings = embedding_function.embed_documents(texts)
+            embedded += len(batch)
+            report(chunks_embedded=embedded)
+
+            # upsert replaces chunks whose text changed under the same id
+            with span("store"):
+                index.upsert(
+                    documents=texts,
+                    embeddings=embeddings,
+                    metadatas=[chunk["metadata"] for chunk in batch],
+                    ids=[chunk["metadata"]["id"] for chunk in batch]
+                )
+                lexical_index.add(document_id, {chunk["metadata"]["id"]: chunk["page_content"] for chunk in batch})
+            CHUNKS_STORED.inc(len(batch))
+            stored += len(batch)
+            report(chunks_stored=stored)
+
+    manifest.record(document_id, pdf_filename, file_hash, chunk_hashes)
+
+    if new_chunks or stale_ids:
+        # The document changed, so any cached analysis or answer about it is stale
+        get_analysis_cache().invalidate(document_id)
+        get_query_cache().invalidate(document_id)
+        get_query_cache().invalidate(GLOBAL_SCOPE)
+        # Its similar patents (and, in the uploads collection, other documents' lists) may have changed
+        from app.services.neighbor_graph import update_on_ingest
+
+        with span("neighbor_graph"):
+            update_on_ingest(document_id)
         print("✅ Document processed successfully!")
     else:
         print("✅ Document already exists in database.")
 
     # Return the basename of the PDF file, which can serve as a document_id
-    return os.path.basename(pdf_filename)
+    return document_id
@@ -0,0 +1,214 @@
+# app/services/query_cache.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.metrics import record_cache
+from app.services.paths import STATE_DIR
+
+QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE", "1") != "0"
+# Minimum cosine similarity between two questions for the cached answer to be reused
+QUERY_CACHE_THRESHOLD = float(os.environ.get("QUERY_CACHE_THRESHOLD", "0.95"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "3600"))  # seconds
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "256"))  # per document
+# Invalidation counters shared by the worker processes
+QUERY_CACHE_DB_PATH = os.environ.get("QUERY_CACHE_DB_PATH", os.path.join(STATE_DIR, "query_cache.sqlite"))
+
+# Scope used for questions that are not restricted to one document
+GLOBAL_SCOPE = ""
+
+
+class ScopeGenerations:
+    """
+    A counter per scope in SQLite, bumped whenever the scope is invalidated. Each process tags its
+    cached answers with the counter they were stored under and drops them once it reads another
+    value, so an ingest in one worker invalidates the answers cached by all of them.
+    """
+
+    def __init__(self, path: str = QUERY_CACHE_DB_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS generations (scope TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def get(self, scope_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM generations WHERE scope = ?", (scope_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, scope_id: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO generations (scope, generation) VALUES (?, 1)"
+                " ON CONFLICT(scope) DO UPDATE SET generation = generation + 1",
+                (scope_id,),
+            )
+            self._conn.commit()
+
+
+class _Scope:
+    def __init__(self, generation: int = 0):
+        self.generation = generation
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self.matrix: Optional[np.ndarray] = None  # rows follow entries' order; rebuilt after changes
+        self.keys: List[int] = []
+
+    def rebuild(self):
+        self.keys = list(self.entries)
+        self.matrix = np.stack([self.entries[key]["vector"] for key in self.keys]) if self.keys else None
+
+
+class SemanticQueryCache:
+    """
+    In-process answer cache scoped per document. A question hits when its embedding is within
+    `threshold` cosine similarity of a cached question for the same document. Each scope keeps
+    at most `max_entries` answers (least recently used are dropped) for at most `ttl` seconds.
+    With `generations`, invalidations are shared with the other processes using the same counters.
+    Callers take generation() before they retrieve and pass it to store(), so an answer built from
+    chunks that were re-ingested meanwhile is not cached.
+    """
+
+    def __init__(self, threshold: float = QUERY_CACHE_THRESHOLD, ttl: float = QUERY_CACHE_TTL,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES, enabled: bool = QUERY_CACHE_ENABLED,
+                 generations: Optional[ScopeGenerations] = None):
+        self.generations = generations
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scopes: Dict[str, _Scope] = {}
+        self._invalidations: Dict[str, int] = {}  # the counters, when they aren't shared
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, scope: _Scope, now: float):
+        expired = [key for key, entry in scope.entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del scope.entries[key]
+        if expired:
+            self.evictions += len(expired)
+            scope.rebuild()
+
+    def generation(self, scope_id: str) -> int:
+        """The scope's invalidation counter; an answer stored under an older value is dropped."""
+        if self.generations:
+            return self.generations.get(scope_id)
+        with self._lock:
+            return self._invalidations.get(scope_id, 0)
+
+    def _current_scope(self, scope_id: str, generation: int) -> Optional[_Scope]:
+        """The scope's entries, unless it was invalidated (possibly by another process) since they were stored."""
+        scope = self._scopes.get(scope_id)
+        if scope is not None and scope.generation != generation:
+            del self._scopes[scope_id]
+            return None
+        return scope
+
+    def lookup(self, scope_id: str, vector) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        query = self._normalize(vector)
+        generation = self.generation(scope_id)
+        with self._lock:
+            scope = self._current_scope(scope_id, generation)
+            if scope is not None:
+                self._expire(scope, time.time())
+            if scope is None or scope.matrix is None:
+                self.misses += 1
+                record_cache("query", False)
+                return None
+            similarities = scope.matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                record_cache("query", False)
+                return None
+            key = scope.keys[best]
+            scope.entries.move_to_end(key)  # LRU order; matrix rows are looked up through scope.keys
+            entry = scope.entries[key]
+            self.hits += 1
+            record_cache("query", True)
+            return {"answer": entry["answer"], "sources": list(entry["sources"]),
+                    "similarity": float(similarities[best])}
+
+    def store(self, scope_id: str, question: str, vector, answer: str, sources: List[str],
+              generation: Optional[int] = None):
+        """Cache an answer; with the `generation` read before retrieval, only if the scope wasn't invalidated since."""
+        if not self.enabled:
+            return
+        current = self.generation(scope_id)
+        if generation is not None and generation != current:
+            return
+        generation = current
+        with self._lock:
+            scope = self._current_scope(scope_id, generation)
+            if scope is None:
+                scope = self._scopes[scope_id] = _Scope(generation)
+            scope.entries[self._next_key] = {
+                "question": question,
+                "vector": self._normalize(vector),
+                "answer": answer,
+                "sources": list(sources),
+                "created_at": time.time(),
+            }
+            self._next_key += 1
+            while len(scope.entries) > self.max_entries:
+                scope.entries.popitem(last=False)
+                self.evictions += 1
+            scope.rebuild()
+
+    def invalidate(self, scope_id: str) -> int:
+        """Forget every cached answer for a document, e.g. after it was re-ingested, in every process."""
+        if self.generations:
+            self.generations.bump(scope_id)
+        with self._lock:
+            if not self.generations:
+                self._invalidations[scope_id] = self._invalidations.get(scope_id, 0) + 1
+            scope = self._scopes.pop(scope_id, None)
+        return len(scope.entries) if scope else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = sum(len(scope.entries) for scope in self._scopes.values())
+            scopes = len(self._scopes)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "documents": scopes,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_query_cache: Optional[SemanticQueryCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> SemanticQueryCache:
+    """Return the process-wide semantic query cache."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = SemanticQueryCache(generations=ScopeGenerations() if QUERY_CACHE_ENABLED else None)
+    return _query_cache
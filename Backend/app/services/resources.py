@@ -0,0 +1,244 @@
+# app/services/resources.py
+# Application-scoped clients (Chroma, embeddings, Gemini models), created lazily on first use
+# and shared by every request thread instead of being rebuilt per request.
+# Importing the app loads none of the client libraries; preload_modules() and warm_up() move that
+# cost out of the first request (see gunicorn.conf.py).
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.services.paths import CHROMA_PATH
+
+QUERY_MODEL_NAME = "models/gemini-2.0-flash"
+ANALYSIS_MODEL_NAME = "gemini-2.5-flash"
+# "chroma" searches the ChromaDB collections, "local" the memory-mapped index in vector_db/local_index.py
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+# Collection searched for similar patents (e.g. "patent_data" for the CSV corpus loaded by vector_store.py)
+SIMILAR_PATENTS_COLLECTION = os.environ.get("SIMILAR_PATENTS_COLLECTION", "langchain")
+
+
+class ResourceRegistry:
+    """Thread-safe lazy singletons with creation and usage stats."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {"created": 0, "uses": 0, "init_seconds": None, "created_at": None})
+
+    def ensure(self, name: str, factory: Callable[[], Any]):
+        """Register `factory` unless `name` is already known."""
+        if name not in self._factories:
+            self.register(name, factory)
+
+    def factory(self, name: str) -> Callable[[], Any]:
+        return self._factories[name]
+
+    def get(self, name: str) -> Any:
+        stats = self._stats[name]
+        with self._registry_lock:
+            stats["uses"] += 1
+        if name in self._instances:
+            return self._instances[name]
+        # One lock per resource: a slow client doesn't block the others from being created
+        with self._locks[name]:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                stats["created"] += 1
+                stats["init_seconds"] = round(time.perf_counter() - started, 4)
+                stats["created_at"] = time.time()
+        return self._instances[name]
+
+    def override(self, name: str, instance: Any):
+        """Install a ready-made instance, e.g. a local fake in benchmarks."""
+        with self._registry_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            self._instances[name] = instance
+
+    def reset(self, name: Optional[str] = None):
+        """Drop cached instances so the next get() recreates them."""
+        for key in [name] if name else list(self._instances):
+            with self._locks[key]:
+                self._instances.pop(key, None)
+
+    def is_initialized(self, name: str) -> bool:
+        return name in self._instances
+
+    def peek(self, name: str) -> Any:
+        """The instance if it was already created, without creating it or counting a use."""
+        return self._instances.get(name)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            name: {**stats, "initialized": name in self._instances}
+            for name, stats in self._stats.items()
+        }
+
+
+registry = ResourceRegistry()
+
+
+def _create_chroma_client():
+    from chromadb import PersistentClient
+
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    return PersistentClient(path=CHROMA_PATH)
+
+
+def _create_memory_client():
+    import chromadb
+
+    return chromadb.Client()
+
+
+def _create_embeddings():
+    from app.services.get_embedding_function import get_embedding_function
+
+    return get_embedding_function()
+
+
+def _create_vector_index(name: str):
+    if VECTOR_BACKEND == "local":
+        from app.services.vector_db.local_index import LocalVectorIndex, LOCAL_INDEX_DIR
+
+        return LocalVectorIndex(os.path.join(LOCAL_INDEX_DIR, name))
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND {VECTOR_BACKEND!r}; expected 'chroma' or 'local'")
+    from app.services.vector_db.vector_index import ChromaVectorIndex
+
+    return ChromaVectorIndex(get_collection(name))
+
+
+def _create_query_llm():
+    from langchain_google_genai import GoogleGenerativeAI
+
+    return GoogleGenerativeAI(model=QUERY_MODEL_NAME)
+
+
+def _create_analysis_model():
+    from google.generativeai.client import configure
+    from google.generativeai.generative_models import GenerativeModel
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        print("Warning: GOOGLE_API_KEY not set. Some features may not work.")
+        return None
+    configure(api_key=api_key)
+    return GenerativeModel(ANALYSIS_MODEL_NAME)
+
+
+registry.register("chroma_client", _create_chroma_client)
+registry.register("memory_client", _create_memory_client)
+registry.register("embeddings", _create_embeddings)
+registry.register("query_llm", _create_query_llm)
+registry.register("analysis_model", _create_analysis_model)
+
+
+def get_chroma_client():
+    return registry.get("chroma_client")
+
+
+def get_collection(name: str = "langchain"):
+    """Shared handle to a persistent Chroma collection."""
+    key = f"collection:{name}"
+    registry.ensure(key, lambda: get_chroma_client().get_or_create_collection(name))
+    return registry.get(key)
+
+
+def get_embeddings():
+    return registry.get("embeddings")
+
+
+def get_vector_index(name: str = "langchain"):
+    """Vector search over a collection, served by the VECTOR_BACKEND backend."""
+    key = f"vector_index:{name}"
+    registry.ensure(key, lambda: _create_vector_index(name))
+    return registry.get(key)
+
+
+def get_query_llm():
+    return registry.get("query_llm")
+
+
+def get_analysis_model():
+    return registry.get("analysis_model")
+
+
+# Libraries the request paths import on first use, heaviest first
+PRELOAD_MODULES = (
+    "chromadb",
+    "langchain_google_genai",
+    "google.generativeai",
+    "langchain.schema",
+    "langchain.prompts",
+    "app.services.load_documents",
+    "app.services.get_embedding_function",
+)
+WARM_UP_RESOURCES = ("embeddings", "query_llm", "analysis_model", "vector_index")
+
+
+def preload_modules(modules=PRELOAD_MODULES) -> Dict[str, float]:
+    """
+    Import the lazily loaded libraries now. Nothing is connected or started, so this is safe in a
+    pre-fork master: the workers inherit the loaded modules. Returns import seconds per module.
+    """
+    timings = {}
+    for module in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"⚠️ Could not preload {module}: {e}")
+        timings[module] = round(time.perf_counter() - started, 4)
+    return timings
+
+
+def warm_up(resources=WARM_UP_RESOURCES) -> Dict[str, float]:
+    """
+    Create the shared clients before the first request needs them. Clients hold sockets, gRPC
+    channels and SQLite handles that must not cross a fork, so a pre-fork server calls this in each
+    worker. A client that fails to start is reported and left to be retried on first use.
+    """
+    creators = {
+        "embeddings": get_embeddings,
+        "query_llm": get_query_llm,
+        "analysis_model": get_analysis_model,
+        "vector_index": lambda: (get_vector_index(), get_vector_index(SIMILAR_PATENTS_COLLECTION)),
+    }
+    timings = {}
+    for name in resources:
+        started = time.perf_counter()
+        try:
+            creators[name]()
+        except Exception as e:
+            print(f"⚠️ Warm-up of {name} failed: {e}")
+        timings[name] = round(time.perf_counter() - started, 4)
+    print(f"🔥 Warmed up {', '.join(f'{name} {seconds:.2f}s' for name, seconds in timings.items())}")
+    return timings
+
+
+def health() -> Dict:
+    """Liveness of the initialized resources; nothing is created just to be checked."""
+    checks = {}
+    if registry.is_initialized("chroma_client"):
+        try:
+            registry.peek("chroma_client").heartbeat()
+            checks["chroma_client"] = "ok"
+        except Exception as e:
+            checks["chroma_client"] = f"error: {e}"
+    for name in ("embeddings", "query_llm", "analysis_model"):
+        if registry.is_initialized(name):
+            checks[name] = "ok" if registry.peek(name) is not None else "not configured"
+    status = "ok" if all(not check.startswith("error") for check in checks.values()) else "degraded"
+    return {"status": status, "checks": checks, "resources": registry.stats()}
@@ -0,0 +1,318 @@
+# app/services/single_flight.py
+# Single-flight: while a computation is running, identical calls (same kind and key) wait for it
+# and share its result instead of starting their own. /analyze, /query and the embedding calls go
+# through it, so a document that many people open at once is analyzed once.
+#
+# Within a process it works across threads and coroutines alike: the Flask routes, the batch
+# workers and the async routes (app/asgi.py) share one table of flights. With SINGLE_FLIGHT_MODE=sqlite
+# the worker processes also share a SQLite table of running computations: the first process to
+# claim a key computes it and writes the result to the table, and the others poll for it. A claim
+# whose process has died, or that has run longer than SINGLE_FLIGHT_TIMEOUT, is taken over.
+#
+# Followers get the leader's result object itself, so callers must not modify what they get back.
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.services.metrics import COALESCED, span
+from app.services.paths import STATE_DIR
+
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT", "1") != "0"
+SINGLE_FLIGHT_MODE = os.environ.get("SINGLE_FLIGHT_MODE", "process")  # process or sqlite
+SINGLE_FLIGHT_DB_PATH = os.environ.get("SINGLE_FLIGHT_DB_PATH", os.path.join(STATE_DIR, "flights.sqlite"))
+# Longest a call waits for another process's computation before running its own
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "300"))  # seconds
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+SINGLE_FLIGHT_RESULT_SECONDS = 10  # finished results stay readable this long for processes still polling
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """One in-flight computation and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.waiters = []  # (loop, future) of the coroutines waiting for it
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _resolve(future: asyncio.Future, flight: _Flight):
+    if future.done():  # the waiting coroutine was cancelled
+        return
+    if flight.error is not None:
+        future.set_exception(flight.error)
+    else:
+        future.set_result(flight.result)
+
+
+def _alive(pid: int) -> bool:
+    if os.name == "nt":  # os.kill would terminate it; assume it is alive and let the timeout decide
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedFlights:
+    """
+    The cross-process side (SINGLE_FLIGHT_MODE=sqlite): one row per running computation, holding
+    its owner's pid and, once it is done, its result as JSON. Results that don't serialize to JSON
+    aren't shared; waiting processes then compute them themselves.
+    """
+
+    def __init__(self, path: str = SINGLE_FLIGHT_DB_PATH, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit, so a claim can be one explicit BEGIN IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS flights ("
+            " key TEXT PRIMARY KEY, token TEXT, owner INTEGER, started_at REAL,"
+            " finished_at REAL, result TEXT, error TEXT)"
+        )
+
+    def claim(self, key: str, token: str) -> bool:
+        """Claim `key` for this call, unless another live process is computing it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM flights WHERE finished_at < ? OR started_at < ?",
+                                   (now - SINGLE_FLIGHT_RESULT_SECONDS, now - self.timeout))
+                row = self._conn.execute("SELECT owner, finished_at FROM flights WHERE key = ?", (key,)).fetchone()
+                # A finished row is an earlier computation: this call starts a new one
+                claimed = row is None or row[1] is not None or not _alive(row[0])
+                if claimed:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO flights (key, token, owner, started_at) VALUES (?, ?, ?, ?)",
+                        (key, token, os.getpid(), now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def check(self, key: str):
+        """("running", None), ("done", result), ("failed", message), or ("gone", None) if nobody holds it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT owner, finished_at, result, error FROM flights WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return "gone", None
+        owner, finished_at, result, error = row
+        if finished_at is None:
+            return ("running", None) if _alive(owner) else ("gone", None)
+        if error is not None:
+            return "failed", error
+        return ("done", json.loads(result)) if result is not None else ("gone", None)
+
+    def publish(self, key: str, token: str, result=None, error: Optional[BaseException] = None):
+        """Record the outcome of this call's claim; an interrupted computation just gives it up."""
+        with self._lock:
+            if error is not None and not isinstance(error, Exception):
+                self._conn.execute("DELETE FROM flights WHERE key = ? AND token = ?", (key, token))
+                return
+            try:
+                encoded = None if error is not None else json.dumps(result)
+            except (TypeError, ValueError):
+                encoded = None
+            message = f"{type(error).__name__}: {error}" if error is not None else None
+            self._conn.execute(
+                "UPDATE flights SET finished_at = ?, result = ?, error = ? WHERE key = ? AND token = ?",
+                (time.time(), encoded, message, key, token),
+            )
+
+    def _wait(self, key: str, token: str):
+        """
+        Poll another process's claim until it ends: ("done", result), ("failed", message),
+        ("claimed", None) once this call has taken the key over, or ("timeout", None).
+        """
+        deadline = time.monotonic() + self.timeout
+        with span("single_flight_wait"):
+            while time.monotonic() < deadline:
+                time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+                state, value = self.check(key)
+                if state in ("done", "failed"):
+                    return state, value
+                if state == "gone" and self.claim(key, token):
+                    return "claimed", None
+        return "timeout", None
+
+    async def _await(self, key: str, token: str):
+        """_wait() for coroutines: the SQLite statements run in a worker thread and the polling is awaited."""
+        deadline = time.monotonic() + self.timeout
+        with span("single_flight_wait"):
+            while time.monotonic() < deadline:
+                await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+                state, value = await asyncio.to_thread(self.check, key)
+                if state in ("done", "failed"):
+                    return state, value
+                if state == "gone" and await asyncio.to_thread(self.claim, key, token):
+                    return "claimed", None
+        return "timeout", None
+
+    def run(self, kind: str, key: str, fn: Callable[[], T]) -> T:
+        token = uuid.uuid4().hex
+        if not self.claim(key, token):
+            COALESCED.inc(kind=kind, scope="cross_process")
+            state, value = self._wait(key, token)
+            if state == "done":
+                return value
+            if state == "failed":
+                raise RuntimeError(value)
+            if state == "timeout":
+                return fn()  # waited long enough; compute without a claim
+        try:
+            result = fn()
+        except BaseException as e:
+            self.publish(key, token, error=e)
+            raise
+        self.publish(key, token, result=result)
+        return result
+
+    async def arun(self, kind: str, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        token = uuid.uuid4().hex
+        if not await asyncio.to_thread(self.claim, key, token):
+            COALESCED.inc(kind=kind, scope="cross_process")
+            state, value = await self._await(key, token)
+            if state == "done":
+                return value
+            if state == "failed":
+                raise RuntimeError(value)
+            if state == "timeout":
+                return await factory()
+        try:
+            result = await factory()
+        except BaseException as e:
+            await asyncio.to_thread(self.publish, key, token, None, e)
+            raise
+        await asyncio.to_thread(self.publish, key, token, result)
+        return result
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED, shared: Optional[SharedFlights] = None):
+        self.enabled = enabled
+        self.shared = shared
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, key: str) -> str:
+        return kind + ":" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _join(self, key: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """(flight, is the leader, future a waiting coroutine awaits)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                return flight, True, None
+            flight.followers += 1
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                flight.waiters.append((loop, future))
+            return flight, False, future
+
+    def _finish(self, key: str, flight: _Flight, result=None, error: Optional[BaseException] = None):
+        if error is not None and not isinstance(error, Exception):
+            # Cancellation or interrupts of the leader aren't the followers' own
+            error = RuntimeError(f"The shared computation was interrupted ({type(error).__name__})")
+        with self._lock:
+            flight.result, flight.error = result, error
+            del self._flights[key]
+            waiters = flight.waiters
+        flight.done.set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, flight)
+            except RuntimeError:  # that loop has been closed
+                pass
+
+    def run(self, kind: str, key: str, fn: Callable[[], T], across_processes: bool = True) -> T:
+        """
+        fn(), unless an identical call is in flight, in which case its result (or exception).
+        With across_processes=False only this process's calls are coalesced, even in sqlite mode.
+        """
+        if not self.enabled:
+            return fn()
+        key = self.make_key(kind, key)
+        flight, leader, _ = self._join(key)
+        if not leader:
+            COALESCED.inc(kind=kind, scope="process")
+            with span("single_flight_wait"):
+                flight.done.wait()
+            return flight.outcome()
+        try:
+            result = self.shared.run(kind, key, fn) if self.shared and across_processes else fn()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    async def arun(self, kind: str, key: str, factory: Callable[[], Awaitable[T]],
+                   across_processes: bool = True) -> T:
+        """run() for coroutines; they share flights with threaded callers."""
+        if not self.enabled:
+            return await factory()
+        key = self.make_key(kind, key)
+        flight, leader, future = self._join(key, asyncio.get_running_loop())
+        if not leader:
+            COALESCED.inc(kind=kind, scope="process")
+            with span("single_flight_wait"):
+                return await future
+        try:
+            result = await (self.shared.arun(kind, key, factory) if self.shared and across_processes else factory())
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "mode": "sqlite" if self.shared else "process",
+                "in_flight": len(self._flights),
+                "waiting": sum(flight.followers for flight in self._flights.values()),
+            }
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight table."""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                shared = SharedFlights() if SINGLE_FLIGHT_ENABLED and SINGLE_FLIGHT_MODE == "sqlite" else None
+                _single_flight = SingleFlight(shared=shared)
+    return _single_flight
@@ -0,0 +1,151 @@
+# app/services/upload_store.py
+# Content-addressed storage for uploaded PDFs. The request body is streamed straight to a temporary
+# file in UPLOAD_DIR/incoming while its SHA-256 is computed, so the hash is known as soon as the
+# upload has been received, before anything is parsed. The file is then moved to
+# UPLOAD_DIR/by-hash/<sha256>/<filename>, and a SQLite table maps each uploaded name to the hash
+# it had last. Identical bytes are stored once, whatever they were called.
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.services.paths import STATE_DIR
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
+UPLOAD_DB_PATH = os.environ.get("UPLOAD_DB_PATH", os.path.join(STATE_DIR, "uploads.sqlite"))
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+COPY_BLOCK_SIZE = 1 << 20
+
+
+class StoredUpload(NamedTuple):
+    sha256: str
+    size: int
+    path: str  # by-hash location; its basename is the document id when it is ingested
+    new: bool  # False if these bytes were already stored
+
+
+class HashingFile:
+    """
+    Write-once temporary file that hashes and counts what is written to it, and refuses to grow
+    past `max_bytes`. Closing it before it is committed deletes it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = MAX_UPLOAD_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False)
+        self.path = self._file.name
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.committed = False
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.max_bytes / (1024 * 1024):g} MB.")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # seek/read/flush etc. for werkzeug's FileStorage
+        return getattr(self._file, name)
+
+
+class StreamingUploadRequest(Request):
+    """Flask request whose multipart file fields stream into a HashingFile instead of a spooled buffer."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(os.path.join(UPLOAD_DIR, "incoming"))
+
+
+class UploadStore:
+    def __init__(self, root: str = UPLOAD_DIR, db_path: str = UPLOAD_DB_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " name TEXT PRIMARY KEY, sha256 TEXT, size INTEGER, path TEXT, uploaded_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads(sha256)")
+        self._conn.commit()
+
+    def _blob_dir(self, sha256: str) -> str:
+        return os.path.join(self.root, "by-hash", sha256)
+
+    def find(self, sha256: str) -> Optional[str]:
+        """Path of the stored file with these bytes, if any."""
+        directory = self._blob_dir(sha256)
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        return os.path.join(directory, names[0]) if names else None
+
+    def put(self, stream, filename: str) -> StoredUpload:
+        """
+        Store an upload under its content hash and map `filename` to it. `stream` is the upload's
+        file object: a HashingFile when the request streamed into one, otherwise it is copied into one.
+        """
+        if isinstance(stream, HashingFile):
+            incoming = stream
+        else:
+            incoming = HashingFile(os.path.join(self.root, "incoming"))
+            for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b""):
+                incoming.write(block)
+        incoming.flush()
+
+        sha256 = incoming.sha256
+        with self._lock:
+            existing = self.find(sha256)
+            if existing:
+                incoming.close()  # not committed, so the duplicate bytes are deleted
+                path, new = existing, False
+            else:
+                path, new = os.path.join(self._blob_dir(sha256), filename), True
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                incoming.committed = True
+                incoming.close()
+                os.replace(incoming.path, path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (name, sha256, size, path, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+                (filename, sha256, incoming.size, path, time.time()),
+            )
+            self._conn.commit()
+        return StoredUpload(sha256, incoming.size, path, new)
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Hash, size and stored path of the last upload under `name`."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, sha256, size, path, uploaded_at FROM uploads WHERE name = ?", (name,)
+            ).fetchone()
+        return dict(zip(("name", "sha256", "size", "path", "uploaded_at"), row)) if row else None
+
+
+_upload_store: Optional[UploadStore] = None
+_upload_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Return the process-wide upload store, opening it on first use."""
+    global _upload_store
+    if _upload_store is None:
+        with _upload_store_lock:
+            if _upload_store is None:
+                _upload_store = UploadStore()
+    return _upload_store
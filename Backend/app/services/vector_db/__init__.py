@@ -1,10 +1,16 @@
 # vector_db/__init__.py
 
-import chromadb
-
-# Initialize Chroma client
-client = chromadb.Client()
+from app.services.resources import registry
 
 # Create or get an existing collection
 collection_name = "patent_embeddings"
-collection = client.get_or_create_collection(collection_name)
+registry.ensure("memory_collection", lambda: registry.get("memory_client").get_or_create_collection(collection_name))
+
+
+def __getattr__(name):
+    # `client` and `collection` are opened on first access, not when the package is imported
+    if name == "client":
+        return registry.get("memory_client")
+    if name == "collection":
+        return registry.get("memory_collection")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,14 @@
 # app/services/vector_db/chroma_connector.py
-import os
-from chromadb import PersistentClient
 from typing import Optional
+from app.services.resources import get_chroma_client, get_collection
 
 class ChromaConnector:
     def __init__(self, collection_name: str = "langchain"):
-        # Use the same path as process.py
-        CHROMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "chroma_db"))
-        self.client = PersistentClient(path=CHROMA_PATH)
+        # Shared application-wide client instead of a new PersistentClient per connector
+        self.client = get_chroma_client()
         self.collection_name = collection_name
         # Use the same collection that langchain_chroma uses (default is "langchain")
-        self.collection = self.client.get_or_create_collection("langchain")
+        self.collection = get_collection("langchain")
 
     def get_latest_document_text(self) -> Optional[str]:
         try:
@@ -1,10 +1,13 @@
+import asyncio
 import os
-from langchain.prompts import ChatPromptTemplate
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAI
-from app.services.get_embedding_function import get_embedding_function
-import chromadb
-from langchain_chroma import Chroma
+import time
+import urllib.parse
+from app.services.resources import get_vector_index, get_query_llm, get_embeddings, QUERY_MODEL_NAME
+from app.services.query_cache import get_query_cache, GLOBAL_SCOPE
+from app.services.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from app.services.context_builder import build_context, CONTEXT_CHUNKS
+from app.services.single_flight import get_single_flight
+from app.services.metrics import span, observe_stage, record_llm_call, LLM_REQUESTS, CONTEXT_TOKENS
 
 # vector_db/db_handler.py
 # Initialize Chroma Client (as you did in __init__.py)
@@ -23,8 +26,6 @@ from langchain_chroma import Chroma
 
 # vector_db/db_handler.py
 
-CHROMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "chroma_db"))
-
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context:
 
@@ -35,54 +36,259 @@ Answer the question based only on the following context:
 Answer the question based on the above context: {question}
 """
 
-def query_vector_db(query_text: str, document_id: str = None):
-    # Set up ChromaDB with embedding
-    embedding_function = get_embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+NO_RESULTS_ANSWER = "No relevant information found in the database."
+
+# "hybrid" fuses BM25 keyword hits with vector hits, "vector" uses embeddings only
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_TOP_K = CONTEXT_CHUNKS  # the context budget is sized for this many chunks
+# Hits taken from each ranking before fusion
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "20"))
+
+def retrieve(query_text: str, document_id: str = None, query_vector=None):
+    """
+    Top-5 chunks for the question, optionally restricted to one document. Returns (Document, score) pairs.
+    `query_vector` is the question's embedding if the caller already has it.
+    """
+    # Imported on first use so the web process doesn't load LangChain at startup
+    from langchain.schema import Document
+
+    if query_vector is None:
+        with span("embed_query"):
+            query_vector = get_embeddings().embed_query(query_text)
 
     # Similarity search with document filtering if provided
+    where = None
     if document_id:
         # URL decode the document_id to handle special characters
-        import urllib.parse
         decoded_document_id = urllib.parse.unquote(document_id)
         print(f"🔍 Searching within document: '{decoded_document_id}'")
-        
-        # Filter by the specific document
-        results = db.similarity_search_with_score(
-            query_text, 
-            k=5,
-            filter={"filename_base": decoded_document_id}
-        )
+        where = {"filename_base": decoded_document_id}
     else:
         # General search across all documents
         print(f"🔍 Searching across all documents")
-        results = db.similarity_search_with_score(query_text, k=5)
 
-    if not results:
-        print("⚠️ No relevant information found.")
-        return {
-            "answer": "No relevant information found in the database.",
-            "sources": []
-        }
-    
-    print(f"🤖 Generating AI response...")
-    
-    # Prepare context
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _ in results])
+    index = get_vector_index()
+    if RETRIEVAL_MODE != "hybrid":
+        with span("vector_search"):
+            hits = index.query(query_vector, k=RETRIEVAL_TOP_K, where=where)
+        return [(Document(page_content=hit.document, metadata=hit.metadata), hit.distance) for hit in hits]
+
+    with span("vector_search"):
+        vector_hits = index.query(query_vector, k=RETRIEVAL_CANDIDATES, where=where)
+    with span("lexical_search"):
+        lexical_hits = get_lexical_index().search(
+            query_text, k=RETRIEVAL_CANDIDATES, document_id=where["filename_base"] if where else None
+        )
+    fused = reciprocal_rank_fusion([[hit.id for hit in vector_hits], [chunk_id for chunk_id, _ in lexical_hits]])
+    fused = fused[:RETRIEVAL_TOP_K]
+
+    # Chunks found only by keyword are fetched from the vector store for their text and metadata
+    chunks = {hit.id: (hit.document, hit.metadata) for hit in vector_hits}
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in chunks]
+    if missing:
+        with span("fetch_chunks"):
+            stored = index.get(ids=missing)
+        chunks.update(zip(stored["ids"], zip(stored["documents"], stored["metadatas"])))
+    # Scores are fusion scores (higher is better), not distances
+    return [
+        (Document(page_content=chunks[chunk_id][0], metadata=chunks[chunk_id][1] or {}), score)
+        for chunk_id, score in fused if chunk_id in chunks
+    ]
 
+def build_prompt(context_text: str, query_text: str) -> str:
     # Format prompt
+    from langchain.prompts import ChatPromptTemplate
+
     prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
+    return prompt_template.format(context=context_text, question=query_text)
 
-    # Generate answer using Gemini
-    model = GoogleGenerativeAI(model="models/gemini-2.0-flash")
-    response_text = model.invoke(prompt)
+def get_sources(context):
+    # Chunk IDs of the passages that made it into the prompt, best first
+    return [chunk_id for passage in context.passages for chunk_id in passage.chunk_ids]
+
+def assemble_context(results, query_text: str):
+    """Merged, deduplicated and budgeted context for the prompt; the token savings are logged and counted."""
+    with span("build_context"):
+        context = build_context(results, query_text)
+    stats = context.stats
+    CONTEXT_TOKENS.inc(stats["retrievedTokens"], stage="retrieved")
+    CONTEXT_TOKENS.inc(stats["retrievedTokens"] - stats["dedupSavedTokens"], stage="deduplicated")
+    CONTEXT_TOKENS.inc(stats["contextTokens"], stage="sent")
+    if stats["savedTokens"]:
+        print(f"✂️ Context {stats['retrievedTokens']} → {stats['contextTokens']} tokens "
+              f"({stats.get('mergedChunks', 0)} merged, {stats.get('duplicatesDropped', 0)} duplicates dropped, "
+              f"{stats['budgetCutTokens']} tokens cut to fit the budget)")
+    return context
+
+def _cached_answer(document_id: str, question_vector):
+    """
+    (scope, its generation, cached answer or None) for the semantic answer cache, given the question's
+    embedding. The generation is read before retrieval; store() drops the answer if it has moved on.
+    """
+    cache = get_query_cache()
+    scope = urllib.parse.unquote(document_id) if document_id else GLOBAL_SCOPE
+    generation = cache.generation(scope)
+    cached = cache.lookup(scope, question_vector)
+    if cached:
+        print(f"⚡ Answer served from query cache (similarity {cached['similarity']:.3f})")
+    return scope, generation, cached
+
+def _lookup_cached_answer(query_text: str, document_id: str = None):
+    """Returns (scope, its generation, question embedding, cached answer or None) for the semantic answer cache."""
+    cache = get_query_cache()
+    if not cache.enabled:
+        return None, None, None, None
+    # embed_query goes through the embedding cache, so retrieval below reuses this vector
+    with span("embed_query"):
+        question_vector = get_embeddings().embed_query(query_text)
+    scope, generation, cached = _cached_answer(document_id, question_vector)
+    return scope, generation, question_vector, cached
+
+def _prepare_answer(query_text: str, document_id: str = None, question_vector=None):
+    """Retrieval and the prompt built from it: (context, prompt), or None if nothing relevant was found."""
+    results = retrieve(query_text, document_id, question_vector)
+
+    if not results:
+        print("⚠️ No relevant information found.")
+        return None
+
+    print(f"🤖 Generating AI response...")
+    context = assemble_context(results, query_text)
+    return context, build_prompt(context.text, query_text)
 
-    # Extract source IDs
-    sources = [doc.metadata.get("id", "Unknown") for doc, _ in results]
+def _answer(scope, generation, query_text: str, question_vector, context, prompt: str, response_text: str):
+    record_llm_call(QUERY_MODEL_NAME, prompt, response_text)
+    sources = get_sources(context)
+
+    if question_vector is not None and scope is not None:
+        get_query_cache().store(scope, query_text, question_vector, response_text, sources, generation)
 
     # Return both response and sources for frontend
     return {
         "answer": response_text,
-        "sources": sources
+        "sources": sources,
+        "context": context.stats
     }
+
+def _flight_key(query_text: str, document_id: str = None) -> str:
+    return f"{urllib.parse.unquote(document_id) if document_id else GLOBAL_SCOPE}\0{query_text}"
+
+def query_vector_db(query_text: str, document_id: str = None):
+    """Answer a question; identical questions asked at the same time share one answer (see single_flight.py)."""
+    return get_single_flight().run("query", _flight_key(query_text, document_id),
+                                   lambda: _query_vector_db(query_text, document_id))
+
+def _query_vector_db(query_text: str, document_id: str = None):
+    scope, generation, question_vector, cached = _lookup_cached_answer(query_text, document_id)
+    if cached:
+        return {"answer": cached["answer"], "sources": cached["sources"]}
+
+    prepared = _prepare_answer(query_text, document_id, question_vector)
+    if prepared is None:
+        return {
+            "answer": NO_RESULTS_ANSWER,
+            "sources": []
+        }
+    context, prompt = prepared
+
+    # Generate answer using Gemini
+    model = get_query_llm()
+    try:
+        with span("llm"):
+            response_text = model.invoke(prompt)
+    except Exception:
+        LLM_REQUESTS.inc(model=QUERY_MODEL_NAME, status="error")
+        raise
+    return _answer(scope, generation, query_text, question_vector, context, prompt, response_text)
+
+async def aquery_vector_db(query_text: str, document_id: str = None):
+    """
+    query_vector_db for the async server (app/asgi.py): the embedding and Gemini calls are awaited,
+    and the cache lookups, searches and context building run in a worker thread.
+    """
+    return await get_single_flight().arun("query", _flight_key(query_text, document_id),
+                                          lambda: _aquery_vector_db(query_text, document_id))
+
+async def _aquery_vector_db(query_text: str, document_id: str = None):
+    with span("embed_query"):
+        question_vector = await get_embeddings().aembed_query(query_text)
+    scope = generation = None
+    if get_query_cache().enabled:
+        scope, generation, cached = await asyncio.to_thread(_cached_answer, document_id, question_vector)
+        if cached:
+            return {"answer": cached["answer"], "sources": cached["sources"]}
+
+    prepared = await asyncio.to_thread(_prepare_answer, query_text, document_id, question_vector)
+    if prepared is None:
+        return {
+            "answer": NO_RESULTS_ANSWER,
+            "sources": []
+        }
+    context, prompt = prepared
+
+    try:
+        with span("llm"):
+            response_text = await get_query_llm().ainvoke(prompt)
+    except Exception:
+        LLM_REQUESTS.inc(model=QUERY_MODEL_NAME, status="error")
+        raise
+    return await asyncio.to_thread(_answer, scope, generation, query_text, question_vector, context, prompt,
+                                   response_text)
+
+def stream_query_vector_db(query_text: str, document_id: str = None):
+    """
+    Same retrieval and prompt as query_vector_db, but yields (event, data) pairs as they become
+    available: "sources" right after retrieval, one "token" per generated chunk, then "done".
+    Closing the generator (e.g. when the client disconnects) stops the model stream.
+    """
+    scope, generation, question_vector, cached = _lookup_cached_answer(query_text, document_id)
+    if cached:
+        yield "sources", cached["sources"]
+        yield "token", cached["answer"]
+        yield "done", {}
+        return
+
+    results = retrieve(query_text, document_id, question_vector)
+
+    if not results:
+        print("⚠️ No relevant information found.")
+        yield "sources", []
+        yield "token", NO_RESULTS_ANSWER
+        yield "done", {}
+        return
+
+    context = assemble_context(results, query_text)
+    sources = get_sources(context)
+    yield "sources", sources
+
+    print(f"🤖 Streaming AI response...")
+    prompt = build_prompt(context.text, query_text)
+    stream = get_query_llm().stream(prompt)
+    tokens = []
+    # Only time spent waiting on the model counts, not time the client takes to read each token
+    waited = 0.0
+    try:
+        iterator = iter(stream)
+        while True:
+            started = time.perf_counter()
+            token = next(iterator, None)
+            waited += time.perf_counter() - started
+            if token is None:
+                break
+            tokens.append(token)
+            yield "token", token
+    except Exception:
+        LLM_REQUESTS.inc(model=QUERY_MODEL_NAME, status="error")
+        raise
+    finally:
+        # Runs on normal completion and on GeneratorExit from a disconnected client
+        observe_stage("llm", waited)
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+
+    record_llm_call(QUERY_MODEL_NAME, prompt, "".join(tokens))
+    # Only a fully streamed answer is cached
+    if question_vector is not None:
+        get_query_cache().store(scope, query_text, question_vector, "".join(tokens), sources, generation)
+    yield "done", {}
@@ -0,0 +1,602 @@
+# app/services/vector_db/local_index.py
+# In-process vector index: embeddings live in a memory-mapped float32 matrix, text and metadata
+# in SQLite. Search is a blockwise NumPy scan, or an IVF probe (k-means lists) once the index
+# has been built. Opening an index only maps its files, so cold start doesn't grow with the corpus.
+# Optionally the rows are also stored as int8 or product-quantized codes (vector_db/quantization.py);
+# queries then scan the codes and re-rank the best candidates with the float vectors.
+# Writers take an exclusive lock on the index directory, so several worker processes (gunicorn)
+# can ingest into the same index; readers don't lock.
+#
+#   python -m app.services.vector_db.local_index import --collection patent_data
+#   python -m app.services.vector_db.local_index build-ivf --collection patent_data --lists 4096
+#   python -m app.services.vector_db.local_index quantize --collection patent_data --method pq
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within a process only
+    fcntl = None
+
+from app.services.paths import INDEX_DIR
+from app.services.vector_db.quantization import (QUANTIZERS, encode_rows, kmeans, load_quantizer,
+                                                 nearest_centroid, save_quantizer)
+from app.services.vector_db.vector_index import Hit, VectorIndex
+
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", INDEX_DIR)
+# IVF lists scanned per query; more lists means higher recall and slower queries
+LOCAL_INDEX_NPROBE = int(os.environ.get("LOCAL_INDEX_NPROBE", "8"))
+# With quantized codes, k * this many candidates are re-ranked with the float vectors
+LOCAL_INDEX_RERANK = int(os.environ.get("LOCAL_INDEX_RERANK", "10"))
+
+SCAN_BLOCK_ROWS = 65536  # rows scored per matrix product during a scan
+ASSIGN_BLOCK_ROWS = 8192  # rows assigned to centroids at once while building the IVF lists
+QUANTIZE_SAMPLE_ROWS = 65536  # rows the quantizer is trained on
+SQL_BATCH = 500  # values per IN (...) clause, below SQLite's variable limit
+
+# Metadata keys with a SQLite expression index, so filtering on them doesn't read every entry
+INDEXED_METADATA_KEYS = ("filename_base",)
+
+
+def _batches(items: List, size: int = SQL_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _metadata_expr(key: str) -> str:
+    if not key.isidentifier():
+        raise ValueError(f"Unsupported metadata filter key: {key!r}")
+    return f"json_extract(metadata, '$.{key}')"
+
+
+def _top_k(distances: np.ndarray, rows: np.ndarray, k: int):
+    """The k smallest distances and their rows, sorted ascending."""
+    if len(distances) > k:
+        keep = np.argpartition(distances, k)[:k]
+        distances, rows = distances[keep], rows[keep]
+    order = np.argsort(distances, kind="stable")
+    return distances[order], rows[order]
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    Vectors are appended to `vectors.f32` (with their squared norms in `norms.f32` and a live flag
+    in `alive.u8`); a row never moves, so an upsert of a known id overwrites it in place and a
+    delete only clears its flag. Distances are squared L2, the same scale ChromaDB reports.
+    Rows added after `build_ivf`, and listed rows whose update moved them nearer another centroid,
+    are scanned exactly on every query until the lists are rebuilt; likewise rows added after
+    `quantize` are scored with their float vectors until it is re-run.
+    """
+
+    def __init__(self, directory: str, nprobe: int = LOCAL_INDEX_NPROBE, rerank: int = LOCAL_INDEX_RERANK):
+        self.directory = directory
+        self.nprobe = nprobe
+        self.rerank = rerank
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._norms_path = os.path.join(directory, "norms.f32")
+        self._alive_path = os.path.join(directory, "alive.u8")
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(directory, "index.lock"), "a+b")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        for key in INDEXED_METADATA_KEYS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_entries_{key} ON entries({_metadata_expr(key)})")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        # Rows in the IVF lists that an update moved to another list; scanned along with the tail
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ivf_moved (row INTEGER PRIMARY KEY)")
+        self._conn.commit()
+
+        self.dim: Optional[int] = None
+        self._rows = 0
+        self._mapped_size = -1
+        self._vectors = self._norms = self._alive = None
+        self._ivf = None  # (centroids, centroid norms, order, offsets, rows covered)
+        self._ivf_stamp = None
+        self._quantized = None  # (quantizer, codes, rows covered)
+        self._quantized_stamp = None
+        self._refresh()
+
+    # --- files -----------------------------------------------------------------------------
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the thread lock and the directory's lock file, then re-read the files: rows are reserved
+        from the size of vectors.f32 on disk, which another process may have appended to.
+        """
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _info(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _ivf_file(self, name: str) -> str:
+        return os.path.join(self.directory, f"ivf_{name}.npy")
+
+    def _quantizer_file(self, name: str) -> str:
+        return os.path.join(self.directory, f"quantized_{name}")
+
+    def _refresh(self):
+        """Re-map the files if another thread or process appended rows or rebuilt the IVF lists."""
+        if self.dim is None:
+            dim = self._info("dim")
+            if dim is None:
+                return
+            self.dim = int(dim)
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if size != self._mapped_size:
+            # vectors.f32 is written last on append, so its size is the committed row count
+            rows = size // (4 * self.dim)
+            if rows:
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+                self._norms = np.memmap(self._norms_path, dtype=np.float32, mode="r+", shape=(rows,))
+                self._alive = np.memmap(self._alive_path, dtype=np.uint8, mode="r+", shape=(rows,))
+            self._rows = rows
+            self._mapped_size = size
+
+        offsets_path = self._ivf_file("offsets")
+        stamp = os.stat(offsets_path).st_mtime_ns if os.path.exists(offsets_path) else None
+        if stamp != self._ivf_stamp:
+            self._ivf = None
+            if stamp is not None:
+                centroids = np.load(self._ivf_file("centroids"))
+                self._ivf = (
+                    centroids,
+                    (centroids * centroids).sum(axis=1),
+                    np.load(self._ivf_file("order"), mmap_mode="r"),
+                    np.load(offsets_path),
+                    int(self._info("ivf_rows") or 0),
+                )
+            self._ivf_stamp = stamp
+
+        codes_path = self._quantizer_file("codes.npy")
+        stamp = os.stat(codes_path).st_mtime_ns if os.path.exists(codes_path) else None
+        if stamp != self._quantized_stamp:
+            self._quantized = None
+            if stamp is not None:
+                self._quantized = (
+                    load_quantizer(self._quantizer_file("quantizer.npz")),
+                    np.load(codes_path, mmap_mode="r+"),
+                    int(self._info("quantized_rows") or 0),
+                )
+            self._quantized_stamp = stamp
+
+    def _rows_for(self, ids: List[str]) -> Dict[str, int]:
+        found = {}
+        for batch in _batches(ids):
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                (chunk_id, row) for row, chunk_id in
+                self._conn.execute(f"SELECT row, id FROM entries WHERE id IN ({placeholders})", batch)
+            )
+        return found
+
+    @staticmethod
+    def _split_where(where: Optional[Dict]):
+        """Separate {"key": value} / {"key": {"$eq": value}} from {"key": {"$ne": value}} conditions."""
+        equal, not_equal = {}, {}
+        for key, value in (where or {}).items():
+            if isinstance(value, dict):
+                if len(value) != 1 or next(iter(value)) not in ("$eq", "$ne"):
+                    raise ValueError(f"Only $eq and $ne filters are supported, got {value!r}")
+                operator, value = next(iter(value.items()))
+                (not_equal if operator == "$ne" else equal)[key] = value
+            else:
+                equal[key] = value
+        return equal, not_equal
+
+    def _where_clause(self, where: Optional[Dict]):
+        equal, not_equal = self._split_where(where)
+        clauses = [f"{_metadata_expr(key)} = ?" for key in equal]
+        clauses += [f"{_metadata_expr(key)} IS NOT ?" for key in not_equal]
+        if not clauses:
+            return "", []
+        return " WHERE " + " AND ".join(clauses), list(equal.values()) + list(not_equal.values())
+
+    def _matching_rows(self, where: Dict) -> np.ndarray:
+        clause, params = self._where_clause(where)
+        return np.array([row for row, in self._conn.execute(f"SELECT row FROM entries{clause}", params)], dtype=np.int64)
+
+    # --- VectorIndex -----------------------------------------------------------------------
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one embedding per id")
+        # The last occurrence of a repeated id wins, as in ChromaDB
+        latest = {chunk_id: position for position, chunk_id in enumerate(ids)}
+
+        with self._writing():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_info("dim", self.dim)
+                self._conn.commit()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+
+            existing = self._rows_for(list(latest))
+            if existing:
+                rows = np.fromiter(existing.values(), dtype=np.int64, count=len(existing))
+                updated = vectors[[latest[chunk_id] for chunk_id in existing]]
+                if self._ivf is not None:
+                    self._track_ivf_moves(rows, updated)
+                self._vectors[rows] = updated
+                self._norms[rows] = (updated * updated).sum(axis=1)
+                self._alive[rows] = 1
+                for array in (self._vectors, self._norms, self._alive):
+                    array.flush()
+                if self._quantized is not None:
+                    quantizer, codes, covered = self._quantized
+                    coded = rows < covered
+                    if coded.any():
+                        codes[rows[coded]] = quantizer.encode(updated[coded])
+                        codes.flush()
+
+            new_ids = [chunk_id for chunk_id in latest if chunk_id not in existing]
+            if new_ids:
+                first_row = self._rows
+                appended = vectors[[latest[chunk_id] for chunk_id in new_ids]]
+                # Drop the tail of an append that crashed before vectors.f32 was written
+                for path, itemsize in ((self._norms_path, 4), (self._alive_path, 1)):
+                    if os.path.exists(path) and os.path.getsize(path) > first_row * itemsize:
+                        os.truncate(path, first_row * itemsize)
+                with open(self._norms_path, "ab") as f:
+                    f.write((appended * appended).sum(axis=1).astype(np.float32).tobytes())
+                with open(self._alive_path, "ab") as f:
+                    f.write(np.ones(len(new_ids), dtype=np.uint8).tobytes())
+                with open(self._vectors_path, "ab") as f:
+                    f.write(appended.tobytes())
+                existing.update((chunk_id, first_row + offset) for offset, chunk_id in enumerate(new_ids))
+                self._refresh()
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (existing[chunk_id], chunk_id, documents[position] or "", json.dumps(metadatas[position] or {}))
+                    for chunk_id, position in latest.items()
+                ],
+            )
+            self._conn.commit()
+
+    def _track_ivf_moves(self, rows: np.ndarray, updated: np.ndarray):
+        """Record the listed rows whose new vector is nearest another centroid than their old one; call while writing."""
+        centroids, centroid_norms, _, _, covered = self._ivf
+        listed = rows[rows < covered]
+        if not len(listed):
+            return
+        old = nearest_centroid(np.asarray(self._vectors[listed]), centroids, centroid_norms)
+        new = nearest_centroid(updated[rows < covered], centroids, centroid_norms)
+        self._conn.executemany("INSERT OR IGNORE INTO ivf_moved (row) VALUES (?)",
+                               [(int(row),) for row in listed[old != new]])
+
+    def delete(self, ids):
+        with self._writing():
+            rows = self._rows_for(list(ids))
+            if not rows:
+                return
+            self._alive[list(rows.values())] = 0
+            self._alive.flush()
+            for batch in _batches(list(rows)):
+                self._conn.execute(f"DELETE FROM entries WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, where=None, ids=None, include_embeddings=False):
+        clause, params = self._where_clause(where)
+        with self._lock:
+            if ids is None:
+                rows = self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM entries{clause} ORDER BY row", params
+                ).fetchall()
+            else:
+                rows = []
+                id_clause = " AND " if clause else " WHERE "
+                for batch in _batches(list(ids)):
+                    rows += self._conn.execute(
+                        f"SELECT row, id, document, metadata FROM entries{clause}{id_clause}id IN ({','.join('?' * len(batch))})",
+                        params + batch,
+                    ).fetchall()
+            return self._entries(rows, include_embeddings)
+
+    def scan(self, batch_size=10000):
+        last_row = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT row, id, document, metadata FROM entries WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size),
+                ).fetchall()
+                if not rows:
+                    return
+                batch = self._entries(rows, True)
+            last_row = rows[-1][0]
+            yield batch
+
+    def _entries(self, rows, include_embeddings):
+        """get()'s result for (row, id, document, metadata) tuples; call with the lock held."""
+        result = {
+            "ids": [chunk_id for _, chunk_id, _, _ in rows],
+            "documents": [document for _, _, document, _ in rows],
+            "metadatas": [json.loads(metadata) for _, _, _, metadata in rows],
+        }
+        if include_embeddings:
+            self._refresh()
+            positions = np.array([row for row, _, _, _ in rows], dtype=np.int64)
+            result["embeddings"] = (np.asarray(self._vectors[positions]) if len(positions)
+                                    else np.empty((0, self.dim or 0), dtype=np.float32))
+        return result
+
+    def _ivf_candidates(self, query: np.ndarray) -> np.ndarray:
+        centroids, centroid_norms, order, offsets, covered = self._ivf
+        distances = centroid_norms - 2 * (centroids @ query)
+        probe = np.argpartition(distances, self.nprobe)[:self.nprobe] if self.nprobe < len(centroids) else range(len(centroids))
+        parts = [order[offsets[list_id]:offsets[list_id + 1]] for list_id in probe]
+        parts.append(np.arange(covered, self._rows, dtype=np.int64))
+        parts.append(np.array([row for row, in self._conn.execute("SELECT row FROM ivf_moved")], dtype=np.int64))
+        return np.concatenate(parts)
+
+    @staticmethod
+    def _block_distances(block_rows, index, query, query_norm, vectors, norms, quantized, prepared):
+        """Squared L2 distances of a block of rows, estimated from the codes for rows that have them."""
+        if quantized is None:
+            return norms[index] - 2 * (vectors[index] @ query) + query_norm
+        quantizer, codes, covered = quantized
+        coded = block_rows < covered
+        if coded.all():
+            return quantizer.distances(codes[index], norms[index], prepared, query_norm)
+        distances = np.empty(len(block_rows), dtype=np.float32)
+        coded_rows, float_rows = block_rows[coded], block_rows[~coded]
+        distances[coded] = quantizer.distances(codes[coded_rows], norms[coded_rows], prepared, query_norm)
+        distances[~coded] = norms[float_rows] - 2 * (vectors[float_rows] @ query) + query_norm
+        return distances
+
+    def query(self, vector, k=5, where=None, exact=False):
+        """
+        The k nearest live entries. Equality conditions in `where` select the candidate rows in SQLite
+        first and only those are scored; otherwise the IVF lists are probed if built (unless `exact`),
+        or every row is scanned. Rows matching a $ne condition are looked up the same way and skipped.
+        If the index is quantized (and not `exact`), rows are scored from their codes and the best
+        k * rerank are scored again with their float vectors.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            if not self._rows or k <= 0:
+                return []
+            vectors, norms, alive, rows = self._vectors, self._norms, self._alive, self._rows
+            quantized = None if exact else self._quantized
+            equal, not_equal = self._split_where(where)
+            excluded = None
+            if not_equal:
+                excluded = np.unique(np.concatenate([
+                    self._matching_rows({key: value}) for key, value in not_equal.items()
+                ]))
+            if equal:
+                candidates = self._matching_rows(equal)
+            elif self._ivf is not None and not exact:
+                candidates = self._ivf_candidates(query)
+            else:
+                candidates = None
+
+        query_norm = float(query @ query)
+        prepared = quantized[0].prepare(query) if quantized is not None else None
+        shortlist = k * max(1, self.rerank) if quantized is not None else k
+        best_distances = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        if candidates is None:
+            blocks = ((np.arange(start, min(start + SCAN_BLOCK_ROWS, rows)), slice(start, start + SCAN_BLOCK_ROWS))
+                      for start in range(0, rows, SCAN_BLOCK_ROWS))
+        else:
+            # Sorted rows read the memmap sequentially; a moved row may also be in the list it left
+            candidates = np.unique(candidates[candidates < rows])
+            candidates = candidates[alive[candidates] == 1]
+            if excluded is not None:
+                candidates = np.setdiff1d(candidates, excluded, assume_unique=True)
+            blocks = ((candidates[start:start + SCAN_BLOCK_ROWS], candidates[start:start + SCAN_BLOCK_ROWS])
+                      for start in range(0, len(candidates), SCAN_BLOCK_ROWS))
+        for block_rows, index in blocks:
+            distances = self._block_distances(block_rows, index, query, query_norm, vectors, norms, quantized, prepared)
+            if candidates is None:
+                distances[alive[index] == 0] = np.inf
+                if excluded is not None and len(excluded):
+                    distances[np.isin(block_rows, excluded)] = np.inf
+            best_distances, best_rows = _top_k(
+                np.concatenate([best_distances, distances]), np.concatenate([best_rows, block_rows]), shortlist
+            )
+
+        keep = np.isfinite(best_distances)
+        best_distances, best_rows = best_distances[keep], best_rows[keep]
+        if quantized is not None and len(best_rows):
+            # Re-rank the shortlist with the float vectors, read in row order
+            best_rows = np.sort(best_rows)
+            best_distances, best_rows = _top_k(
+                norms[best_rows] - 2 * (vectors[best_rows] @ query) + query_norm, best_rows, k
+            )
+        if not len(best_rows):
+            return []
+        with self._lock:
+            placeholders = ",".join("?" * len(best_rows))
+            entries = {
+                row: (chunk_id, document, metadata) for row, chunk_id, document, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM entries WHERE row IN ({placeholders})",
+                    [int(row) for row in best_rows],
+                )
+            }
+        hits = []
+        for distance, row in zip(best_distances, best_rows):
+            if int(row) in entries:  # skip an entry deleted while the scan ran
+                chunk_id, document, metadata = entries[int(row)]
+                hits.append(Hit(chunk_id, document, json.loads(metadata), max(0.0, float(distance))))
+        return hits
+
+    # --- IVF -------------------------------------------------------------------------------
+
+    def build_ivf(self, lists: Optional[int] = None, iterations: int = 10, sample_size: Optional[int] = None,
+                  seed: int = 0) -> int:
+        """
+        Cluster the live rows with k-means (trained on a sample) and write one list of rows per centroid.
+        Defaults to 4·√n lists trained on 64 rows per list. Returns the number of lists.
+        Rows are assigned with writers held off, so no update falls between assignment and commit.
+        """
+        with self._lock:
+            self._refresh()
+            vectors, alive, rows = self._vectors, self._alive, self._rows
+        if not rows:
+            raise ValueError("The index is empty")
+        live = np.flatnonzero(alive[:rows])
+        lists = min(lists or max(1, int(4 * np.sqrt(len(live)))), len(live))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, size=min(len(live), sample_size or lists * 64), replace=False))
+        centroids = kmeans(np.asarray(vectors[sample]), lists, iterations, rng)
+
+        centroid_norms = (centroids * centroids).sum(axis=1)
+
+        with self._writing():
+            vectors, rows = self._vectors, self._rows
+            live = np.flatnonzero(self._alive[:rows])
+            assignment = np.empty(len(live), dtype=np.int64)
+            for start in range(0, len(live), ASSIGN_BLOCK_ROWS):
+                block = live[start:start + ASSIGN_BLOCK_ROWS]
+                assignment[start:start + len(block)] = nearest_centroid(np.asarray(vectors[block]), centroids,
+                                                                        centroid_norms)
+            order = live[np.argsort(assignment, kind="stable")]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+            np.save(self._ivf_file("centroids"), centroids.astype(np.float32))
+            np.save(self._ivf_file("order"), order.astype(np.int64))
+            self._set_info("ivf_rows", rows)
+            self._conn.execute("DELETE FROM ivf_moved")
+            self._conn.commit()
+            # The offsets file is written last; its mtime tells readers to reload the lists
+            np.save(self._ivf_file("offsets"), offsets.astype(np.int64))
+            self._refresh()
+        return lists
+
+    def drop_ivf(self):
+        with self._writing():
+            for name in ("offsets", "order", "centroids"):
+                if os.path.exists(self._ivf_file(name)):
+                    os.remove(self._ivf_file(name))
+            self._conn.execute("DELETE FROM ivf_moved")
+            self._conn.commit()
+            self._refresh()
+
+    # --- Quantization ----------------------------------------------------------------------
+
+    def quantize(self, method: str = "int8", sample_size: int = QUANTIZE_SAMPLE_ROWS, seed: int = 0, **options):
+        """
+        Train a quantizer (int8 or pq, see quantization.py) on a sample of the live rows and encode
+        every row. `options` go to the quantizer, e.g. subvectors=96 for pq. Returns the quantizer.
+        """
+        if method not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization {method!r}; expected one of {', '.join(QUANTIZERS)}")
+        with self._lock:
+            self._refresh()
+            vectors, alive, rows = self._vectors, self._alive, self._rows
+        if not rows:
+            raise ValueError("The index is empty")
+        live = np.flatnonzero(alive[:rows])
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, size=min(len(live), sample_size), replace=False))
+        quantizer = QUANTIZERS[method].train(np.asarray(vectors[sample]), seed=seed, **options)
+
+        # Encoded with writers held off: an upsert between encoding and the commit would leave its row
+        # with the code of its old vector, below the quantized_rows watermark
+        with self._writing():
+            rows = self._rows
+            codes = encode_rows(quantizer, self._vectors, rows)
+            save_quantizer(quantizer, self._quantizer_file("quantizer.npz"))
+            self._set_info("quantized_rows", rows)
+            self._conn.commit()
+            # The codes are written last; their mtime tells readers to reload
+            np.save(self._quantizer_file("codes.npy"), codes)
+            self._refresh()
+        return quantizer
+
+    def drop_quantized(self):
+        with self._writing():
+            for name in ("codes.npy", "quantizer.npz"):
+                if os.path.exists(self._quantizer_file(name)):
+                    os.remove(self._quantizer_file(name))
+            self._refresh()
+
+
+def import_collection(collection_name: str, index: LocalVectorIndex, batch_size: int = 1000) -> int:
+    """Copy a ChromaDB collection (ids, embeddings, documents, metadatas) into a local index."""
+    from app.services.resources import get_collection
+
+    collection = get_collection(collection_name)
+    total = collection.count()
+    copied = 0
+    started = time.perf_counter()
+    while copied < total:
+        batch = collection.get(offset=copied, limit=batch_size, include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            break
+        index.upsert(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+        copied += len(batch["ids"])
+        print(f"📥 Imported {copied}/{total} entries ({copied / (time.perf_counter() - started):.0f}/s)")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local vector index.")
+    parser.add_argument("command", choices=["import", "build-ivf", "drop-ivf", "quantize", "drop-quantized"])
+    parser.add_argument("--collection", default="langchain", help="ChromaDB collection the index mirrors")
+    parser.add_argument("--index-dir", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default 4·√n)")
+    parser.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+    parser.add_argument("--method", choices=sorted(QUANTIZERS), default="int8", help="quantization for quantize")
+    parser.add_argument("--subvectors", type=int, default=None, help="pq bytes per vector (default dim / 8)")
+    args = parser.parse_args()
+
+    index = LocalVectorIndex(os.path.join(args.index_dir, args.collection))
+    if args.command == "import":
+        copied = import_collection(args.collection, index, args.batch_size)
+        print(f"✅ Imported {copied} entries into {index.directory}")
+    elif args.command == "build-ivf":
+        started = time.perf_counter()
+        lists = index.build_ivf(args.lists, args.iterations)
+        print(f"✅ Built {lists} IVF lists over {index.count()} entries in {time.perf_counter() - started:.1f}s")
+    elif args.command == "drop-ivf":
+        index.drop_ivf()
+        print("✅ Removed the IVF lists; queries scan the full index")
+    elif args.command == "quantize":
+        started = time.perf_counter()
+        quantizer = index.quantize(args.method, subvectors=args.subvectors, iterations=args.iterations)
+        print(f"✅ Encoded {index.count()} entries as {args.method} ({quantizer.bytes_per_vector} bytes per vector, "
+              f"{4 * index.dim} as float32) in {time.perf_counter() - started:.1f}s")
+    else:
+        index.drop_quantized()
+        print("✅ Removed the quantized codes; queries score the float vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# app/services/vector_db/quantization.py
+# Compact codes for the local index (see LocalVectorIndex.quantize). Queries are scored against
+# the codes and the best candidates are re-ranked with the full-precision vectors, so only the
+# codes need to stay in RAM:
+#
+#   int8  one byte per dimension: each dimension's range is split into 256 steps (4x smaller)
+#   pq    product quantization: the vector is cut into `subvectors` pieces and each piece is
+#         replaced by the nearest of 256 centroids learned for it, one byte per piece
+#         (768 dimensions / 96 subvectors = 32x smaller)
+from typing import Optional
+
+import numpy as np
+
+ASSIGN_BLOCK_ROWS = 8192  # rows assigned to centroids at once
+ENCODE_BLOCK_ROWS = 65536
+DECODE_BLOCK_ROWS = 4096  # int8 rows widened to float32 at once, small enough to stay in cache
+PQ_TRAIN_ROWS_PER_CENTROID = 64
+
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, centroid_norms: np.ndarray) -> np.ndarray:
+    return np.argmin(centroid_norms - 2 * (vectors @ centroids.T), axis=1)
+
+
+def kmeans(data: np.ndarray, clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd's k-means seeded with random rows of `data`; empty clusters keep their previous centroid."""
+    centroids = data[rng.choice(len(data), clusters, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        centroid_norms = (centroids * centroids).sum(axis=1)
+        assignment = np.concatenate([
+            nearest_centroid(data[start:start + ASSIGN_BLOCK_ROWS], centroids, centroid_norms)
+            for start in range(0, len(data), ASSIGN_BLOCK_ROWS)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=clusters)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(data[order], starts[filled], axis=0) / counts[filled, None]
+    return centroids
+
+
+class ScalarQuantizer:
+    """int8: code = round((x - low) / scale) per dimension, with low/scale from the training sample."""
+
+    kind = "int8"
+    order = "C"
+
+    def __init__(self, low: np.ndarray, scale: np.ndarray):
+        self.low = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+        self.bytes_per_vector = len(low)
+
+    @classmethod
+    def train(cls, sample: np.ndarray, **options) -> "ScalarQuantizer":
+        # Percentiles rather than min/max, so a few outliers don't stretch every step
+        low = np.percentile(sample, 0.1, axis=0)
+        high = np.percentile(sample, 99.9, axis=0)
+        return cls(low, np.maximum(high - low, 1e-12) / 255)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((vectors - self.low) / self.scale), 0, 255).astype(np.uint8)
+
+    def prepare(self, query: np.ndarray):
+        return self.scale * query, float(self.low @ query)
+
+    def distances(self, codes: np.ndarray, norms: np.ndarray, prepared, query_norm: float) -> np.ndarray:
+        # Only the dot product is approximated; the stored norms are exact
+        scaled_query, offset = prepared
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), DECODE_BLOCK_ROWS):
+            dots[start:start + DECODE_BLOCK_ROWS] = codes[start:start + DECODE_BLOCK_ROWS].astype(np.float32) @ scaled_query
+        return norms - 2 * (dots + offset) + query_norm
+
+    def arrays(self):
+        return {"low": self.low, "scale": self.scale}
+
+
+class ProductQuantizer:
+    """
+    pq: 256 centroids per subvector; distances come from a per-query table (asymmetric distance).
+    Codes are kept column-major, so each subvector's codes are read as one contiguous run.
+    """
+
+    kind = "pq"
+    order = "F"
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = centroids.astype(np.float32)  # (subvectors, 256, dim / subvectors)
+        self.subvectors, self.clusters, self.width = centroids.shape
+        self.bytes_per_vector = self.subvectors
+
+    @classmethod
+    def train(cls, sample: np.ndarray, subvectors: Optional[int] = None, iterations: int = 10,
+              seed: int = 0, **options) -> "ProductQuantizer":
+        dim = sample.shape[1]
+        subvectors = subvectors or max(1, dim // 8)
+        if dim % subvectors:
+            raise ValueError(f"{dim} dimensions can't be cut into {subvectors} equal subvectors")
+        width = dim // subvectors
+        clusters = min(256, len(sample))
+        rng = np.random.default_rng(seed)
+        sample = sample[:clusters * PQ_TRAIN_ROWS_PER_CENTROID]  # already a random sample
+        centroids = np.stack([
+            kmeans(np.ascontiguousarray(sample[:, m * width:(m + 1) * width]), clusters, iterations, rng)
+            for m in range(subvectors)
+        ])
+        return cls(centroids)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        centroid_norms = (self.centroids * self.centroids).sum(axis=2)
+        for m in range(self.subvectors):
+            part = vectors[:, m * self.width:(m + 1) * self.width]
+            for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+                codes[start:start + ASSIGN_BLOCK_ROWS, m] = nearest_centroid(
+                    part[start:start + ASSIGN_BLOCK_ROWS], self.centroids[m], centroid_norms[m])
+        return codes
+
+    def prepare(self, query: np.ndarray) -> np.ndarray:
+        """Squared distance from each query piece to each centroid of its subspace."""
+        pieces = query.reshape(self.subvectors, 1, self.width)
+        return ((self.centroids - pieces) ** 2).sum(axis=2)
+
+    def distances(self, codes: np.ndarray, norms: np.ndarray, prepared, query_norm: float) -> np.ndarray:
+        distances = np.zeros(len(codes), dtype=np.float32)
+        for m in range(self.subvectors):
+            distances += prepared[m].take(codes[:, m])
+        return distances
+
+    def arrays(self):
+        return {"centroids": self.centroids}
+
+
+QUANTIZERS = {quantizer.kind: quantizer for quantizer in (ScalarQuantizer, ProductQuantizer)}
+
+
+def save_quantizer(quantizer, path: str):
+    np.savez(path, kind=np.array(quantizer.kind), **quantizer.arrays())
+
+
+def load_quantizer(path: str):
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files if name != "kind"}
+        return QUANTIZERS[str(data["kind"])](**arrays)
+
+
+def encode_rows(quantizer, vectors: np.ndarray, rows: int) -> np.ndarray:
+    """Codes for the first `rows` rows of a (memory-mapped) matrix, encoded block by block."""
+    codes = np.empty((rows, quantizer.bytes_per_vector), dtype=np.uint8, order=quantizer.order)
+    for start in range(0, rows, ENCODE_BLOCK_ROWS):
+        stop = min(start + ENCODE_BLOCK_ROWS, rows)
+        codes[start:stop] = quantizer.encode(np.asarray(vectors[start:stop]))
+    return codes
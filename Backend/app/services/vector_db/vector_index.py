@@ -0,0 +1,99 @@
+# app/services/vector_db/vector_index.py
+# The vector search interface used by retrieval and the similar-patents search, so the
+# backend (ChromaDB or the local memory-mapped index) can be swapped with VECTOR_BACKEND.
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class Hit(NamedTuple):
+    id: str
+    document: str
+    metadata: Dict
+    distance: float  # squared L2, as ChromaDB reports it
+
+
+class VectorIndex(ABC):
+    """
+    Minimal vector store: upsert/delete by id, fetch by metadata and nearest-neighbour search.
+    `where` is an equality filter on metadata, e.g. {"filename_base": "patent.pdf"}.
+    """
+
+    @abstractmethod
+    def query(self, vector: Sequence[float], k: int = 5, where: Optional[Dict] = None) -> List[Hit]:
+        ...
+
+    @abstractmethod
+    def get(self, where: Optional[Dict] = None, ids: Optional[List[str]] = None,
+            include_embeddings: bool = False) -> Dict[str, List]:
+        """
+        Stored entries as {"ids", "documents", "metadatas"}, like a Chroma collection.get(), plus
+        "embeddings" (a float32 matrix, one row per id) if `include_embeddings`.
+        """
+
+    @abstractmethod
+    def scan(self, batch_size: int = 10000) -> Iterator[Dict]:
+        """Every entry, in batches shaped like get(include_embeddings=True), for bulk jobs."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+
+class ChromaVectorIndex(VectorIndex):
+    """A ChromaDB collection behind the VectorIndex interface."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, vector, k=5, where=None):
+        results = self.collection.query(query_embeddings=[list(vector)], n_results=k, where=where)
+        if not results or not results.get("ids"):
+            return []
+        return [
+            Hit(chunk_id, document, metadata or {}, distance)
+            for chunk_id, document, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+    def get(self, where=None, ids=None, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = self.collection.get(where=where, ids=ids, include=include)
+        return self._entries(results, include_embeddings)
+
+    def scan(self, batch_size=10000):
+        offset = 0
+        while True:
+            results = self.collection.get(offset=offset, limit=batch_size,
+                                          include=["documents", "metadatas", "embeddings"])
+            if not results["ids"]:
+                return
+            yield self._entries(results, True)
+            offset += len(results["ids"])
+
+    @staticmethod
+    def _entries(results, include_embeddings):
+        entries = {"ids": results["ids"], "documents": results["documents"], "metadatas": results["metadatas"]}
+        if include_embeddings:
+            embeddings = results["embeddings"]
+            entries["embeddings"] = np.asarray(embeddings if embeddings is not None else [], dtype=np.float32)
+        return entries
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self):
+        return self.collection.count()
@@ -1,85 +1,169 @@
+import argparse
+import json
 import os
-try:
-    import pandas as pd
-except ImportError:
-    print("pandas not installed. Please install it with: pip install pandas")
-    exit(1)
-
-from chromadb import PersistentClient
-from app.services.get_embedding_function import get_embedding_function
-
-# Step 1: Path to your dataset
-data_dir = "C:/Users/ishak/OneDrive/Desktop/data" # This should be parameterized or moved to config
-
-# Step 2: Load and combine all CSVs
-csv_files = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
-
-combined_df = pd.DataFrame()
-for file in csv_files:
-    df = pd.read_csv(os.path.join(data_dir, file))
-    df["source_file"] = file
-    combined_df = pd.concat([combined_df, df], ignore_index=True)
-
-# Step 3: Prepare text for embedding
-texts = (
-    combined_df["Title"].fillna('') + " - " +
-    combined_df["Field Of Invention"].fillna('')
-).tolist()
-
-# Step 4: Generate embeddings using the unified embedding function
-print("Initializing embedding function...")
-embedding_fn = get_embedding_function()
-# The embed_documents method is expected for lists of texts.
-# This might be slow for very large datasets; consider batching calls to embed_documents if necessary,
-# or if the API supports larger batches directly. For now, let's assume it handles a large list.
-print("Generating embeddings for all texts. This may take a while...")
-embeddings = embedding_fn.embed_documents(texts)
-print(f"Generated {len(embeddings)} embeddings.")
-
-# Step 5: Initialize ChromaDB client with persistent storage using consistent path
-CHROMA_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "chroma_db"))
-print(f"Using ChromaDB path: {CHROMA_DB_PATH}")
-# Ensure the parent directory exists if ChromaDB doesn't create it
-os.makedirs(CHROMA_DB_PATH, exist_ok=True) # Make sure directory exists
-client = PersistentClient(path=CHROMA_DB_PATH)
-
-# Step 6: Add data in batches to avoid ChromaDB's max batch size error
-# Ensure the collection name is consistent if it needs to be accessed elsewhere,
-# e.g., "patent_data" or the default collection name used by ChromaConnector.
-# ChromaConnector uses "langchain" by default if not specified. Let's use a specific name.
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from app.services.csv_loader import iter_patent_batches
+from app.services.paths import CHROMA_PATH, STATE_DIR
+from app.services.resources import get_vector_index, get_embeddings, VECTOR_BACKEND
+from app.services.rate_limit import TokenBucket, retry_with_backoff
+
+# Streaming bulk ingest of the patent CSV dump into the "patent_data" collection.
+# CSVs are read in chunks, each chunk is embedded and written to ChromaDB as soon as it is ready,
+# and a checkpoint file records finished batches so a crashed run picks up where it stopped.
+# Rows are stored under "<csv file>:<row>" ids. Collections loaded before that used plain row
+# numbers ("0", "1", ...); a run without a checkpoint deletes those first, so they aren't kept
+# alongside the new ids. --restart starts over from a fresh checkpoint the same way.
+#
+#   python -m app.services.vector_store --data-dir /path/to/csvs --batch-size 256 --concurrency 4
+
+# Ensure the collection name is consistent if it needs to be accessed elsewhere.
 COLLECTION_NAME = "patent_data"
-collection = client.get_or_create_collection(name=COLLECTION_NAME)  # Don't pass embedding function to ChromaDB
-
-
-batch_size = 5000 # ChromaDB's default max batch size is large, but explicit batching is safer.
-for start in range(0, len(texts), batch_size):
-    end = min(start + batch_size, len(texts)) # Ensure 'end' doesn't exceed list length
-    current_batch_texts = texts[start:end]
-    current_batch_embeddings = embeddings[start:end]
-    current_batch_ids = [str(i) for i in range(start, end)]
-    current_batch_metadatas = [
-            {
-                "source_file": combined_df["source_file"].iloc[i],
-                "title": combined_df["Title"].iloc[i],
-                "date": combined_df["Application Date"].iloc[i], # Ensure this column name is correct
-                "assignee": combined_df["Applicant Name"].iloc[i] # Ensure this column name is correct
-            }
-            for i in range(start, end)
-        ]
-
-    print(f"✅ Inserting batch from index {start} to {end-1} (Size: {len(current_batch_texts)})...")
-
-    if not current_batch_texts:
-        print("Skipping empty batch.")
-        continue
-
-    collection.add(
-        documents=current_batch_texts,
-        embeddings=current_batch_embeddings,  # type: ignore
-        ids=current_batch_ids,
-        metadatas=current_batch_metadatas  # type: ignore
-    )
-
-# Verify collection count
-print(f"Collection '{COLLECTION_NAME}' now has {collection.count()} documents.")
-print("✅ All data has been stored in ChromaDB!")
+CHECKPOINT_PATH = os.path.join(STATE_DIR, "vector_store_checkpoint.json")
+LEGACY_ID_BATCH = 1000  # legacy ids looked up per get()
+
+
+class Checkpoint:
+    """
+    Tracks finished batches per CSV file. Batches finish out of order, so each file keeps a
+    watermark (every row below it is stored) plus the start rows of finished batches above it.
+    """
+
+    def __init__(self, path: str, batch_size: int):
+        self.path = path
+        self.state = {"batch_size": batch_size, "files": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("batch_size") == batch_size:
+                self.state = saved
+                print(f"↩️  Resuming from checkpoint {path}")
+            else:
+                print(f"⚠️ Checkpoint was written with batch size {saved.get('batch_size')}; starting over.")
+
+    def _file(self, source_file: str) -> dict:
+        return self.state["files"].setdefault(source_file, {"watermark": 0, "done": []})
+
+    def is_done(self, source_file: str, start: int) -> bool:
+        entry = self._file(source_file)
+        return start < entry["watermark"] or start in entry["done"]
+
+    def mark_done(self, source_file: str, start: int):
+        entry = self._file(source_file)
+        done = set(entry["done"]) | {start}
+        batch_size = self.state["batch_size"]
+        while entry["watermark"] in done:
+            done.remove(entry["watermark"])
+            entry["watermark"] += batch_size
+        entry["done"] = sorted(done)
+
+    @property
+    def legacy_ids_removed(self) -> bool:
+        return self.state.get("legacy_ids_removed", False)
+
+    @legacy_ids_removed.setter
+    def legacy_ids_removed(self, value: bool):
+        self.state["legacy_ids_removed"] = value
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def remove_legacy_ids(collection, batch_size: int = LEGACY_ID_BATCH) -> int:
+    """
+    Delete the rows an earlier ingest stored under plain row numbers. Those ran from "0" without
+    gaps, so they are looked up a batch at a time until a batch finds none. Returns how many went.
+    """
+    removed, start = 0, 0
+    while True:
+        found = collection.get(ids=[str(row) for row in range(start, start + batch_size)])["ids"]
+        if not found:
+            return removed
+        collection.delete(found)
+        removed += len(found)
+        start += batch_size
+
+
+def ingest(data_dir: str, batch_size: int = 256, concurrency: int = 4, requests_per_minute: float = 300,
+           checkpoint_path: str = CHECKPOINT_PATH, read_workers: int = 1):
+    print(f"Using {VECTOR_BACKEND} vector backend (ChromaDB path: {CHROMA_PATH})")
+    collection = get_vector_index(COLLECTION_NAME)  # Embeddings are computed here, not by the store
+
+    print("Initializing embedding function...")
+    embedding_fn = get_embeddings()
+    bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=concurrency)
+    checkpoint = Checkpoint(checkpoint_path, batch_size)
+    if not checkpoint.legacy_ids_removed:
+        removed = remove_legacy_ids(collection)
+        if removed:
+            print(f"🧹 Removed {removed} rows stored under legacy numeric ids")
+        checkpoint.legacy_ids_removed = True
+        checkpoint.save()
+
+    def embed_and_store(texts, ids, metadatas):
+        bucket.acquire()
+        embeddings = retry_with_backoff(embedding_fn.embed_documents, texts)
+        # upsert keeps a re-run of a half-finished batch idempotent
+        retry_with_backoff(
+            collection.upsert,
+            documents=texts,
+            embeddings=embeddings,  # type: ignore
+            ids=ids,
+            metadatas=metadatas  # type: ignore
+        )
+        return len(texts)
+
+    stored = 0
+    in_flight = {}
+    # At most `concurrency` batches are held in memory at any time
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def drain(block_until: int):
+            nonlocal stored
+            while len(in_flight) > block_until:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    source_file, start = in_flight.pop(future)
+                    stored += future.result()  # an exhausted retry aborts the run; the checkpoint keeps the progress
+                    checkpoint.mark_done(source_file, start)
+                    print(f"✅ Stored {source_file} rows {start}+ ({stored} rows this run)")
+                checkpoint.save()
+
+        for batch in iter_patent_batches(data_dir, batch_size, workers=read_workers):
+            if checkpoint.is_done(batch.source_file, batch.start):
+                continue
+            future = executor.submit(embed_and_store, batch.texts, batch.ids, batch.metadatas)
+            in_flight[future] = (batch.source_file, batch.start)
+            drain(concurrency - 1)
+        drain(0)
+
+    # Verify collection count
+    print(f"Collection '{COLLECTION_NAME}' now has {collection.count()} documents.")
+    print("✅ All data has been stored in ChromaDB!")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the patent CSV dump into ChromaDB.")
+    parser.add_argument("--data-dir", default=os.environ.get("PATENT_DATA_DIR"),
+                        required="PATENT_DATA_DIR" not in os.environ,
+                        help="directory containing the patent CSV files (default: $PATENT_DATA_DIR)")
+    parser.add_argument("--batch-size", type=int, default=256, help="rows per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="embedding requests in flight")
+    parser.add_argument("--requests-per-minute", type=float, default=300, help="embedding API rate limit")
+    parser.add_argument("--read-workers", type=int, default=1, help="CSV files parsed in parallel")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and clear legacy numeric ids again")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    ingest(args.data_dir, args.batch_size, args.concurrency, args.requests_per_minute, args.checkpoint,
+           args.read_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,30 @@
-import sys
-import os
+# Print the analysis of an already ingested document.
+#
+#   python -m app.test_analysis Document1.pdf
+#   python -m app.test_analysis Document1.pdf --fake   # offline, with the benchmark fakes
+import argparse
 
-# Add Backend to the Python path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from services.analysis_service import analyze_patent
+def main():
+    parser = argparse.ArgumentParser(description="Analyze an ingested document and print the result.")
+    parser.add_argument("document_id", help="document to analyze (the uploaded file name)")
+    parser.add_argument("--fake", action="store_true", help="use local fake models instead of the Gemini API")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
-    result = analyze_patent()
+    if args.fake:
+        from benchmarks.fakes import install_fakes
+        install_fakes(llm_latency=0.1, embedding_latency=0.01)
+
+    from app.services.analysis_service import analyze_patent
+
+    result = analyze_patent(args.document_id)
     if result:
         print("\n--- Patent Analysis Result ---")
         for key, value in result.items():
             print(f"\n🔹 {key.upper()}:\n{value}")
     else:
-        print("⚠️ No data found in ChromaDB or analysis failed.")
+        print(f"⚠️ No chunks found for {args.document_id} or analysis failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# Offline benchmarks for the backend services. Run from the Backend directory, e.g.
+#   python -m benchmarks.bench_analysis --latency 0.4
+# run_suite runs the end-to-end suite and writes JSON results to compare across commits.
@@ -0,0 +1,50 @@
+# benchmarks/bench_analysis.py
+# Compares the latency of run_analysis() in sequential, concurrent, structured and map-reduce
+# mode against a local fake model.
+#
+#   python -m benchmarks.bench_analysis --latency 0.5 --runs 20
+import argparse
+import time
+
+import numpy as np
+
+from app.services import analysis_service
+from app.services.resources import registry, SIMILAR_PATENTS_COLLECTION
+from benchmarks.fakes import FakeGenerativeModel, FakeEmbeddings, fake_vector_index
+
+# ~13k characters in 500-character chunks, like a short filing after ingestion
+SAMPLE_CHUNKS = ["A method for cooling a battery pack using a phase-change material. " * 7] * 28
+SAMPLE_TEXT = "\n\n".join(SAMPLE_CHUNKS)
+
+
+def bench_mode(mode: str, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        analysis_service.run_analysis(SAMPLE_TEXT, mode=mode, chunks=SAMPLE_CHUNKS)
+        timings.append(time.perf_counter() - started)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analysis modes against a fake model")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    registry.override("analysis_model", FakeGenerativeModel(args.latency))
+    registry.override("embeddings", FakeEmbeddings(latency=args.embedding_latency))
+    registry.override(f"vector_index:{SIMILAR_PATENTS_COLLECTION}", fake_vector_index(args.search_latency))
+
+    print(f"LLM latency {args.latency}s, embedding {args.embedding_latency}s, search {args.search_latency}s, "
+          f"{args.runs} runs per mode")
+    print(f"{'mode':<12}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for mode in ("sequential", "concurrent", "structured", "mapreduce"):
+        p50, p95 = bench_mode(mode, args.runs)
+        print(f"{mode:<12}{p50:>10.3f}{p95:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_chunking.py
+# Compares chunking strategies on the same documents. For each it reports:
+# - how many chunks they make;
+# - what embedding them costs: API calls in EMBED_BATCH_SIZE batches, tokens, and vector storage;
+# - the retrieval hit rate: the share of sampled sentences for which a query of a few of the
+#   sentence's words returns, in the top k, a chunk that holds the whole sentence.
+# Documents are synthetic patent filings, or real PDFs given as arguments. Retrieval is BM25 over
+# the chunks, as in bench_context, since the fake embeddings carry no meaning.
+#
+#   python -m benchmarks.bench_chunking --documents 20 --queries 300
+#   python -m benchmarks.bench_chunking path/to/*.pdf --target-tokens 128 256 384
+import argparse
+import math
+import os
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.chunking import (CHUNK_MAX_TOKENS, CHUNK_MIN_TOKENS, CHUNK_TARGET_TOKENS, split_documents,
+                                   split_patent)
+from app.services.lexical_index import LexicalIndex, tokenize
+from app.services.load_documents import _load_and_split_pages, count_pages
+from app.services.metrics import estimate_tokens
+from app.services.process import EMBED_BATCH_SIZE, calculate_chunk_ids
+from benchmarks.corpus import structured_patent_pages
+
+SENTENCE_RE = re.compile(r"(?<=\.)\s+")
+QUERY_TERMS = 5
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def load_documents(pdf_paths, documents: int, seed: int):
+    """{document name: page Documents} from the given PDFs, or from synthetic filings if there are none."""
+    from langchain.schema import Document
+
+    if pdf_paths:
+        return {os.path.basename(path): _load_and_split_pages(path, 0, count_pages(path)) for path in pdf_paths}
+    rng = random.Random(seed)
+    corpus = {}
+    for index in range(documents):
+        name = f"patent_{index:03d}.pdf"
+        pages = structured_patent_pages(rng, paragraphs=rng.randint(20, 80), claims=rng.randint(10, 30))
+        corpus[name] = [Document(page_content=text, metadata={"source": f"/uploads/{name}", "page": page})
+                        for page, text in enumerate(pages)]
+    return corpus
+
+
+def sample_queries(corpus, count: int, seed: int):
+    """(query, sentence) pairs: sentences of 8 to 60 words, each queried by a few of its terms."""
+    rng = random.Random(seed)
+    sentences = [
+        sentence
+        for pages in corpus.values()
+        for sentence in SENTENCE_RE.split(_normalize(" ".join(page.page_content for page in pages)))
+        if 8 <= len(sentence.split()) <= 60
+    ]
+    queries = []
+    for sentence in rng.sample(sentences, min(count, len(sentences))):
+        terms = sorted(set(tokenize(sentence)))
+        queries.append((" ".join(rng.sample(terms, min(QUERY_TERMS, len(terms)))), sentence))
+    return queries
+
+
+def evaluate(label: str, split, corpus, queries, top_k: int, dim: int):
+    started = time.perf_counter()
+    chunks_by_document = {name: calculate_chunk_ids(split(pages)) for name, pages in corpus.items()}
+    split_seconds = time.perf_counter() - started
+    chunks = [chunk for document_chunks in chunks_by_document.values() for chunk in document_chunks]
+    texts = {chunk.metadata["id"]: _normalize(chunk.page_content) for chunk in chunks}
+    tokens = [estimate_tokens(chunk.page_content) for chunk in chunks]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LexicalIndex(os.path.join(tmp, "lexical.sqlite"))
+        for name, document_chunks in chunks_by_document.items():
+            index.add(name, {chunk.metadata["id"]: chunk.page_content for chunk in document_chunks})
+        hits, retrieved_tokens = 0, []
+        for query, sentence in queries:
+            results = [chunk_id for chunk_id, _ in index.search(query, top_k)]
+            hits += any(sentence in texts[chunk_id] for chunk_id in results)
+            retrieved_tokens.append(sum(estimate_tokens(texts[chunk_id]) for chunk_id in results))
+
+    calls = sum(math.ceil(len(document_chunks) / EMBED_BATCH_SIZE) for document_chunks in chunks_by_document.values())
+    print(f"{label:<14}{len(chunks):>8}{np.mean(tokens):>8.0f}{calls:>7}{sum(tokens) / 1000:>10.1f}"
+          f"{len(chunks) * dim * 4 / 1e6:>10.1f}{hits / max(1, len(queries)) * 100:>8.1f}%"
+          f"{np.mean(retrieved_tokens):>10.0f}{split_seconds * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunking strategies")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to chunk (default: synthetic patent filings)")
+    parser.add_argument("--documents", type=int, default=20, help="synthetic documents")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--target-tokens", type=int, nargs="+", default=[CHUNK_TARGET_TOKENS],
+                        help="patent chunk sizes to compare")
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension, for the storage column")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_documents(args.pdfs, args.documents, args.seed)
+    queries = sample_queries(corpus, args.queries, args.seed)
+    pages = sum(len(document_pages) for document_pages in corpus.values())
+    print(f"{len(corpus)} documents, {pages} pages, {len(queries)} queries, top-{args.top_k}")
+    print(f"{'strategy':<14}{'chunks':>8}{'tok/ch':>8}{'calls':>7}{'k tokens':>10}{'vec MB':>10}"
+          f"{'hit@k':>9}{'ctx tok':>10}{'split ms':>10}")
+    evaluate("fixed", lambda pages: split_documents(pages, "fixed"), corpus, queries, args.top_k, args.dim)
+    for target in args.target_tokens:
+        # The maximum and minimum keep their ratio to the target
+        scale = target / CHUNK_TARGET_TOKENS
+        evaluate(f"patent/{target}",
+                 lambda pages: split_patent(pages, target, round(CHUNK_MAX_TOKENS * scale), round(CHUNK_MIN_TOKENS * scale)),
+                 corpus, queries, args.top_k, args.dim)
+
+
+if __name__ == "__main__":
+    main()
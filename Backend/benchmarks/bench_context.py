@@ -0,0 +1,85 @@
+# benchmarks/bench_context.py
+# Context tokens per /query before and after the context builder, on a synthetic corpus split with
+# the ingestion chunker. Some documents are re-filed copies of others (as continuations often
+# are), so retrieval returns duplicates as well as neighbouring chunks. Hits come from BM25, which
+# ranks like the real retrieval does; the fake embeddings are random and would not.
+#
+#   python -m benchmarks.bench_context --documents 40 --queries 200 --top-k 5
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import context_builder
+from app.services.context_builder import build_context
+from app.services.lexical_index import LexicalIndex
+from app.services.chunking import CHUNKING_STRATEGY, STRATEGIES, split_documents
+from app.services.process import calculate_chunk_ids
+from benchmarks.corpus import WORDS, patent_page_text
+
+
+def build_corpus(documents: int, pages: int, copies: float, seed: int, strategy: str = CHUNKING_STRATEGY):
+    from langchain.schema import Document
+
+    rng = random.Random(seed)
+    texts = {}
+    for index in range(documents):
+        if texts and rng.random() < copies:
+            source_pages = texts[rng.choice(sorted(texts))]  # a re-filed copy of an earlier document
+        else:
+            source_pages = [patent_page_text(rng) for _ in range(pages)]
+        texts[f"patent_{index:03d}.pdf"] = source_pages
+    chunks = []
+    for name, source_pages in texts.items():
+        pages_as_documents = [Document(page_content=text, metadata={"source": f"/uploads/{name}", "page": page})
+                              for page, text in enumerate(source_pages)]
+        chunks.extend(calculate_chunk_ids(split_documents(pages_as_documents, strategy)))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context token savings")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--copies", type=float, default=0.2, help="share of documents that copy an earlier one")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=context_builder.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--chunking", choices=STRATEGIES, default=CHUNKING_STRATEGY)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = build_corpus(args.documents, args.pages, args.copies, args.seed, args.chunking)
+    by_id = {chunk.metadata["id"]: chunk for chunk in chunks}
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LexicalIndex(os.path.join(tmp, "lexical.sqlite"))
+        for chunk in chunks:
+            index.add(chunk.metadata["filename_base"], {chunk.metadata["id"]: chunk.page_content})
+        rng = random.Random(args.seed)
+        questions = [" ".join(rng.sample(WORDS, 3)) for _ in range(args.queries)]
+        hits = [[(by_id[chunk_id], score) for chunk_id, score in index.search(question, args.top_k)]
+                for question in questions]
+
+    print(f"{len(chunks)} chunks ({args.chunking} chunking), {args.queries} queries, top-{args.top_k}, budget {args.budget} tokens")
+    print(f"{'mode':<26}{'tokens in':>10}{'tokens out':>11}{'saved':>8}{'dedup':>8}{'cut':>7}{'merged':>8}{'dupes':>7}"
+          f"{'µs/query':>10}")
+    for label, rerank in (("merge + dedupe", False), ("merge + dedupe + rerank", True)):
+        context_builder.CONTEXT_RERANK = rerank
+        stats, timings = [], []
+        for question, results in zip(questions, hits):
+            started = time.perf_counter()
+            stats.append(build_context(results, question, args.budget).stats)
+            timings.append(time.perf_counter() - started)
+        retrieved = np.mean([s["retrievedTokens"] for s in stats])
+        sent = np.mean([s["contextTokens"] for s in stats])
+        print(f"{label:<26}{retrieved:>10.0f}{sent:>11.0f}{(1 - sent / retrieved) * 100:>7.1f}%"
+              f"{np.mean([s['dedupSavedTokens'] for s in stats]):>8.0f}{np.mean([s['budgetCutTokens'] for s in stats]):>7.0f}"
+              f"{np.mean([s['mergedChunks'] for s in stats]):>8.2f}{np.mean([s['duplicatesDropped'] for s in stats]):>7.2f}"
+              f"{np.percentile(timings, 50) * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_neighbor_graph.py
+# Precomputed similar patents (app/services/neighbor_graph.py) against the live per-passage search,
+# on synthetic documents in a local index: documents share topics, and their chunk embeddings are
+# drawn around the topic centre. Reports the bulk build rate, the similar-patents latency of a
+# graph lookup and of the live search (passages already embedded, so only the searches are timed),
+# whether both return the same patents, and what an incremental update after an ingest costs and
+# whether it leaves the same rows as a full rebuild.
+#
+#   python -m benchmarks.bench_neighbor_graph --documents 2000 --chunks 20 --dim 768
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def synthetic_documents(documents: int, chunks: int, dim: int, topics: int, rng: np.random.Generator):
+    """{document name: (chunk ids, chunk vectors)} with every document drawn around one topic centre."""
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    corpus = {}
+    for number in range(documents):
+        name = f"patent_{number:05d}.pdf"
+        vectors = centres[rng.integers(topics)] + 0.8 * rng.standard_normal((chunks, dim)).astype(np.float32)
+        vectors *= 0.5 / np.linalg.norm(vectors, axis=1, keepdims=True)
+        corpus[name] = ([f"/uploads/{name}:{page}:0" for page in range(chunks)], vectors)
+    return corpus
+
+
+def store(index, corpus):
+    for name, (ids, vectors) in corpus.items():
+        index.upsert(ids, vectors, [f"{name} chunk {i}" for i in range(len(ids))],
+                     [{"id": chunk_id, "filename_base": name} for chunk_id in ids])
+
+
+def live_search(index, vectors, name, top_k):
+    from app.services.analysis_service import rank_similar, select_passages
+
+    hit_lists = []
+    for vector in select_passages(list(vectors)):
+        hits = index.query(vector, k=top_k * 2, where={"filename_base": {"$ne": name}})
+        hit_lists.append([(doc, meta, distance) for _, doc, meta, distance in hits])
+    return [patent for _, patent in rank_similar(hit_lists, top_k)]
+
+
+def _ids(patents):
+    return [(patent["id"], patent["matchedSections"]) for patent in patents]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the precomputed similar-patents graph")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per document")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=50, help="documents timed with the live search")
+    parser.add_argument("--ingests", type=int, default=5, help="documents added one by one afterwards")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Set before the app modules are imported, so the manifest and the graph open in the scratch directory
+        os.environ["APP_DATA_DIR"] = tmp
+        from app.services.neighbor_graph import build, compute_neighbors, get_neighbor_graph, update_document
+        from app.services.resources import registry
+        from app.services.vector_db.local_index import LocalVectorIndex
+
+        rng = np.random.default_rng(0)
+        corpus = synthetic_documents(args.documents + args.ingests, args.chunks, args.dim, args.topics, rng)
+        names = list(corpus)
+        initial, later = names[:args.documents], names[args.documents:]
+        index = LocalVectorIndex(os.path.join(tmp, "index"))
+        registry.override("vector_index:langchain", index)
+        store(index, {name: corpus[name] for name in initial})
+        print(f"{args.documents} documents x {args.chunks} chunks x {args.dim} dims, top-{args.top_k}")
+
+        started = time.perf_counter()
+        build(initial, args.top_k)
+        elapsed = time.perf_counter() - started
+        print(f"bulk build: {elapsed:.2f}s, {args.documents / elapsed:.0f} documents/s")
+
+        graph = get_neighbor_graph()
+        sample = [initial[i] for i in rng.choice(len(initial), min(args.samples, len(initial)), replace=False)]
+        live_ms, graph_ms, same = [], [], 0
+        for name in sample:
+            started = time.perf_counter()
+            expected = live_search(index, corpus[name][1], name, args.top_k)
+            live_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            stored = graph.lookup(name, args.top_k)
+            graph_ms.append((time.perf_counter() - started) * 1000)
+            same += _ids(stored or []) == _ids(expected)
+        print(f"{'similar patents':<18}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, latencies in (("live search", live_ms), ("graph lookup", graph_ms)):
+            print(f"{label:<18}{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 95):>9.2f}")
+        print(f"same patents as the live search: {same}/{len(sample)}")
+
+        for name in later:
+            store(index, {name: corpus[name]})
+            started = time.perf_counter()
+            updated = update_document(name, args.top_k)
+            print(f"ingest {name}: {updated} rows recomputed in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if later:
+            rebuilt = compute_neighbors(names, args.top_k)
+            agree = sum(_ids(graph.lookup(name, args.top_k) or []) == _ids(row["neighbors"])
+                        for name, row in rebuilt.items())
+            print(f"rows matching a full rebuild after the ingests: {agree}/{len(rebuilt)}")
+
+
+if __name__ == "__main__":
+    main()
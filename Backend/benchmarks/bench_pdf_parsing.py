@@ -0,0 +1,54 @@
+# benchmarks/bench_pdf_parsing.py
+# Pages/sec of PDF extraction + splitting: the serial PyPDFLoader path against page-parallel
+# extraction for one long PDF, and against whole-file parallelism for a batch of PDFs.
+#
+#   python -m benchmarks.bench_pdf_parsing --pages 400 --files 16 --workers 4
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.services.load_documents import load_and_split_pdf
+from benchmarks.corpus import generate_pdf_corpus
+
+
+def _parse_serial(path: str):
+    return load_and_split_pdf(path, workers=1)
+
+
+def timed(label: str, pages: int, fn):
+    started = time.perf_counter()
+    chunks = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34}{pages:>7}{chunks:>8}{elapsed:>9.2f}{pages / elapsed:>10.1f}")
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF parsing throughput")
+    parser.add_argument("--pages", type=int, default=400, help="pages in the long PDF")
+    parser.add_argument("--files", type=int, default=16, help="PDFs in the batch")
+    parser.add_argument("--pages-per-file", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        [long_pdf] = generate_pdf_corpus(os.path.join(tmp, "long"), 1, args.pages)
+        batch = generate_pdf_corpus(os.path.join(tmp, "batch"), args.files, args.pages_per_file, seed=1)
+        batch_pages = args.files * args.pages_per_file
+
+        print(f"{'path':<34}{'pages':>7}{'chunks':>8}{'seconds':>9}{'pages/s':>10}")
+        serial = timed("long PDF, serial", args.pages, lambda: len(load_and_split_pdf(long_pdf, workers=1)))
+        parallel = timed(f"long PDF, {args.workers} page workers", args.pages,
+                         lambda: len(load_and_split_pdf(long_pdf, workers=args.workers)))
+        assert serial == parallel, "page-parallel parsing must produce the same chunks"
+
+        timed("batch, serial", batch_pages, lambda: sum(len(_parse_serial(path)) for path in batch))
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            timed(f"batch, {args.workers} file workers", batch_pages,
+                  lambda: sum(len(chunks) for chunks in pool.map(_parse_serial, batch)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_quantization.py
+# Bytes per vector, recall@k and query latency of the local index with int8 and product-quantized
+# codes (re-ranked with the float vectors) against the float32 scan, on synthetic clustered
+# embeddings. Ground truth is a brute-force NumPy search over the float vectors.
+#
+#   python -m benchmarks.bench_quantization --rows 100000 --dim 768 --subvectors 96 48 --rerank 1 10
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_db.local_index import LocalVectorIndex
+from benchmarks.bench_vector_index import ground_truth, synthetic_vectors
+
+
+def measure(label: str, index: LocalVectorIndex, bytes_per_vector: int, queries: np.ndarray, truth: np.ndarray,
+            k: int, exact: bool = False):
+    latencies, found = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = index.query(query, k=k, exact=exact)
+        latencies.append(time.perf_counter() - started)
+        found += len({int(hit.id) for hit in hits} & {int(row) for row in expected})
+    latencies = np.array(latencies) * 1000
+    rows = len(truth) and index.count()
+    print(f"{label:<24}{bytes_per_vector:>8}{bytes_per_vector * rows / 2 ** 20:>10.1f}{found / truth.size:>10.3f}"
+          f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 95):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized storage in the local vector index")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--subvectors", type=int, nargs="+", default=[96, 48], help="pq code sizes to try")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 10],
+                        help="shortlist factors: k * factor candidates are re-ranked with float vectors")
+    parser.add_argument("--ivf", action="store_true", help="also probe IVF lists over the codes")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.rows, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(args.rows, size=args.queries)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+    truth = ground_truth(vectors, queries, args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(tmp)
+        for start in range(0, args.rows, 10000):
+            stop = min(start + 10000, args.rows)
+            index.upsert([str(row) for row in range(start, stop)], vectors[start:stop], [""] * (stop - start),
+                         [{}] * (stop - start))
+        if args.ivf:
+            index.build_ivf()
+
+        # Bytes per vector count the codes (or floats) plus the float32 norm and the live flag
+        print(f"{args.rows} x {args.dim}, {args.queries} queries, recall@{args.k}" + (", IVF" if args.ivf else ""))
+        print(f"{'storage':<24}{'B/vec':>8}{'scan MB':>10}{'recall':>10}{'p50 ms':>9}{'p95 ms':>9}")
+        measure("float32", index, 4 * args.dim + 5, queries, truth, args.k, exact=not args.ivf)
+
+        configurations = [("int8", {})] + [("pq", {"subvectors": m}) for m in args.subvectors]
+        for method, options in configurations:
+            started = time.perf_counter()
+            quantizer = index.quantize(method, **options)
+            label = method if method == "int8" else f"pq{options['subvectors']}"
+            print(f"{'(' + label + ' encode)':<24}{'':>8}{'':>10}{'':>10}{(time.perf_counter() - started) * 1000:>9.0f}")
+            for factor in args.rerank:
+                index.rerank = factor
+                measure(f"{label}, rerank x{factor}", index, quantizer.bytes_per_vector + 5, queries, truth, args.k)
+        index.drop_quantized()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# benchmarks/bench_serving.py
+# Concurrent /query and /analyze requests against the two ways of serving the backend: Flask's
+# threaded server (a thread per request, blocked while the models answer) and the async app in
+# app/asgi.py under uvicorn (one event loop, model calls awaited). Each server runs in its own
+# process with the local fakes standing in for Gemini and the embedding API, over a scratch copy of
+# the state with a few synthetic patents ingested. For every concurrency level it reports throughput,
+# latency percentiles, errors, the server's CPU time per request, and its peak thread count and memory.
+# The load generator needs httpx (`pip install httpx`).
+#
+#   python -m benchmarks.bench_serving --concurrency 16 64 256 --llm-latency 0.5
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.run_suite import BACKEND_DIR, QUESTIONS, stage_environment
+
+SERVERS = ("flask", "asgi")
+ENDPOINTS = ("query", "analyze")
+
+
+def serve(server: str, port: int, llm_latency: float, embedding_latency: float):
+    """Server process: fakes installed, then Flask's threaded server or uvicorn on 127.0.0.1:`port`."""
+    from benchmarks.fakes import install_fakes
+
+    install_fakes(llm_latency=llm_latency, embedding_latency=embedding_latency)
+    if server == "flask":
+        from werkzeug.serving import run_simple
+        from app import app
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        run_simple("127.0.0.1", port, app, threaded=True)
+    else:
+        import uvicorn
+        from app.asgi import app
+
+        uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def ingest(directory: str, pdfs: int, pages: int):
+    """Write synthetic patents to `directory` and ingest them into the scratch state (APP_DATA_DIR is set)."""
+    from benchmarks.corpus import generate_pdf_corpus
+    from benchmarks.fakes import install_fakes
+    from app.services.process import process_pdf_to_chroma
+
+    install_fakes(llm_latency=0.0, embedding_latency=0.0)
+    paths = generate_pdf_corpus(directory, pdfs, pages)
+    for path in paths:
+        process_pdf_to_chroma(path)
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid: int):
+    """(threads, RSS in MB) of a process, from /proc; (None, None) where that isn't available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+        return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def process_cpu_seconds(pid: int):
+    """User + system CPU time of a process, from /proc; None where that isn't available."""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def request_for(endpoint: str, documents, index: int):
+    if endpoint == "analyze":
+        return "GET", f"/analyze/{documents[index % len(documents)]}", None
+    # Alternate between document-scoped and global questions, as run_suite does
+    payload = {"question": QUESTIONS[index % len(QUESTIONS)]}
+    if index % 2 == 0:
+        payload["document_id"] = documents[index // 2 % len(documents)]
+    return "POST", "/query", payload
+
+
+async def load(base_url: str, pid: int, endpoint: str, documents, concurrency: int, requests: int):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        latencies, errors, next_index = [], 0, 0
+        peak_threads, peak_rss = 0, 0.0
+
+        async def worker():
+            nonlocal errors, next_index
+            while next_index < requests:
+                index, next_index = next_index, next_index + 1
+                method, path, payload = request_for(endpoint, documents, index)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=payload)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += 0 if ok else 1
+
+        async def sample():
+            nonlocal peak_threads, peak_rss
+            while True:
+                threads, rss = process_usage(pid)
+                if threads is not None:
+                    peak_threads, peak_rss = max(peak_threads, threads), max(peak_rss, rss)
+                await asyncio.sleep(0.1)
+
+        sampler = asyncio.create_task(sample())
+        cpu_before = process_cpu_seconds(pid)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        cpu_after = process_cpu_seconds(pid)
+        sampler.cancel()
+
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "errors": errors,
+        "cpu_ms": (cpu_after - cpu_before) * 1000 / requests if cpu_before is not None else None,
+        "threads": peak_threads or None,
+        "rss_mb": peak_rss or None,
+    }
+
+
+def start_server(server: str, env, args, log_path: str):
+    port = free_port()
+    command = [sys.executable, "-m", "benchmarks.bench_serving", "--serve", server, "--port", str(port),
+               "--llm-latency", str(args.llm_latency), "--embedding-latency", str(args.embedding_latency)]
+    # The app's progress prints go to a log file rather than competing for the terminal
+    log = open(log_path, "a")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} server exited; see {log_path}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} server didn't start within 60s; see {log_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Flask's threaded server against the async app")
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--requests", type=int, default=512, help="requests per concurrency level")
+    parser.add_argument("--pdfs", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=4, help="pages per PDF")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake model call")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="seconds per fake embedding call")
+    parser.add_argument("--serve", choices=SERVERS, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.llm_latency, args.embedding_latency)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config = {"vector_backend": os.environ.get("VECTOR_BACKEND", "local")}
+        env = stage_environment(config, workdir)
+        env["ANALYSIS_REQUESTS_PER_MINUTE"] = "0"  # measure the servers, not the quota
+        os.environ.update(env)
+        documents = ingest(os.path.join(workdir, "pdfs"), args.pdfs, args.pages)
+        log_path = os.path.join(workdir, "server.log")
+
+        print(f"{len(documents)} documents; fake model calls {args.llm_latency * 1000:.0f} ms, "
+              f"embeddings {args.embedding_latency * 1000:.0f} ms; {args.requests} requests per level")
+        print(f"{'server':<8}{'endpoint':<10}{'conc':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+              f"{'errors':>8}{'CPU ms':>8}{'threads':>9}{'RSS MB':>8}")
+        for server in args.servers:
+            process, base_url = start_server(server, env, args, log_path)
+            try:
+                for endpoint in args.endpoints:
+                    # Warm-up: clients created and every document's chunks read once
+                    asyncio.run(load(base_url, process.pid, endpoint, documents, 4, len(documents)))
+                    for concurrency in args.concurrency:
+                        result = asyncio.run(load(base_url, process.pid, endpoint, documents, concurrency,
+                                                  max(args.requests, concurrency)))
+                        cpu = f"{result['cpu_ms']:.1f}" if result["cpu_ms"] is not None else "-"
+                        threads = result["threads"] if result["threads"] is not None else "-"
+                        rss = f"{result['rss_mb']:.0f}" if result["rss_mb"] is not None else "-"
+                        print(f"{server:<8}{endpoint:<10}{concurrency:>6}{result['throughput']:>9.1f}"
+                              f"{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}{result['errors']:>8}"
+                              f"{cpu:>8}{threads:>9}{rss:>8}")
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_single_flight.py
+# Many users opening the same document at once: `users` threads call analyze_patent (or ask the
+# same question through query_vector_db) at the same moment, with single-flight coalescing on and
+# off (app/services/single_flight.py). Runs against the local fakes on scratch state with the
+# result caches disabled, and reports model calls, embedding calls and latency percentiles.
+#
+#   python -m benchmarks.bench_single_flight --users 1 8 32 --llm-latency 0.3
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+def burst(users: int, call):
+    """Start `users` threads on call() together; their latencies in seconds."""
+    latencies = [0.0] * users
+    start = threading.Barrier(users)
+
+    def user(index: int):
+        start.wait()
+        started = time.perf_counter()
+        call()
+        latencies[index] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-flight coalescing of identical requests")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per fake model call")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="seconds per fake embedding call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Set before the app modules are imported, so all state lives in the scratch directory
+        os.environ.update(APP_DATA_DIR=tmp, GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY") or "benchmark-fake-key",
+                          ANALYSIS_CACHE="0", QUERY_CACHE="0", EMBEDDING_CACHE="0", NEIGHBOR_GRAPH="0")
+        from benchmarks.corpus import generate_pdf_corpus
+        from benchmarks.fakes import FakeEmbeddings, install_fakes
+        from app.services.analysis_service import analyze_patent
+        from app.services.get_embedding_function import MeteredEmbeddings
+        from app.services.process import process_pdf_to_chroma
+        from app.services.resources import registry
+        from app.services.single_flight import get_single_flight
+        from app.services.vector_db.db_handler import query_vector_db
+
+        fakes = install_fakes(llm_latency=args.llm_latency)
+        # Through the production wrapper, which is where embedding calls are coalesced
+        embeddings = FakeEmbeddings(latency=args.embedding_latency)
+        registry.override("embeddings", MeteredEmbeddings(embeddings))
+        path = generate_pdf_corpus(os.path.join(tmp, "pdfs"), 1, args.pages)[0]
+        process_pdf_to_chroma(path)
+        document_id = os.path.basename(path)
+
+        workloads = {
+            "analyze": (lambda: analyze_patent(document_id), fakes["analysis_model"]),
+            "query": (lambda: query_vector_db("Which sensor configuration is claimed?", document_id), fakes["query_llm"]),
+        }
+        print(f"{'workload':<10}{'coalesce':<10}{'users':>6}{'model calls':>13}{'embed calls':>13}"
+              f"{'p50 ms':>9}{'p95 ms':>9}")
+        single_flight = get_single_flight()
+        for name, (call, model) in workloads.items():
+            for enabled in (False, True):
+                single_flight.enabled = enabled
+                for users in args.users:
+                    model_calls, embedding_calls = model.calls, embeddings.calls
+                    latencies = np.array(burst(users, call)) * 1000
+                    print(f"{name:<10}{'on' if enabled else 'off':<10}{users:>6}{model.calls - model_calls:>13}"
+                          f"{embeddings.calls - embedding_calls:>13}{np.percentile(latencies, 50):>9.0f}"
+                          f"{np.percentile(latencies, 95):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
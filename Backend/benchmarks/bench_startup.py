@@ -0,0 +1,163 @@
+# benchmarks/bench_startup.py
+# Cold-start cost of a web worker: how long each module takes to import in a fresh interpreter,
+# and how long the first requests take with lazy initialization ("lazy") against a worker that ran
+# preload_modules() and warm_up() at startup ("warm", what WARM_UP_ON_START and gunicorn.conf.py do).
+# On first use the real clients are still constructed (imports and constructors, no network), then
+# the calls are served by the fakes, so the measured first request includes their startup cost.
+#
+#   python -m benchmarks.bench_startup --runs 5 --output startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_suite import BACKEND_DIR, stage_environment
+
+# Every app.* module first imports the app package itself, so "app" covers the web process
+MODULES = (
+    "flask",
+    "app",
+    "chromadb",
+    "langchain.schema",
+    "langchain_google_genai",
+    "google.generativeai",
+    "app.services.load_documents",
+    "app.services.get_embedding_function",
+)
+ENDPOINTS = ("/health", "/query", "/analyze")
+DOCUMENT_ID = "startup.pdf"
+
+
+def _child_import(module: str) -> dict:
+    started = time.perf_counter()
+    __import__(module)
+    return {"seconds": time.perf_counter() - started}
+
+
+def _child_setup(workdir: str) -> dict:
+    """Ingest one document into the scratch state, so /query and /analyze have something to find."""
+    import random
+    from benchmarks.corpus import write_pdf, patent_page_text
+    from benchmarks.fakes import install_fakes
+
+    install_fakes(llm_latency=0, embedding_latency=0)
+    from app.services.process import process_pdf_to_chroma
+
+    path = os.path.join(workdir, DOCUMENT_ID)
+    write_pdf(path, [patent_page_text(random.Random(0)) for _ in range(4)])
+    process_pdf_to_chroma(path)
+    return {}
+
+
+def _serve_fakes_after_real_init():
+    """First use of each client builds the real one, for its import and constructor cost, then returns a fake."""
+    from app.services.resources import registry
+    from benchmarks.fakes import FakeEmbeddings, FakeGenerativeModel, FakeLLM
+
+    fakes = {"embeddings": FakeEmbeddings(latency=0), "query_llm": FakeLLM(latency=0, tokens=5),
+             "analysis_model": FakeGenerativeModel(latency=0)}
+    for name, fake in fakes.items():
+        real_factory = registry.factory(name)
+        registry.register(name, lambda real_factory=real_factory, fake=fake: (real_factory(), fake)[1])
+
+
+def _child_request(endpoint: str, mode: str) -> dict:
+    started = time.perf_counter()
+    from app import app
+    imported = time.perf_counter()
+    _serve_fakes_after_real_init()
+    if mode == "warm":
+        from app.services.resources import preload_modules, warm_up
+
+        preload_modules()
+        warm_up()
+    ready = time.perf_counter()
+
+    client = app.test_client()
+
+    def send():
+        if endpoint == "/query":
+            return client.post("/query", json={"question": "What does the apparatus comprise?"})
+        if endpoint == "/analyze":
+            return client.get(f"/analyze/{DOCUMENT_ID}")
+        return client.get(endpoint)
+
+    timings = []
+    for _ in range(2):
+        request_started = time.perf_counter()
+        response = send()
+        timings.append(time.perf_counter() - request_started)
+    return {"import_seconds": imported - started, "startup_seconds": ready - imported,
+            "first_request_seconds": timings[0], "second_request_seconds": timings[1],
+            "status": response.status_code}
+
+
+def _run_child(env: dict, *args) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as result:
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", *args, "--result", result.name],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} failed:\n{process.stderr}")
+        with open(result.name) as f:
+            return json.load(f)
+
+
+def _median(results, key):
+    return round(statistics.median(result[key] for result in results) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module import and first-request latency")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement (median is reported)")
+    parser.add_argument("--vector-backend", default="chroma", choices=["chroma", "local"])
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, *rest = args.child
+        if kind == "import":
+            result = _child_import(*rest)
+        elif kind == "setup":
+            result = _child_setup(*rest)
+        else:
+            result = _child_request(*rest)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+
+    report = {"modules": {}, "requests": {}}
+    with tempfile.TemporaryDirectory(prefix="patent-startup-") as workdir:
+        env = stage_environment({"vector_backend": args.vector_backend}, workdir)
+
+        print(f"{'module':<40}{'import (ms)':>12}")
+        for module in MODULES:
+            results = [_run_child(env, "import", module) for _ in range(args.runs)]
+            report["modules"][module] = _median(results, "seconds")
+            print(f"{module:<40}{report['modules'][module]:>12.1f}")
+
+        _run_child(env, "setup", workdir)
+        print(f"\n{'endpoint':<12}{'mode':<6}{'import':>10}{'startup':>10}{'1st req':>10}{'2nd req':>10}  (ms)")
+        for endpoint in ENDPOINTS:
+            for mode in ("lazy", "warm"):
+                results = [_run_child(env, "request", endpoint, mode) for _ in range(args.runs)]
+                row = {key: _median(results, f"{key}_seconds") for key in ("import", "startup", "first_request",
+                                                                              "second_request")}
+                report["requests"][f"{endpoint} {mode}"] = row
+                print(f"{endpoint:<12}{mode:<6}{row['import']:>10.1f}{row['startup']:>10.1f}"
+                      f"{row['first_request']:>10.1f}{row['second_request']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
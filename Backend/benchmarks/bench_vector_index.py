@@ -0,0 +1,113 @@
+# benchmarks/bench_vector_index.py
+# Recall@k and query latency of the local index (exact scan, IVF, filtered) against an
+# in-memory ChromaDB collection, on synthetic clustered embeddings. Ground truth is a brute-force
+# NumPy search over the same vectors.
+#
+#   python -m benchmarks.bench_vector_index --rows 100000 --dim 768 --queries 200
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_db.local_index import LocalVectorIndex
+from app.services.vector_db.vector_index import ChromaVectorIndex
+
+CHROMA_MAX_BATCH = 5000
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random cluster centres, roughly how embeddings of a corpus bunch up."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(clusters, size=rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ground_truth(vectors: np.ndarray, queries: np.ndarray, k: int, allowed=None) -> np.ndarray:
+    distances = (vectors * vectors).sum(axis=1)[None, :] - 2 * (queries @ vectors.T)
+    if allowed is not None:
+        distances[:, ~allowed] = np.inf
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def measure(label: str, search, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies, found = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        ids = search(query)
+        latencies.append(time.perf_counter() - started)
+        found += len({int(chunk_id) for chunk_id in ids} & {int(row) for row in expected})
+    latencies = np.array(latencies) * 1000
+    print(f"{label:<28}{found / truth.size:>10.3f}{np.percentile(latencies, 50):>10.2f}"
+          f"{np.percentile(latencies, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local vector index against ChromaDB")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default 4·√n)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--documents", type=int, default=100, help="distinct filename_base values")
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.rows, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(args.rows, size=args.queries)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+    ids = [str(row) for row in range(args.rows)]
+    document_of_row = np.arange(args.rows) % args.documents
+    metadatas = [{"filename_base": f"doc{document}.pdf"} for document in document_of_row]
+    documents = [""] * args.rows
+    truth = ground_truth(vectors, queries, args.k)
+    filtered_truth = ground_truth(vectors, queries, args.k, allowed=document_of_row == 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        index = LocalVectorIndex(tmp)
+        for start in range(0, args.rows, 10000):
+            index.upsert(ids[start:start + 10000], vectors[start:start + 10000], documents[start:start + 10000],
+                         metadatas[start:start + 10000])
+        print(f"local index: loaded {args.rows} x {args.dim} in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        reopened = LocalVectorIndex(tmp)
+        reopened.query(queries[0], k=args.k, exact=True)
+        print(f"local index: cold start (open + first query) {time.perf_counter() - started:.3f}s")
+
+        print(f"\n{'search':<28}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p99 ms':>10}")
+        measure("local exact", lambda q: [hit.id for hit in index.query(q, k=args.k, exact=True)], queries, truth, args.k)
+        measure("local exact, filtered", lambda q: [hit.id for hit in index.query(
+            q, k=args.k, where={"filename_base": "doc0.pdf"})], queries, filtered_truth, args.k)
+
+        started = time.perf_counter()
+        lists = index.build_ivf(args.lists)
+        print(f"{'(IVF build: ' + str(lists) + ' lists)':<28}{'':>10}{(time.perf_counter() - started) * 1000:>10.0f}")
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            measure(f"local IVF nprobe={nprobe}", lambda q: [hit.id for hit in index.query(q, k=args.k)],
+                    queries, truth, args.k)
+
+        if not args.skip_chroma:
+            import chromadb
+
+            collection = chromadb.Client().create_collection(f"bench_{int(time.time())}")
+            chroma = ChromaVectorIndex(collection)
+            started = time.perf_counter()
+            for start in range(0, args.rows, CHROMA_MAX_BATCH):
+                chroma.upsert(ids[start:start + CHROMA_MAX_BATCH], vectors[start:start + CHROMA_MAX_BATCH].tolist(),
+                              documents[start:start + CHROMA_MAX_BATCH], metadatas[start:start + CHROMA_MAX_BATCH])
+            print(f"{'(Chroma load)':<28}{'':>10}{(time.perf_counter() - started) * 1000:>10.0f}")
+            measure("chroma HNSW", lambda q: [hit.id for hit in chroma.query(q.tolist(), k=args.k)],
+                    queries, truth, args.k)
+            measure("chroma HNSW, filtered", lambda q: [hit.id for hit in chroma.query(
+                q.tolist(), k=args.k, where={"filename_base": "doc0.pdf"})], queries, filtered_truth, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/corpus.py
+# Synthetic patent-like PDFs (written without any PDF library), page texts with the structure of a
+# real filing, and patent CSV dumps in the layout vector_store.py ingests. All are reproducible from
+# their seed.
+import os
+import random
+import textwrap
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+WORDS = ("apparatus method system signal processor battery cooling phase-change material electrode "
+         "substrate layer circuit controller sensor wireless antenna polymer catalyst compound "
+         "configured coupled wherein plurality comprising housing module surface channel fluid").split()
+
+
+def patent_page_text(rng: random.Random, words: int = 350) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _pseudo_terms(rng: random.Random, count: int) -> List[str]:
+    """Made-up technical terms and reference numerals, the rarer vocabulary that makes passages findable."""
+    syllables = "ka lo mi ne tra sil vor dex pol qui zan fer gly cor tet hex".split()
+    terms = {"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(count)}
+    return sorted(terms) + [f"element-{number}" for number in range(100, 100 + count // 10)]
+
+
+def _sentence(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    # Log-uniform ranks, roughly Zipf: the claim words up front are common, later terms rare
+    picked = [vocabulary[int(len(vocabulary) ** rng.random()) - 1] for _ in range(words)]
+    return " ".join(picked).capitalize() + "."
+
+
+def structured_patent_pages(rng: random.Random, paragraphs: int = 40, claims: int = 20, page_chars: int = 3000,
+                            line_chars: int = 90) -> List[str]:
+    """
+    Page texts laid out like text extracted from a patent PDF: section headings, numbered
+    paragraphs and claims, lines wrapped at `line_chars`, and page breaks that fall mid-paragraph.
+    """
+    terms = _pseudo_terms(rng, 2000)
+    rng.shuffle(terms)
+    vocabulary = WORDS + terms
+
+    def paragraph(sentences: int) -> str:
+        return " ".join(_sentence(rng, vocabulary, rng.randint(10, 28)) for _ in range(sentences))
+
+    blocks = ["Apparatus and method for " + _sentence(rng, vocabulary, 5).lower().rstrip("."), "ABSTRACT",
+              paragraph(4)]
+    sections = ("FIELD OF THE INVENTION", "BACKGROUND", "SUMMARY", "BRIEF DESCRIPTION OF THE DRAWINGS",
+                "DETAILED DESCRIPTION")
+    shares = (0.05, 0.15, 0.15, 0.05, 0.6)
+    number = 1
+    for heading, share in zip(sections, shares):
+        blocks.append(heading)
+        for _ in range(max(1, round(paragraphs * share))):
+            blocks.append(f"[{number:04d}] " + paragraph(rng.randint(1, 7)))
+            number += 1
+    blocks += ["CLAIMS", "What is claimed is:"]
+    for claim in range(1, claims + 1):
+        lead = "A method comprising" if claim == 1 else f"The method of claim {rng.randint(1, claim - 1)}, wherein"
+        text = paragraph(rng.randint(1, 3))
+        blocks.append(f"{claim}. {lead} {text[0].lower()}{text[1:]}")
+
+    lines = []
+    for block in blocks:
+        lines.extend(textwrap.wrap(block, line_chars) or [""])
+    pages, current = [], []
+    for line in lines:
+        if current and sum(len(text) + 1 for text in current) + len(line) > page_chars:
+            pages.append("\n".join(current))
+            current = []
+        current.append(line)
+    pages.append("\n".join(current))
+    return pages
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], line_chars: int = 90):
+    """Write a minimal PDF with one Helvetica text page per entry in `pages`."""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    page_ids = []
+    for text in pages:
+        lines = [text[i:i + line_chars] for i in range(0, len(text), line_chars)] or [""]
+        stream = "BT /F1 9 Tf 36 806 Td 11 TL " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream.encode("latin-1")))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R"
+            b" /Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+
+def generate_pdf_corpus(directory: str, files: int, pages_per_file: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f"patent_{index:04d}.pdf")
+        write_pdf(path, [patent_page_text(rng) for _ in range(pages_per_file)])
+        paths.append(path)
+    return paths
+
+
+def generate_csv_corpus(directory: str, rows: int, files: int, seed: int = 0) -> List[str]:
+    """`rows` patent records split over `files` CSVs with the columns of the real dump."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    per_file = rows // files
+    paths = []
+    for index in range(files):
+        n = per_file
+        path = os.path.join(directory, f"patents_{index:03d}.csv")
+        pd.DataFrame({
+            "Application Number": np.arange(n) + index * per_file,
+            "Title": [f"Apparatus for processing signal {i}" for i in rng.integers(0, 10 ** 6, n)],
+            "Field Of Invention": rng.choice(["Electronics", "Chemistry", "Mechanical", "Biotech", None], n),
+            "Application Date": rng.choice(["2019-01-02", "2020-05-06", "2021-11-12"], n),
+            "Applicant Name": rng.choice(["Acme Corp", "Globex", "Initech", None], n),
+            "Abstract": ["Lorem ipsum dolor sit amet " * 8] * n,
+        }).to_csv(path, index=False)
+        paths.append(path)
+    return paths
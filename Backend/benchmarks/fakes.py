@@ -0,0 +1,220 @@
+# benchmarks/fakes.py
+# Local stand-ins for the Gemini models, the embedding client and the Chroma collection,
+# so the services can be timed without network access or an API key.
+#
+# Every fake draws its jitter and failures from its own seeded generator, so a run with the same
+# settings makes the same calls fail. Latency is `latency` per call plus, when `tokens_per_second`
+# is set, the time to produce (or, for embeddings, read) the call's tokens at that rate.
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4
+
+
+class FakeServiceError(RuntimeError):
+    """Raised by a fake for the share of calls given by its `failure_rate`."""
+
+
+def _sleep(latency: float, jitter: float, rng: Optional[random.Random] = None):
+    if latency > 0:
+        time.sleep(max(0.0, (rng or random).gauss(latency, latency * jitter)))
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class _FakeService:
+    def __init__(self, latency: float, jitter: float, failure_rate: float, tokens_per_second: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self, tokens: int):
+        """Count a call and draw its delay and whether it fails."""
+        with self._lock:
+            self.calls += 1
+            delay = self._rng.gauss(self.latency, self.latency * self.jitter) if self.latency > 0 else 0.0
+            fail = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        if self.tokens_per_second > 0:
+            delay += tokens / self.tokens_per_second
+        return delay, fail
+
+    def _call(self, tokens: int = 0):
+        """Count a call, sleep for its latency, and fail it with probability `failure_rate`."""
+        delay, fail = self._plan(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise FakeServiceError(f"{type(self).__name__}: simulated failure")
+
+    async def _acall(self, tokens: int = 0):
+        """_call for the async client methods: the latency is awaited, not slept."""
+        delay, fail = self._plan(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeServiceError(f"{type(self).__name__}: simulated failure")
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt: str = ""):
+        self.text = text
+        self.usage_metadata = FakeUsage(_count_tokens(prompt), _count_tokens(text))
+
+
+class FakeGenerativeModel(_FakeService):
+    """Mimics google.generativeai.GenerativeModel.generate_content and generate_content_async."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, failure_rate: float = 0.0,
+                 tokens_per_second: float = 0.0, seed: int = 0):
+        super().__init__(latency, jitter, failure_rate, tokens_per_second, seed)
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        if "JSON" in prompt:
+            return json.dumps({
+                "summary": "A fake summary of the patent proposal.",
+                "noveltyScore": 72,
+                "potentialIssues": ["Prior art overlap", "Claims too broad", "Unclear embodiment"],
+                "recommendations": ["Narrow claim 1", "Add experimental data", "Define terms"],
+            })
+        if "Rate the novelty" in prompt:
+            return "72"
+        if "Summarize" in prompt:
+            return "A fake summary of the patent proposal."
+        return "- First point\n- Second point\n- Third point"
+
+    def generate_content(self, prompt: str, **kwargs) -> FakeResponse:
+        text = self._answer(prompt)
+        self._call(_count_tokens(text))
+        return FakeResponse(text, prompt)
+
+    async def generate_content_async(self, prompt: str, **kwargs) -> FakeResponse:
+        text = self._answer(prompt)
+        await self._acall(_count_tokens(text))
+        return FakeResponse(text, prompt)
+
+
+class FakeEmbeddings(_FakeService):
+    """Deterministic embeddings derived from the text hash; the token rate applies to the input."""
+
+    def __init__(self, dim: int = 768, latency: float = 0.1, jitter: float = 0.1, failure_rate: float = 0.0,
+                 tokens_per_second: float = 0.0, seed: int = 0):
+        super().__init__(latency, jitter, failure_rate, tokens_per_second, seed)
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._call(sum(_count_tokens(text) for text in texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await self._acall(sum(_count_tokens(text) for text in texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeCollection:
+    """Answers collection.query with canned neighbours after a fixed latency."""
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.1):
+        self.latency = latency
+        self.jitter = jitter
+
+    def query(self, query_embeddings=None, n_results: int = 5, where: Optional[dict] = None, **kwargs):
+        _sleep(self.latency, self.jitter)
+        ids = [f"fake-{i}" for i in range(n_results)]
+        return {
+            "ids": [ids],
+            "documents": [[f"Prior art document {i}" for i in range(n_results)]],
+            "metadatas": [[{"id": doc_id, "title": f"Prior art {doc_id}"} for doc_id in ids]],
+            "distances": [[0.1 * (i + 1) for i in range(n_results)]],
+        }
+
+
+def fake_vector_index(latency: float = 0.02):
+    """A VectorIndex over FakeCollection, for patching the search paths."""
+    from app.services.vector_db.vector_index import ChromaVectorIndex
+
+    return ChromaVectorIndex(FakeCollection(latency))
+
+
+class FakeLLM(_FakeService):
+    """
+    Mimics langchain_google_genai.GoogleGenerativeAI: invoke() (and ainvoke()) returns after `latency`,
+    stream() yields `tokens` words, the first after `latency` and the rest every `token_delay`
+    (or 1 / `tokens_per_second` when that is set). A failing stream fails before its first token.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, tokens: int = 20, token_delay: float = 0.02,
+                 failure_rate: float = 0.0, tokens_per_second: float = 0.0, seed: int = 0):
+        super().__init__(latency, jitter, failure_rate, tokens_per_second, seed)
+        self.tokens = tokens
+        self.token_delay = 1.0 / tokens_per_second if tokens_per_second > 0 else token_delay
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        self._call(self.tokens)
+        return "A fake answer based on the retrieved context."
+
+    def stream(self, prompt: str, **kwargs):
+        self._call()
+        for index in range(self.tokens):
+            if index:
+                time.sleep(self.token_delay)
+            yield f"token{index} "
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        await self._acall(self.tokens)
+        return "A fake answer based on the retrieved context."
+
+
+def install_fakes(llm_latency: float = 0.5, embedding_latency: float = 0.1, llm_failure_rate: float = 0.0,
+                  embedding_failure_rate: float = 0.0, llm_tokens_per_second: float = 0.0,
+                  embedding_tokens_per_second: float = 0.0, seed: int = 0):
+    """
+    Route every model and embedding call in this process to fakes by replacing the shared
+    resources. Returns the fakes by name.
+    """
+    from app.services.resources import registry
+
+    fakes = {
+        "embeddings": FakeEmbeddings(latency=embedding_latency, failure_rate=embedding_failure_rate,
+                                     tokens_per_second=embedding_tokens_per_second, seed=seed),
+        "query_llm": FakeLLM(latency=llm_latency, failure_rate=llm_failure_rate,
+                             tokens_per_second=llm_tokens_per_second, seed=seed + 1),
+        "analysis_model": FakeGenerativeModel(latency=llm_latency, failure_rate=llm_failure_rate,
+                                              tokens_per_second=llm_tokens_per_second, seed=seed + 2),
+    }
+    for name, fake in fakes.items():
+        registry.override(name, fake)
+    return fakes
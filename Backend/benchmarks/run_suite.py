@@ -0,0 +1,346 @@
+# benchmarks/run_suite.py
+# End-to-end offline benchmark of the backend against the local fakes: PDF and CSV ingest
+# throughput, /query and /analyze latency percentiles, cold start, and the memory high-water mark
+# of every stage. Each stage runs in a fresh process on a scratch copy of the app's state, so
+# results don't depend on what is already stored and are comparable across commits.
+#
+#   python -m benchmarks.run_suite --output results/$(git rev-parse --short HEAD).json
+#   python -m benchmarks.run_suite --compare results/base.json results/new.json
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+SUITE_VERSION = 1
+STAGES = ("ingest", "csv_ingest", "cold_start", "query", "analyze")
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+QUESTIONS = [
+    "What does the cooling apparatus comprise?",
+    "How is the phase-change material coupled to the housing?",
+    "Which sensor configuration is claimed?",
+    "What is the role of the catalyst in the electrode layer?",
+    "Describe the wireless antenna module.",
+]
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    if not seconds:
+        return {"count": 0}
+    values = np.array(seconds) * 1000
+    return {
+        "count": len(seconds),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def max_rss_mb() -> float:
+    """This process's peak resident set size (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_info() -> Dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+# --- Stages (each runs in its own process) ------------------------------------------------------
+
+def _install_fakes(config: Dict):
+    from benchmarks.fakes import install_fakes
+
+    return install_fakes(
+        llm_latency=config["llm_latency"], embedding_latency=config["embedding_latency"],
+        llm_failure_rate=config["llm_failure_rate"], embedding_failure_rate=config["embedding_failure_rate"],
+        llm_tokens_per_second=config["llm_tokens_per_second"],
+        embedding_tokens_per_second=config["embedding_tokens_per_second"], seed=config["seed"],
+    )
+
+
+def stage_ingest(config: Dict, workdir: str) -> Dict:
+    _install_fakes(config)
+    from app.services.process import process_pdf_to_chroma
+    from app.services.resources import get_vector_index
+
+    pdfs = sorted(os.path.join(workdir, "pdfs", name) for name in os.listdir(os.path.join(workdir, "pdfs")))
+    per_document = []
+    started = time.perf_counter()
+    for path in pdfs:
+        document_started = time.perf_counter()
+        process_pdf_to_chroma(path)
+        per_document.append(time.perf_counter() - document_started)
+    elapsed = time.perf_counter() - started
+    pages = len(pdfs) * config["pages_per_pdf"]
+    chunks = get_vector_index().count()
+    return {
+        "documents": len(pdfs),
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 2),
+        "document_latency": latency_summary(per_document),
+    }
+
+
+def stage_csv_ingest(config: Dict, workdir: str) -> Dict:
+    _install_fakes(config)
+    from app.services.vector_store import ingest
+
+    started = time.perf_counter()
+    rows = ingest(os.path.join(workdir, "csv"), batch_size=config["csv_batch_size"], concurrency=4,
+                  requests_per_minute=0, checkpoint_path=os.path.join(workdir, "csv_checkpoint.json"))
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 3), "rows_per_second": round(rows / elapsed, 2)}
+
+
+def stage_cold_start(config: Dict, workdir: str) -> Dict:
+    started = time.perf_counter()
+    from app import app  # noqa: F401  (everything the web process imports at startup)
+    imported = time.perf_counter()
+    _install_fakes(config)
+    client = app.test_client()
+    response = client.post("/query", json={"question": QUESTIONS[0]})
+    first_query = time.perf_counter()
+    return {
+        "import_seconds": round(imported - started, 3),
+        "first_query_seconds": round(first_query - imported, 3),
+        "first_query_status": response.status_code,
+    }
+
+
+def _timed_requests(send, count: int, warmup: int):
+    for index in range(warmup):
+        send(index)
+    timings, errors = [], 0
+    for index in range(count):
+        started = time.perf_counter()
+        ok = send(index)
+        timings.append(time.perf_counter() - started)
+        errors += 0 if ok else 1
+    return timings, errors
+
+
+def stage_query(config: Dict, workdir: str) -> Dict:
+    _install_fakes(config)
+    from app import app
+    client = app.test_client()
+    documents = sorted(os.listdir(os.path.join(workdir, "pdfs")))
+
+    def send(index: int) -> bool:
+        # Alternate between document-scoped and global questions
+        payload = {"question": QUESTIONS[index % len(QUESTIONS)]}
+        if index % 2 == 0:
+            payload["document_id"] = documents[index // 2 % len(documents)]
+        return client.post("/query", json=payload).status_code == 200
+
+    timings, errors = _timed_requests(send, config["queries"], config["warmup"])
+    return {"latency": latency_summary(timings), "errors": errors}
+
+
+def stage_analyze(config: Dict, workdir: str) -> Dict:
+    _install_fakes(config)
+    from app import app
+    from app.services.analysis_service import is_complete
+    client = app.test_client()
+    documents = sorted(os.listdir(os.path.join(workdir, "pdfs")))
+    degraded = 0
+
+    def send(index: int) -> bool:
+        nonlocal degraded
+        response = client.get(f"/analyze/{documents[index % len(documents)]}")
+        if response.status_code != 200:
+            return False
+        degraded += 0 if is_complete(response.get_json()) else 1
+        return True
+
+    timings, errors = _timed_requests(send, config["analyses"], config["warmup"])
+    return {"latency": latency_summary(timings), "errors": errors, "degraded": degraded}
+
+
+STAGE_FUNCTIONS = {
+    "ingest": stage_ingest,
+    "csv_ingest": stage_csv_ingest,
+    "cold_start": stage_cold_start,
+    "query": stage_query,
+    "analyze": stage_analyze,
+}
+
+
+def stage_environment(config: Dict, workdir: str) -> Dict:
+    """Environment of a stage process: all state under the scratch directory, no result caches."""
+    env = dict(os.environ)
+    env.update({
+        "APP_DATA_DIR": os.path.join(workdir, "data"),
+        "GOOGLE_API_KEY": env.get("GOOGLE_API_KEY") or "benchmark-fake-key",
+        "VECTOR_BACKEND": config["vector_backend"],
+        "EMBEDDING_CACHE": "0",
+        "ANALYSIS_CACHE": "0",
+        "QUERY_CACHE": "0",
+        "ANONYMIZED_TELEMETRY": "False",
+        "PYTHONPATH": BACKEND_DIR,
+    })
+    # Explicit per-file locations would escape the scratch directory
+    for name in ("MANIFEST_PATH", "LEXICAL_INDEX_PATH", "LOCAL_INDEX_DIR", "JOBS_DB_PATH", "BATCH_DB_PATH",
+                 "ANALYSIS_CACHE_PATH", "EMBEDDING_CACHE_PATH", "QUERY_CACHE_DB_PATH"):
+        env.pop(name, None)
+    return env
+
+
+def run_stage(name: str, config: Dict, workdir: str, verbose: bool) -> Dict:
+    result_path = os.path.join(workdir, f"{name}.json")
+    config_path = os.path.join(workdir, "config.json")
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run_suite", "--stage", name, "--workdir", workdir,
+         "--config", config_path, "--result", result_path],
+        cwd=BACKEND_DIR, env=stage_environment(config, workdir),
+        stdout=None if verbose else subprocess.DEVNULL, stderr=None if verbose else subprocess.PIPE, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"stage {name} failed:\n{process.stderr or ''}")
+    with open(result_path) as f:
+        result = json.load(f)
+    result["process_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_suite(config: Dict, stages=STAGES, verbose: bool = False) -> Dict:
+    from benchmarks.corpus import generate_pdf_corpus, generate_csv_corpus
+
+    with tempfile.TemporaryDirectory(prefix="patent-bench-") as workdir:
+        generate_pdf_corpus(os.path.join(workdir, "pdfs"), config["pdfs"], config["pages_per_pdf"], config["seed"])
+        generate_csv_corpus(os.path.join(workdir, "csv"), config["csv_rows"], config["csv_files"], config["seed"])
+        with open(os.path.join(workdir, "config.json"), "w") as f:
+            json.dump(config, f)
+        results = {}
+        for name in stages:
+            print(f"⏱️  {name}...", flush=True)
+            results[name] = run_stage(name, config, workdir, verbose)
+    return {
+        "suite_version": SUITE_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_info(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "stages": results,
+    }
+
+
+# --- Comparison ---------------------------------------------------------------------------------
+
+def _flatten(values: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(base: Dict, new: Dict):
+    """Print every numeric result of two runs side by side with the relative change."""
+    if base.get("config") != new.get("config"):
+        print("⚠️ The runs used different configurations; changes may not be meaningful.")
+    print(f"{'metric':<40}{'base':>12}{'new':>12}{'change':>10}")
+    for stage in STAGES:
+        old_values = _flatten(base["stages"].get(stage, {}))
+        new_values = _flatten(new["stages"].get(stage, {}))
+        for key in sorted(set(old_values) | set(new_values)):
+            old, current = old_values.get(key), new_values.get(key)
+            change = f"{(current - old) / old * 100:+.1f}%" if old and current is not None else ""
+            print(f"{stage + '.' + key:<40}{'' if old is None else old:>12}{'' if current is None else current:>12}"
+                  f"{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline backend benchmark suite")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of stages")
+    parser.add_argument("--pdfs", type=int, default=8)
+    parser.add_argument("--pages-per-pdf", type=int, default=20)
+    parser.add_argument("--csv-rows", type=int, default=20000)
+    parser.add_argument("--csv-files", type=int, default=4)
+    parser.add_argument("--csv-batch-size", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--analyses", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests before each latency stage")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per fake embedding call")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="fake LLM output rate (0: instant)")
+    parser.add_argument("--embedding-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="share of fake LLM calls that fail")
+    parser.add_argument("--embedding-failure-rate", type=float, default=0.0)
+    parser.add_argument("--vector-backend", default="chroma", choices=["chroma", "local"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the service logs of each stage")
+    # Used by the suite itself to run one stage in a child process
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        with open(args.config) as f:
+            config = json.load(f)
+        result = STAGE_FUNCTIONS[args.stage](config, args.workdir)
+        result["max_rss_mb"] = max_rss_mb()
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if any(stage in stages for stage in ("cold_start", "query", "analyze")) and "ingest" not in stages:
+        parser.error("query, analyze and cold_start need the ingest stage")
+    config = {
+        key: getattr(args, key) for key in (
+            "pdfs", "pages_per_pdf", "csv_rows", "csv_files", "csv_batch_size", "queries", "analyses", "warmup",
+            "llm_latency", "embedding_latency", "llm_tokens_per_second", "embedding_tokens_per_second",
+            "llm_failure_rate", "embedding_failure_rate", "vector_backend", "seed",
+        )
+    }
+    report = run_suite(config, [stage for stage in STAGES if stage in stages], args.verbose)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+# Pre-fork deployment: gunicorn -c gunicorn.conf.py app:app  (requires `pip install gunicorn`)
+# The master imports the app and the client libraries once; each worker then only creates its own
+# clients, before it accepts requests, so no request pays for either.
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))  # analyses of long documents take a while
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app.services.resources import preload_modules
+
+    timings = preload_modules()
+    server.log.info("Preloaded modules in %.2fs", sum(timings.values()))
+
+
+def post_fork(server, worker):
+    # Clients hold sockets and gRPC channels, so every worker creates its own
+    from app.services.resources import warm_up
+
+    warm_up()
@@ -0,0 +1,36 @@
+# tests/conftest.py
+# The services read their settings and state locations when they are imported, so the environment
+# is set here, before any test module imports them: all state goes to a scratch directory, the
+# vector index is the local one, and the result caches are off unless a test turns one on.
+import os
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="patent-tests-")
+os.environ.update(
+    APP_DATA_DIR=DATA_DIR,
+    GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY") or "test-fake-key",
+    VECTOR_BACKEND="local",
+    ANALYSIS_CACHE="0",
+    QUERY_CACHE="0",
+    EMBEDDING_CACHE="0",
+    NEIGHBOR_GRAPH="0",
+    ANONYMIZED_TELEMETRY="False",
+    UPLOAD_DIR=os.path.join(DATA_DIR, "uploads"),
+)
+for name in ("MANIFEST_PATH", "LEXICAL_INDEX_PATH", "LOCAL_INDEX_DIR", "JOBS_DB_PATH", "BATCH_DB_PATH",
+             "ANALYSIS_CACHE_PATH", "EMBEDDING_CACHE_PATH", "QUERY_CACHE_DB_PATH"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def fakes():
+    """The local fakes (benchmarks/fakes.py) in place of Gemini and the embedding API, without latency."""
+    from benchmarks.fakes import install_fakes
+    from app.services.resources import registry
+
+    installed = install_fakes(llm_latency=0.0, embedding_latency=0.0)
+    yield installed
+    for name in installed:
+        registry.reset(name)
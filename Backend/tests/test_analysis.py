@@ -0,0 +1,82 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import analysis_service
+from app.services.rate_limit import TokenBucket
+
+TEXT = "An apparatus comprising a sensor coupled to a controller. " * 20
+
+
+@pytest.fixture
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(analysis_service, "ANALYSIS_CALL_TIMEOUT", 0.3)
+
+
+@pytest.fixture
+def one_worker(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(analysis_service, "_executor", executor)
+    yield
+    executor.shutdown(wait=True)
+
+
+def test_time_queued_for_a_worker_does_not_count_against_the_timeout(fakes, short_timeout, one_worker):
+    # Four 0.15s calls on one worker: the last starts ~0.45s in, past the timeout, but runs for 0.15s
+    fakes["analysis_model"].latency = 0.15
+    analysis = analysis_service.run_analysis(TEXT, mode="concurrent", similar_patents=[])
+    assert analysis_service.is_complete(analysis)
+    assert analysis["noveltyScore"] == 72
+
+
+def test_time_waiting_for_the_rate_limiter_does_not_count(fakes, short_timeout, monkeypatch):
+    monkeypatch.setattr(analysis_service, "llm_rate_limiter", TokenBucket(rate=5, capacity=1))
+    fakes["analysis_model"].latency = 0.05
+    analysis = analysis_service.run_analysis(TEXT, mode="concurrent", similar_patents=[])
+    assert analysis_service.is_complete(analysis)
+
+
+def test_async_rate_limiter_wait_does_not_count(fakes, short_timeout, monkeypatch):
+    monkeypatch.setattr(analysis_service, "llm_rate_limiter", TokenBucket(rate=5, capacity=1))
+    fakes["analysis_model"].latency = 0.05
+    analysis = asyncio.run(analysis_service.arun_analysis(TEXT, mode="concurrent", similar_patents=[]))
+    assert analysis_service.is_complete(analysis)
+
+
+@pytest.mark.parametrize("run", [
+    lambda: analysis_service.run_analysis(TEXT, mode="concurrent", similar_patents=[]),
+    lambda: asyncio.run(analysis_service.arun_analysis(TEXT, mode="concurrent", similar_patents=[])),
+], ids=["threads", "async"])
+def test_a_call_that_runs_past_the_timeout_falls_back(fakes, short_timeout, run):
+    fakes["analysis_model"].latency = 0.6
+    analysis = run()
+    assert analysis["summary"] is analysis_service.FALLBACK_RESULTS["summary"]
+    assert analysis["noveltyScore"] == analysis_service.FALLBACK_RESULTS["noveltyScore"]
+    assert not analysis_service.is_complete(analysis)
+
+
+def test_a_failed_call_falls_back(fakes):
+    fakes["analysis_model"].failure_rate = 1.0
+    analysis = analysis_service.run_analysis(TEXT, mode="concurrent", similar_patents=[])
+    assert analysis["potentialIssues"] is analysis_service.FALLBACK_RESULTS["potentialIssues"]
+    assert not analysis_service.is_complete(analysis)
+
+
+@pytest.mark.parametrize("run", [
+    lambda: analysis_service.run_analysis(TEXT, mode="concurrent", similar_patents=[]),
+    lambda: asyncio.run(analysis_service.arun_analysis(TEXT, mode="concurrent", similar_patents=[])),
+], ids=["threads", "async"])
+def test_a_partial_result_stays_partial_through_json(fakes, short_timeout, run):
+    # Followers in other processes get the leader's result decoded from JSON (single_flight.py)
+    fakes["analysis_model"].latency = 0.6
+    analysis = json.loads(json.dumps(run()))
+    assert analysis["fallbackFields"] == ["summary", "noveltyScore", "potentialIssues", "recommendations"]
+    assert not analysis_service.is_complete(analysis)
+
+
+def test_a_real_score_equal_to_the_fallback_score_is_complete():
+    analysis = {"summary": "A summary.", "noveltyScore": 60, "potentialIssues": ["An issue"],
+                "recommendations": ["A recommendation"], "similarPatents": [], "fallbackFields": []}
+    assert analysis_service.is_complete(analysis)
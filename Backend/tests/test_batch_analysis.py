@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from app.services import analysis_service, batch_analysis
+from app.services.batch_analysis import BatchRunStore, run_batch
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BatchRunStore(str(tmp_path / "batch_runs.sqlite"))
+    monkeypatch.setattr(batch_analysis, "_store", store)
+    return store
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    """analyze_patent replaced by a stub: a complete analysis, or None for ids starting with "missing"."""
+    calls = []
+
+    def analyze_patent(document_id):
+        calls.append(document_id)
+        if document_id.startswith("missing"):
+            return None
+        return {"summary": f"Summary of {document_id}", "noveltyScore": 70, "potentialIssues": ["An issue"],
+                "recommendations": ["A recommendation"], "similarPatents": []}
+
+    monkeypatch.setattr(analysis_service, "analyze_patent", analyze_patent)
+    return calls
+
+
+def results(records):
+    return {record["document_id"]: record for record in records if record["type"] == "result"}
+
+
+def test_resumed_run_replays_finished_documents(store, analyses):
+    run_id = uuid.uuid4().hex
+    records = list(run_batch(["a.pdf", "missing.pdf", "b.pdf"], run_id))
+    assert {key: record["status"] for key, record in results(records).items()} == {
+        "a.pdf": "done", "missing.pdf": "failed", "b.pdf": "done"}
+    assert records[-1]["type"] == "summary" and records[-1]["done"] == 2 and records[-1]["failed"] == 1
+
+    analyses.clear()
+    resumed = list(run_batch(["a.pdf", "missing.pdf", "b.pdf"], run_id))
+    assert analyses == ["missing.pdf"]  # only what didn't finish is analyzed again
+    assert results(resumed)["a.pdf"]["resumed"] and results(resumed)["a.pdf"]["result"]["summary"] == "Summary of a.pdf"
+    assert resumed[-1]["resumed"] == 2
+
+    run = store.get_run(run_id)
+    assert run["document_ids"] == ["a.pdf", "missing.pdf", "b.pdf"]
+    assert run["counts"] == {"done": 2, "failed": 1} and run["remaining"] == 1
+
+
+def test_partial_analyses_are_retried_on_resume(store, analyses, monkeypatch):
+    monkeypatch.setattr(analysis_service, "analyze_patent",
+                        lambda document_id: {**analysis_service.FALLBACK_RESULTS,
+                                             "fallbackFields": list(analysis_service.FALLBACK_RESULTS)})
+    run_id = uuid.uuid4().hex
+    assert results(run_batch(["a.pdf"], run_id))["a.pdf"]["status"] == "partial"
+    assert store.finished(run_id) == {}
+
+
+def test_concurrency_is_capped(store, monkeypatch):
+    monkeypatch.setattr(batch_analysis, "BATCH_MAX_CONCURRENCY", 2)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def analyze_patent(document_id):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return None
+
+    monkeypatch.setattr(analysis_service, "analyze_patent", analyze_patent)
+    records = list(run_batch([f"doc{i}.pdf" for i in range(8)], concurrency=50))
+    assert records[-1]["failed"] == 8
+    assert peak == 2
+
+
+def test_resuming_with_new_ids_adds_them_to_the_run(store, analyses):
+    run_id = uuid.uuid4().hex
+    list(run_batch(["a.pdf"], run_id))
+    list(run_batch(["b.pdf", "a.pdf"], run_id))
+    run = store.get_run(run_id)
+    assert run["document_ids"] == ["a.pdf", "b.pdf"]
+    assert run["counts"] == {"done": 2} and run["remaining"] == 0
+
+
+def test_get_analyze_batch_is_not_taken_for_a_document(store, analyses):
+    from starlette.testclient import TestClient
+    from app import app
+    from app.asgi import app as asgi_app
+
+    response = app.test_client().get("/analyze/batch")
+    assert response.status_code == 405 and response.headers["Allow"] == "POST"
+    with TestClient(asgi_app) as client:
+        assert client.get("/analyze/batch").status_code == 405
+    assert analyses == []
+
+
+def test_all_documents_include_those_stored_before_the_manifest():
+    from app.services.manifest import get_manifest
+    from app.services.resources import get_vector_index
+
+    # Chunks stored by an ingest that predates the manifest, next to a document the manifest records
+    get_vector_index().upsert(["legacy-only.pdf:0:0"], np.ones((1, 768), dtype=np.float32), ["Legacy text"],
+                              [{"filename_base": "legacy-only.pdf"}])
+    get_manifest().record("manifest-only.pdf", "manifest-only.pdf", "hash", {})
+    document_ids = batch_analysis.list_all_documents()
+    assert {"legacy-only.pdf", "manifest-only.pdf"} <= set(document_ids)
+    assert document_ids == sorted(set(document_ids))
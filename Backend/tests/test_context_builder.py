@@ -0,0 +1,32 @@
+import random
+
+from langchain.schema import Document
+
+from app.services.context_builder import CONTEXT_TOKEN_BUDGET, build_context
+from app.services.chunking import CHUNK_TARGET_TOKENS
+from benchmarks.corpus import patent_page_text
+
+
+def hits(texts):
+    return [(Document(page_content=text, metadata={"id": f"doc{rank}.pdf:0:0"}), 0.0)
+            for rank, text in enumerate(texts)]
+
+
+def target_sized_text(seed: int) -> str:
+    # About CHUNK_TARGET_TOKENS tokens of distinct text
+    text = patent_page_text(random.Random(seed), words=400)
+    return text[:CHUNK_TARGET_TOKENS * 4].rsplit(" ", 1)[0]
+
+
+def test_default_budget_fits_five_target_sized_chunks():
+    stats = build_context(hits([target_sized_text(seed) for seed in range(5)]), "sensor").stats
+    assert stats["budgetCutTokens"] == 0 and stats["truncated"] == 0
+    assert stats["contextTokens"] <= CONTEXT_TOKEN_BUDGET
+
+
+def test_truncation_is_reported_apart_from_deduplication():
+    texts = [target_sized_text(seed) for seed in range(4)]
+    stats = build_context(hits(texts + [texts[0]]), "sensor", budget=600).stats
+    assert stats["duplicatesDropped"] == 1 and stats["dedupSavedTokens"] > 0
+    assert stats["truncated"] == 1 and stats["budgetCutTokens"] > 0
+    assert stats["savedTokens"] == stats["dedupSavedTokens"] + stats["budgetCutTokens"]
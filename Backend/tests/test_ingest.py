@@ -0,0 +1,69 @@
+import io
+import random
+
+from benchmarks.corpus import write_pdf
+from app.services.manifest import get_manifest
+from app.services.process import process_pdf_to_chroma
+from app.services.resources import get_vector_index
+from app.services.upload_store import get_upload_store
+
+
+def paragraph_pages(seed: int, pages: int):
+    """One numbered paragraph per page, each long enough to be a chunk of its own."""
+    rng = random.Random(seed)
+    words = "apparatus signal electrode substrate controller sensor antenna polymer catalyst housing".split()
+    return [f"[{page + 1:04d}] " + " ".join(rng.choice(words) for _ in range(220)) + "."
+            for page in range(pages)]
+
+
+def upload(tmp_path, name: str, pages):
+    """Write the pages as a PDF and store it as an upload named `name`; the stored path."""
+    source = tmp_path / "source.pdf"
+    write_pdf(str(source), pages)
+    return get_upload_store().put(io.BytesIO(source.read_bytes()), name).path
+
+
+def test_reupload_with_one_page_changed_reembeds_only_that_page(tmp_path, fakes):
+    name = "reupload.pdf"
+    pages = paragraph_pages(seed=1, pages=4)
+    first_path = upload(tmp_path, name, pages)
+    process_pdf_to_chroma(first_path)
+    first = get_manifest().get_chunk_hashes(name)
+    embedded_before = fakes["embeddings"].calls
+
+    pages[2] = paragraph_pages(seed=2, pages=4)[2]
+    second_path = upload(tmp_path, name, pages)
+    assert second_path != first_path  # new bytes, new by-hash directory
+    process_pdf_to_chroma(second_path)
+    second = get_manifest().get_chunk_hashes(name)
+
+    assert set(first) == set(second)
+    assert all(chunk_id.startswith(f"{name}:") for chunk_id in second)
+    changed = {chunk_id for chunk_id in second if first[chunk_id] != second[chunk_id]}
+    assert changed and all(chunk_id.startswith(f"{name}:2:") for chunk_id in changed)
+    assert fakes["embeddings"].calls == embedded_before + 1
+
+    stored = get_vector_index().get(where={"filename_base": name})
+    assert sorted(stored["ids"]) == sorted(second)
+
+
+def test_unchanged_reupload_is_skipped(tmp_path, fakes):
+    name = "unchanged.pdf"
+    pages = paragraph_pages(seed=3, pages=2)
+    process_pdf_to_chroma(upload(tmp_path, name, pages))
+    calls = fakes["embeddings"].calls
+
+    process_pdf_to_chroma(upload(tmp_path, name, pages))
+    assert fakes["embeddings"].calls == calls
+
+
+def test_page_parallel_parse_matches_the_serial_one(tmp_path, monkeypatch):
+    from app.services import load_documents
+
+    monkeypatch.setattr(load_documents, "PDF_PARALLEL_MIN_PAGES", 4)
+    path = str(tmp_path / "parallel.pdf")
+    write_pdf(path, paragraph_pages(seed=4, pages=8))
+    parallel = load_documents.load_and_split_pdf(path, workers=2)
+    serial = load_documents.load_and_split_pdf(path, workers=1)
+    assert [(chunk.page_content, chunk.metadata["page"]) for chunk in parallel] == \
+           [(chunk.page_content, chunk.metadata["page"]) for chunk in serial]
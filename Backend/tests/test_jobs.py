@@ -0,0 +1,27 @@
+import pytest
+
+from app.services.jobs import JobQueue, QueueFullError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_workers=1, max_pending=2)
+    yield queue
+    queue._executor.shutdown(wait=True)
+
+
+def test_a_job_that_cannot_be_submitted_gives_its_slot_back(queue, tmp_path):
+    queue._executor.shutdown(wait=True)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            queue.submit(str(tmp_path / "a.pdf"), "a.pdf")
+    assert queue.stats()["pending_in_process"] == 0
+
+
+def test_a_job_that_cannot_be_recorded_gives_its_slot_back(queue, tmp_path):
+    queue._conn.close()
+    for _ in range(3):
+        with pytest.raises(Exception) as raised:
+            queue.submit(str(tmp_path / "a.pdf"), "a.pdf")
+        assert not isinstance(raised.value, QueueFullError)
+    assert queue._pending == 0
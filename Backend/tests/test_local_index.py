@@ -0,0 +1,122 @@
+import multiprocessing
+import zlib
+
+import numpy as np
+import pytest
+
+from app.services.vector_db.local_index import LocalVectorIndex
+
+DIM = 16
+
+
+def vectors_for(ids, seed: int = 0):
+    """A distinct, reproducible vector per id."""
+    return np.stack([np.random.default_rng([seed, zlib.crc32(chunk_id.encode())]).standard_normal(DIM)
+                     for chunk_id in ids]).astype(np.float32)
+
+
+def fill(index, document: str, count: int, seed: int = 0):
+    ids = [f"{document}:0:{i}" for i in range(count)]
+    index.upsert(ids, vectors_for(ids, seed), [f"text {chunk_id}" for chunk_id in ids],
+                 [{"filename_base": document, "section": "claims" if i % 2 else "description"}
+                  for i in range(count)])
+    return ids
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LocalVectorIndex(str(tmp_path / "index"))
+
+
+def test_query_finds_the_nearest_entry(index):
+    ids = fill(index, "a.pdf", 20)
+    hits = index.query(vectors_for(ids[7:8])[0], k=3)
+    assert hits[0].id == ids[7] and hits[0].distance == pytest.approx(0, abs=1e-4)
+    assert hits[0].document == f"text {ids[7]}" and hits[0].metadata["filename_base"] == "a.pdf"
+    assert [hit.distance for hit in hits] == sorted(hit.distance for hit in hits)
+
+
+def test_query_filters(index):
+    a_ids = fill(index, "a.pdf", 10)
+    fill(index, "b.pdf", 10)
+    probe = vectors_for(a_ids[:1])[0]
+    assert {hit.metadata["filename_base"] for hit in index.query(probe, k=5, where={"filename_base": "b.pdf"})} == {"b.pdf"}
+    assert all(hit.metadata["filename_base"] != "a.pdf"
+               for hit in index.query(probe, k=5, where={"filename_base": {"$ne": "a.pdf"}}))
+    hits = index.query(probe, k=10, where={"filename_base": "a.pdf", "section": "claims"})
+    assert len(hits) == 5 and {hit.metadata["section"] for hit in hits} == {"claims"}
+    with pytest.raises(ValueError):
+        index.query(probe, where={"filename_base": {"$in": ["a.pdf"]}})
+
+
+def test_upsert_replaces_and_delete_removes(index):
+    ids = fill(index, "a.pdf", 10)
+    replacement = vectors_for(ids[:1], seed=1)
+    index.upsert(ids[:1], replacement, ["new text"], [{"filename_base": "a.pdf"}])
+    assert index.count() == 10
+    hit = index.query(replacement[0], k=1)[0]
+    assert (hit.id, hit.document) == (ids[0], "new text")
+
+    index.delete(ids[:5])
+    assert index.count() == 5
+    assert not {hit.id for hit in index.query(replacement[0], k=10)} & set(ids[:5])
+    assert index.get(where={"filename_base": "a.pdf"})["ids"] == ids[5:]
+
+
+def test_reopened_index_sees_the_same_entries(index):
+    ids = fill(index, "a.pdf", 10)
+    reopened = LocalVectorIndex(index.directory)
+    assert reopened.count() == 10
+    assert reopened.query(vectors_for(ids[3:4])[0], k=1)[0].id == ids[3]
+    stored = reopened.get(ids=ids[:2], include_embeddings=True)
+    np.testing.assert_allclose(stored["embeddings"], vectors_for(ids[:2]))
+
+
+@pytest.mark.parametrize("ivf", [False, True], ids=["scan", "ivf"])
+def test_quantized_index_reranks_and_tracks_updates(index, ivf):
+    ids = fill(index, "a.pdf", 200)
+    if ivf:
+        index.nprobe = 1
+        index.build_ivf(lists=16)
+    index.quantize("int8")
+    assert index.query(vectors_for(ids[42:43])[0], k=1)[0].id == ids[42]
+
+    # An update below the quantized_rows watermark re-encodes that row's code
+    replacement = vectors_for(ids[:1], seed=1)
+    index.upsert(ids[:1], replacement, ["new text"], [{"filename_base": "a.pdf"}])
+    assert index.query(replacement[0], k=1)[0].id == ids[0]
+    # ...and, with IVF lists, is found through the list of its new vector's centroid
+    assert [hit.id for hit in index.query(replacement[0], k=3)].count(ids[0]) == 1
+    assert LocalVectorIndex(index.directory, nprobe=1).query(replacement[0], k=1)[0].id == ids[0]
+    # Rows appended after quantize() are scored with their float vectors
+    new_ids = fill(index, "b.pdf", 5)
+    assert index.query(vectors_for(new_ids[2:3])[0], k=1)[0].id == new_ids[2]
+    assert index.query(vectors_for(new_ids[2:3])[0], k=1, exact=True)[0].id == new_ids[2]
+    if ivf:
+        # A rebuild lists the moved row under its new centroid
+        index.build_ivf(lists=16)
+        assert index.query(replacement[0], k=1)[0].id == ids[0]
+
+
+def _upsert_from_process(directory: str, document: str, rounds: int):
+    index = LocalVectorIndex(directory)
+    for round_number in range(rounds):
+        fill(index, f"{document}-{round_number}", 25)
+
+
+def test_concurrent_writers_in_separate_processes(tmp_path):
+    directory = str(tmp_path / "shared")
+    LocalVectorIndex(directory)
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=_upsert_from_process, args=(directory, name, 8)) for name in ("x", "y")]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(60)
+        assert writer.exitcode == 0
+
+    index = LocalVectorIndex(directory)
+    assert index.count() == 2 * 8 * 25
+    stored = index.get(include_embeddings=True)
+    # Every id still points at its own vector: no two writers reserved the same rows
+    np.testing.assert_allclose(stored["embeddings"], vectors_for(stored["ids"]))
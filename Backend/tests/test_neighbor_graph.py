@@ -0,0 +1,64 @@
+import pytest
+
+from app.services.resources import SIMILAR_PATENTS_COLLECTION, get_vector_index
+
+from app.services import neighbor_graph
+from app.services.neighbor_graph import get_neighbor_graph
+from app.services.process import process_pdf_to_chroma
+from tests.test_ingest import paragraph_pages, upload
+
+
+@pytest.fixture
+def graph_on(monkeypatch):
+    monkeypatch.setattr(neighbor_graph, "NEIGHBOR_GRAPH", True)
+    return get_neighbor_graph()
+
+
+def ingest(tmp_path, name: str, seed: int):
+    process_pdf_to_chroma(upload(tmp_path, name, paragraph_pages(seed=seed, pages=3)))
+
+
+def test_a_failed_update_removes_every_row_it_would_have_rewritten(tmp_path, fakes, graph_on, monkeypatch):
+    ingest(tmp_path, "graph-a.pdf", seed=11)
+    ingest(tmp_path, "graph-b.pdf", seed=12)
+    assert graph_on.lookup("graph-a.pdf") is not None and graph_on.lookup("graph-b.pdf") is not None
+
+    def fail(document_ids, top_k=neighbor_graph.NEIGHBOR_TOP_K):
+        raise RuntimeError("search failed")
+
+    monkeypatch.setattr(neighbor_graph, "_affected_by", lambda document_id, rows: ["graph-a.pdf"])
+    monkeypatch.setattr(neighbor_graph, "search_neighbors", fail)
+    ingest(tmp_path, "graph-c.pdf", seed=13)
+    assert graph_on.lookup("graph-a.pdf") is None  # its list may now include graph-c.pdf
+    assert graph_on.lookup("graph-c.pdf") is None
+    assert graph_on.lookup("graph-b.pdf") is not None
+
+
+def test_rows_are_dropped_while_the_affected_documents_are_unknown(tmp_path, fakes, graph_on, monkeypatch):
+    ingest(tmp_path, "graph-d.pdf", seed=14)
+
+    def fail(document_id, rows):
+        raise RuntimeError("fetch failed")
+
+    monkeypatch.setattr(neighbor_graph, "_affected_by", fail)
+    ingest(tmp_path, "graph-e.pdf", seed=15)
+    assert graph_on.lookup("graph-d.pdf") is None and graph_on.lookup("graph-e.pdf") is None
+
+
+def test_an_upload_is_searched_with_queries_not_a_scan(tmp_path, fakes, graph_on, monkeypatch):
+    for number in range(3):
+        ingest(tmp_path, f"graph-q{number}.pdf", seed=20 + number)
+    names = ["graph-q0.pdf", "graph-q1.pdf", "graph-q2.pdf"]
+    scanned = neighbor_graph.compute_neighbors(names)
+
+    target = get_vector_index(SIMILAR_PATENTS_COLLECTION)
+    monkeypatch.setattr(target, "scan", lambda *args, **kwargs: pytest.fail("the update scanned the collection"))
+    searched = neighbor_graph.search_neighbors(names)
+    for name in names:
+        assert searched[name]["keys"] == scanned[name]["keys"]
+        assert searched[name]["passages"] == scanned[name]["passages"]
+        assert [p["title"] for p in searched[name]["neighbors"]] == [p["title"] for p in scanned[name]["neighbors"]]
+        assert searched[name]["thresholds"] == pytest.approx(scanned[name]["thresholds"], rel=1e-4)
+
+    ingest(tmp_path, "graph-q3.pdf", seed=23)
+    assert graph_on.lookup("graph-q3.pdf") is not None
@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.services.query_cache import ScopeGenerations, SemanticQueryCache
+
+
+def vector(seed: int):
+    return np.random.default_rng(seed).standard_normal(32)
+
+
+def test_similar_question_hits_within_its_scope():
+    cache = SemanticQueryCache(threshold=0.95, enabled=True)
+    question = vector(0)
+    cache.store("a.pdf", "What is claimed?", question, "An answer", ["a.pdf:0:0"])
+    hit = cache.lookup("a.pdf", question + 0.01 * vector(1))
+    assert hit["answer"] == "An answer" and hit["sources"] == ["a.pdf:0:0"]
+    assert cache.lookup("b.pdf", question) is None
+    assert cache.lookup("a.pdf", vector(2)) is None
+
+
+def test_invalidation_reaches_the_other_processes(tmp_path):
+    # Two caches with their own connections to the counters, as two gunicorn workers have
+    path = str(tmp_path / "query_cache.sqlite")
+    worker, ingesting_worker = (SemanticQueryCache(enabled=True, generations=ScopeGenerations(path)) for _ in range(2))
+    question = vector(0)
+    worker.store("a.pdf", "What is claimed?", question, "Stale answer", [])
+    worker.store("b.pdf", "What is claimed?", question, "Other answer", [])
+    assert worker.lookup("a.pdf", question)["answer"] == "Stale answer"
+
+    ingesting_worker.invalidate("a.pdf")
+    assert worker.lookup("a.pdf", question) is None
+    assert worker.lookup("b.pdf", question)["answer"] == "Other answer"
+
+    worker.store("a.pdf", "What is claimed?", question, "Fresh answer", [])
+    assert worker.lookup("a.pdf", question)["answer"] == "Fresh answer"
+
+
+def test_an_answer_generated_across_an_invalidation_is_not_stored(tmp_path):
+    shared = SemanticQueryCache(enabled=True, generations=ScopeGenerations(str(tmp_path / "query_cache.sqlite")))
+    for cache in (SemanticQueryCache(enabled=True), shared):
+        question = vector(0)
+        # Generation read before retrieval; the document is re-ingested while the answer is generated
+        generation = cache.generation("a.pdf")
+        assert cache.lookup("a.pdf", question) is None
+        cache.invalidate("a.pdf")
+        cache.store("a.pdf", "What is claimed?", question, "Answer from the old chunks", [], generation)
+        assert cache.lookup("a.pdf", question) is None
+
+        cache.store("a.pdf", "What is claimed?", question, "Fresh answer", [], cache.generation("a.pdf"))
+        assert cache.lookup("a.pdf", question)["answer"] == "Fresh answer"
@@ -0,0 +1,114 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+from benchmarks.bench_single_flight import burst
+from benchmarks.corpus import write_pdf
+from app.services.analysis_service import aanalyze_patent, analyze_patent
+from app.services.process import process_pdf_to_chroma
+from app.services.single_flight import SharedFlights, SingleFlight
+
+
+@pytest.fixture
+def document(tmp_path, fakes):
+    """An ingested document whose name needs URL encoding."""
+    path = os.path.join(tmp_path, "fuel cell.pdf")
+    write_pdf(path, ["[0001] A fuel cell stack with a cooling plate between each pair of cells."] * 2)
+    process_pdf_to_chroma(path)
+    return "fuel cell.pdf"
+
+
+def test_concurrent_analyses_share_one_computation(document, fakes):
+    model = fakes["analysis_model"]
+    calls = model.calls
+    analyze_patent(document)
+    per_analysis = model.calls - calls
+
+    model.latency = 0.2
+    results = []
+    # The same document, spelled as a route might receive it
+    names = itertools.cycle([document, "fuel%20cell.pdf"])
+    calls = model.calls
+    burst(8, lambda: results.append(analyze_patent(next(names))))
+    assert model.calls - calls == per_analysis
+    assert all(result is results[0] for result in results)
+    assert results[0]["title"] == document
+
+
+def test_async_and_threaded_callers_share_one_computation(document, fakes):
+    model = fakes["analysis_model"]
+    calls = model.calls
+    analyze_patent(document)
+    per_analysis = model.calls - calls
+
+    model.latency = 0.2
+    calls = model.calls
+    thread = threading.Thread(target=analyze_patent, args=(document,))
+    thread.start()
+    time.sleep(0.05)
+
+    async def many():
+        return await asyncio.gather(*(aanalyze_patent("fuel%20cell.pdf") for _ in range(4)))
+
+    results = asyncio.run(many())
+    thread.join()
+    assert model.calls - calls == per_analysis
+    assert all(result is results[0] for result in results)
+
+
+def test_followers_get_the_leaders_error():
+    flights = SingleFlight(enabled=True)
+    started = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("model unavailable")
+
+    errors = []
+
+    def call():
+        try:
+            flights.run("analysis", "a.pdf", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1 and len(errors) == 4
+
+
+def test_waiting_on_another_process_falls_back_after_the_timeout(tmp_path):
+    path = str(tmp_path / "flights.sqlite")
+    key = SingleFlight.make_key("analysis", "a.pdf")
+    # A claim held by a live process (this one) that never publishes a result
+    assert SharedFlights(path).claim(key, "someone-else")
+
+    flights = SharedFlights(path, timeout=0.3)
+    started = time.monotonic()
+    assert flights.run("analysis", key, lambda: "computed here") == "computed here"
+    assert 0.3 <= time.monotonic() - started < 2
+
+
+def test_waiting_process_gets_the_published_result(tmp_path):
+    path = str(tmp_path / "flights.sqlite")
+    key = SingleFlight.make_key("query", "a.pdf\0What is claimed?")
+    owner = SharedFlights(path)
+    assert owner.claim(key, "owner")
+    threading.Timer(0.2, owner.publish, args=(key, "owner"), kwargs={"result": {"answer": "shared"}}).start()
+
+    calls = []
+    result = SharedFlights(path, timeout=5).run("query", key, lambda: calls.append(1) or {"answer": "own"})
+    assert result == {"answer": "shared"} and not calls
@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.resources import registry
+from app.services.vector_db.local_index import LocalVectorIndex
+from app.services.vector_store import COLLECTION_NAME, Checkpoint, ingest, remove_legacy_ids
+
+
+def test_checkpoint_watermark_advances_over_out_of_order_batches(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), batch_size=10)
+    checkpoint.mark_done("a.csv", 20)
+    checkpoint.mark_done("a.csv", 10)
+    assert checkpoint.state["files"]["a.csv"] == {"watermark": 0, "done": [10, 20]}
+    assert checkpoint.is_done("a.csv", 20) and not checkpoint.is_done("a.csv", 0)
+
+    checkpoint.mark_done("a.csv", 0)
+    assert checkpoint.state["files"]["a.csv"] == {"watermark": 30, "done": []}
+    checkpoint.mark_done("a.csv", 50)
+    assert checkpoint.state["files"]["a.csv"] == {"watermark": 30, "done": [50]}
+    assert checkpoint.is_done("a.csv", 10) and not checkpoint.is_done("a.csv", 40)
+    assert not checkpoint.is_done("b.csv", 0)
+
+
+def test_checkpoint_resumes_only_with_the_same_batch_size(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, batch_size=10)
+    checkpoint.mark_done("a.csv", 0)
+    checkpoint.mark_done("a.csv", 20)
+    checkpoint.save()
+
+    resumed = Checkpoint(path, batch_size=10)
+    assert resumed.is_done("a.csv", 0) and resumed.is_done("a.csv", 20) and not resumed.is_done("a.csv", 10)
+    assert not Checkpoint(path, batch_size=20).is_done("a.csv", 0)
+
+
+def rows(count: int, prefix: str = "Patent"):
+    return pd.DataFrame({
+        "Title": [f"{prefix} {i}" for i in range(count)],
+        "Field Of Invention": ["Sensors"] * count,
+        "Application Date": ["2020-01-01"] * count,
+        "Applicant Name": ["Acme"] * count,
+    })
+
+
+@pytest.fixture
+def collection(tmp_path):
+    index = LocalVectorIndex(str(tmp_path / "index"))
+    registry.override(f"vector_index:{COLLECTION_NAME}", index)
+    yield index
+    registry.reset(f"vector_index:{COLLECTION_NAME}")
+
+
+def add_legacy_rows(collection, count: int):
+    ids = [str(row) for row in range(count)]
+    collection.upsert(ids, np.ones((count, 768), dtype=np.float32), [f"legacy {i}" for i in ids],
+                      [{"title": f"legacy {i}"} for i in ids])
+
+
+def test_remove_legacy_ids_deletes_every_numeric_id(collection):
+    add_legacy_rows(collection, 25)
+    collection.upsert(["a.csv:0"], np.ones((1, 768), dtype=np.float32), ["new"], [{"title": "new"}])
+    assert remove_legacy_ids(collection, batch_size=10) == 25
+    assert collection.get()["ids"] == ["a.csv:0"]
+    assert remove_legacy_ids(collection, batch_size=10) == 0
+
+
+def test_ingest_replaces_legacy_ids_once(fakes, collection, tmp_path):
+    data_dir = tmp_path / "csvs"
+    data_dir.mkdir()
+    rows(7).to_csv(data_dir / "a.csv", index=False)
+    add_legacy_rows(collection, 7)
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    assert ingest(str(data_dir), batch_size=3, concurrency=2, requests_per_minute=6000,
+                  checkpoint_path=checkpoint_path) == 7
+    assert sorted(collection.get()["ids"]) == sorted(f"a.csv:{row}" for row in range(7))
+    with open(checkpoint_path) as f:
+        saved = json.load(f)
+    assert saved["legacy_ids_removed"] and saved["files"]["a.csv"]["watermark"] == 9
+
+    # A resumed run neither looks for legacy ids again nor re-embeds finished batches
+    calls = fakes["embeddings"].calls
+    add_legacy_rows(collection, 1)
+    assert ingest(str(data_dir), batch_size=3, checkpoint_path=checkpoint_path) == 0
+    assert fakes["embeddings"].calls == calls
+    assert "0" in collection.get()["ids"]
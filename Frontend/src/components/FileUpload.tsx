@@ -11,6 +11,23 @@ interface FileUploadProps {
   onFileProcessed: (fileData: { name: string; size: number; document_id: string }) => void;
 }
 
+interface IngestJob {
+  id: string;
+  status: "queued" | "running" | "done" | "failed";
+  document_id: string;
+  error?: string | null;
+}
+
+// The backend ingests uploads in the background; poll the job until it finishes
+const waitForJob = async (jobId: string): Promise<IngestJob> => {
+  for (;;) {
+    const { data } = await axios.get<IngestJob>(`http://localhost:5000/jobs/${jobId}`);
+    if (data.status === "done") return data;
+    if (data.status === "failed") throw new Error(data.error || "Document processing failed.");
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+};
+
 export default function FileUpload({ onFileProcessed }: FileUploadProps) {
   const [file, setFile] = useState<File | null>(null);
   const [isDragging, setIsDragging] = useState(false);
@@ -99,9 +116,8 @@ export default function FileUpload({ onFileProcessed }: FileUploadProps) {
         },
       });
 
-      // Assuming backend response now includes document_id:
-      // e.g., { message: "...", document_id: "..." }
-      const responseData = response.data;
+      // Backend responds with { message, job_id, status, document_id } and processes the PDF in the background
+      const responseData = response.data.job_id ? await waitForJob(response.data.job_id) : response.data;
 
       if (responseData && responseData.document_id) {
         setUploadStatus("success");
@@ -129,7 +145,9 @@ export default function FileUpload({ onFileProcessed }: FileUploadProps) {
       
       if (error && typeof error === 'object' && 'response' in error) {
         const axiosError = error as { response?: { status?: number; data?: { error?: string } } };
-        if (axiosError.response?.status === 413) {
+        if (axiosError.response?.status === 503) {
+          errorMsg = "The server is busy processing other uploads. Please try again shortly.";
+        } else if (axiosError.response?.status === 413) {
           errorMsg = "File too large. Please upload a smaller file.";
         } else if (axiosError.response?.status === 415) {
           errorMsg = "Invalid file format. Please upload a PDF file.";